@@ -1,10 +1,16 @@
+import os
 import streamlit as st
-import pandas as pd
-import json
-from PIL import Image
-from src.pipeline.predict_pipeline import PredictionPipeline
 from src.utils.common import logger
 
+# Only streamlit and the logger are imported up front. Streamlit re-runs this script on
+# every interaction, so the artifacts below are cached, keyed on their modification time
+# (a retrain replaces them), and numpy / the prediction pipeline load on first use.
+METRICS_PATH = 'artifacts/model_evaluation/metrics.json'
+SILHOUETTE_PLOT_PATH = 'artifacts/model_evaluation/silhouette_plot.png'
+SILHOUETTE_PLOT_DATA_PATH = 'artifacts/model_evaluation/silhouette_plot.json'
+SERVING_MODEL_PATH = 'artifacts/serving/model.npz'
+SEGMENT_TABLE_PATH = 'artifacts/serving/customer_segments.npy'
+
 
 st.set_page_config(
     page_title="Customer Segmentation",
@@ -13,23 +19,73 @@ st.set_page_config(
 )
 
 
-try:
-    with open('artifacts/model_evaluation/metrics.json', 'r') as f:
-        metrics = json.load(f)
-    silhouette_score = metrics.get('silhouette_score', 'N/A')
-except FileNotFoundError:
-    silhouette_score = "N/A (Run training pipeline first)"
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
-try:
-    
-    plot_image = Image.open('artifacts/model_evaluation/silhouette_plot.png')
-except FileNotFoundError:
-    plot_image = None
+
+@st.cache_data(max_entries=2)
+def load_metrics(path, mtime):
+    if mtime is None:
+        return None
+    import json
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+@st.cache_data(max_entries=2)
+def load_image_bytes(path, mtime):
+    # st.image takes the encoded PNG as is, so PIL is never needed.
+    if mtime is None:
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
 
 
-@st.cache_resource
-def get_prediction_pipeline():
+@st.cache_data(max_entries=2)
+def load_silhouette_chart(path, mtime):
+    """
+    Vega-Lite spec of the silhouette plot from the evaluation's quantile curves,
+    drawn in the browser instead of shipping the rendered PNG.
+    """
+    if mtime is None:
+        return None
+    import json
+    with open(path, 'r') as f:
+        curves = json.load(f)
+    points = [
+        {"cluster": str(cluster["cluster"]), "y": cluster["y_lower"] + rank, "silhouette": value}
+        for cluster in curves["clusters"]
+        for rank, value in zip(cluster["ranks"], cluster["values"])
+    ]
+    return {
+        "height": 450,
+        "data": {"values": points},
+        "layer": [
+            {
+                "mark": {"type": "area", "orient": "horizontal", "opacity": 0.7, "clip": True},
+                "encoding": {
+                    "y": {"field": "y", "type": "quantitative", "axis": None, "title": "Cluster label"},
+                    "x": {"field": "silhouette", "type": "quantitative", "title": "Silhouette coefficient values",
+                          "scale": {"domain": [-0.2, 0.7]}},
+                    "x2": {"datum": 0},
+                    "color": {"field": "cluster", "type": "nominal", "title": "Cluster"},
+                },
+            },
+            {
+                "mark": {"type": "rule", "color": "red", "strokeDash": [4, 4]},
+                "encoding": {"x": {"datum": curves["silhouette_avg"]}},
+            },
+        ],
+    }
+
+
+@st.cache_resource(max_entries=1)
+def get_prediction_pipeline(mtime):
     try:
+        from src.pipeline.predict_pipeline import PredictionPipeline
         pipeline = PredictionPipeline()
         logger.info("Prediction pipeline loaded for Streamlit app.")
         return pipeline
@@ -38,7 +94,20 @@ def get_prediction_pipeline():
         st.error(f"Failed to load model artifacts: {e}. Have you run the training pipeline?")
         return None
 
-pipeline = get_prediction_pipeline()
+
+@st.cache_resource(max_entries=1)
+def get_segment_lookup(mtime):
+    # Memory-mapped and numpy-only: opening it reads nothing but the file headers.
+    if mtime is None:
+        return None
+    from src.components.segment_lookup import SegmentLookup
+    return SegmentLookup(SEGMENT_TABLE_PATH)
+
+
+metrics = load_metrics(METRICS_PATH, _mtime(METRICS_PATH))
+silhouette_score = metrics.get('silhouette_score') if metrics else None
+silhouette_chart = load_silhouette_chart(SILHOUETTE_PLOT_DATA_PATH, _mtime(SILHOUETTE_PLOT_DATA_PATH))
+plot_image = None if silhouette_chart else load_image_bytes(SILHOUETTE_PLOT_PATH, _mtime(SILHOUETTE_PLOT_PATH))
 
 
 st.title("👥 Customer Segmentation App")
@@ -72,12 +141,11 @@ with col1:
     )
     
     if st.button("Segment Customer", use_container_width=True):
+        pipeline = get_prediction_pipeline(_mtime(SERVING_MODEL_PATH))
         if pipeline:
            
-            input_data = pd.DataFrame(
-                [[recency, frequency, monetary]],
-                columns=['Recency', 'Frequency', 'Monetary']
-            )
+            rfm = {'Recency': recency, 'Frequency': frequency, 'Monetary': monetary}
+            input_data = [[rfm[name] for name in pipeline.feature_names]]
             
             
             prediction = pipeline.predict(input_data)
@@ -88,6 +156,24 @@ with col1:
         else:
             st.error("Prediction engine is not available. Please check the logs.")
 
+    st.header("🔎 Look Up Existing Customer")
+    customer_id = st.number_input("CustomerID", min_value=0, value=12346, step=1)
+
+    if st.button("Look Up Segment", use_container_width=True):
+        segment_lookup = get_segment_lookup(_mtime(SEGMENT_TABLE_PATH))
+        if segment_lookup:
+            customer = segment_lookup.lookup(customer_id)
+            if customer:
+                st.success(f"**Customer {customer['CustomerID']}: Cluster {customer['Cluster']}**")
+                st.markdown(
+                    f"Recency **{customer['Recency']}** days · Frequency **{customer['Frequency']}** · "
+                    f"Monetary **{customer['Monetary']:,.2f}**"
+                )
+            else:
+                st.warning(f"CustomerID {customer_id} is not in the trained segment table.")
+        else:
+            st.error("Segment table not found. Run the training pipeline (`python main.py`) to generate it.")
+
 
 with col2:
     st.header("📊 Model Performance")
@@ -95,12 +181,15 @@ with col2:
     
     st.metric(
         label="Final Silhouette Score", 
-        value=f"{silhouette_score:.4f}"
+        value=f"{silhouette_score:.4f}" if isinstance(silhouette_score, (int, float)) else "N/A (Run training pipeline first)"
     )
     st.markdown("Our benchmark proved Spectral Clustering (`sc`) was superior to K-Means. A score closer to 1 indicates well-separated clusters.")
     
    
-    if plot_image:
+    if silhouette_chart:
+        st.vega_lite_chart(silhouette_chart, use_container_width=True)
+        st.caption("Silhouette Plot (Generated by Evaluation Component)")
+    elif plot_image:
         st.image(plot_image, caption="Final Cluster Plot (Generated by Evaluation Component)")
     else:
         st.warning("Cluster plot not found. Run the training pipeline (`python main.py`) to generate it.")
\ No newline at end of file
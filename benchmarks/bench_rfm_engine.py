@@ -0,0 +1,101 @@
+"""
+Compares the pandas RFM path (clean + three groupbys + two merges) against the
+fused engine on synthetic transactions.
+
+    python -m benchmarks.bench_rfm_engine --rows 1000000 10000000 50000000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src.components.data_transformation import DataTransformation, JUNK_STOCK_CODES
+from src.components.rfm_engine import compute_rfm_fused
+
+
+def make_transactions(n_rows, typed=False, seed=42):
+    """
+    `typed=False` gives the string columns a CSV artifact parses into;
+    `typed=True` gives the datetime/category columns of a Parquet/Feather artifact.
+    """
+    rng = np.random.default_rng(seed)
+    n_customers = max(n_rows // 100, 10)
+    stock_codes = np.array([str(c) for c in range(20000, 24000)] + JUNK_STOCK_CODES + ['post', 'd'], dtype=object)
+    customers = rng.zipf(1.3, n_rows) % n_customers
+    invoice_dates = np.datetime64('2010-12-01T08:00') + rng.integers(0, 373 * 24 * 60, n_rows).astype('timedelta64[m]')
+    df = pd.DataFrame({
+        'InvoiceNo': (customers * 64 + rng.integers(0, 64, n_rows) + 536000).astype(str),
+        'StockCode': stock_codes[rng.integers(0, len(stock_codes), n_rows)],
+        'Quantity': rng.integers(-5, 50, n_rows),
+        'InvoiceDate': invoice_dates,
+        'UnitPrice': rng.gamma(2.0, 2.0, n_rows).round(2),
+        'CustomerID': np.where(rng.random(n_rows) < 0.25, np.nan, (customers + 12000).astype(np.float64)),
+    })
+    if typed:
+        df['StockCode'] = df['StockCode'].astype('category')
+    else:
+        df['InvoiceDate'] = df['InvoiceDate'].astype(str)
+    return df
+
+
+def run_pandas(df):
+    transformation = DataTransformation.__new__(DataTransformation)
+    return transformation._build_rfm(transformation._clean(df))
+
+
+def run_fused(df):
+    return compute_rfm_fused(df, JUNK_STOCK_CODES)
+
+
+def measure(fn, df):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(df)
+    seconds = time.perf_counter() - start
+    del result
+    gc.collect()
+
+    tracemalloc.start()
+    fn(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument("--output", default=None, help="optional JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    for n_rows, typed in [(n, typed) for n in args.rows for typed in (False, True)]:
+        df = make_transactions(n_rows, typed=typed)
+        expected, actual = run_pandas(df), run_fused(df)
+        assert expected['CustomerID'].tolist() == actual['CustomerID'].tolist()
+        assert (expected[['Recency', 'Frequency']].values == actual[['Recency', 'Frequency']].values).all()
+        assert np.allclose(expected['Monetary'], actual['Monetary'])
+
+        pandas_s, pandas_mb = measure(run_pandas, df)
+        fused_s, fused_mb = measure(run_fused, df)
+        row = {
+            "rows": n_rows,
+            "input": "typed" if typed else "csv",
+            "pandas_seconds": round(pandas_s, 3), "pandas_peak_mb": round(pandas_mb, 1),
+            "fused_seconds": round(fused_s, 3), "fused_peak_mb": round(fused_mb, 1),
+            "speedup": round(pandas_s / fused_s, 2), "memory_ratio": round(pandas_mb / fused_mb, 2),
+        }
+        print(json.dumps(row))
+        results.append(row)
+        del df
+        gc.collect()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Load test for the HTTP scoring service: `--concurrency` keep-alive clients
+each send single-customer POST /predict requests back to back. Reports
+throughput and latency percentiles.
+
+    python serve.py --workers 2 --max-wait-ms 2 &
+    python -m benchmarks.bench_scoring_service --concurrency 1 16 64 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+
+
+async def _client(host, port, n_requests, rng, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(n_requests):
+            body = json.dumps({
+                "Recency": int(rng.integers(1, 400)),
+                "Frequency": int(rng.integers(1, 250)),
+                "Monetary": float(rng.gamma(2.0, 800.0)),
+            }).encode()
+            start = time.perf_counter()
+            writer.write(
+                f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            await reader.readexactly(int(headers["content-length"]))
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, concurrency, n_requests, seed=42):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(host, port, n_requests // concurrency, np.random.default_rng(seed + i), latencies)
+        for i in range(concurrency)
+    ])
+    seconds = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(len(latencies) / seconds, 1),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "max_ms": round(float(latencies_ms.max()), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--output", default=None, help="optional JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    for concurrency in args.concurrency:
+        row = asyncio.run(run_load(args.host, args.port, concurrency, args.requests))
+        print(json.dumps(row))
+        results.append(row)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Stage-level scaling benchmark: for each `--rows` size, builds a work directory
+with synthetic transactions and a copy of config/config.yaml, then runs each
+component in a fresh process (DataIngestion, DataValidation, DataTransformation,
+ModelTrainer, ModelEvaluation, ServingExport, PredictionPipeline.predict_file)
+and records wall time, rows/sec and peak RSS as JSON lines.
+
+Sizes above `--xlsx-max-rows` skip the Excel round trip: the synthetic data is
+written straight to the ingested artifact and DataIngestion is not timed.
+Spectral clustering and the exact silhouette are quadratic in customers, so
+the defaults are `minibatch_kmeans` and the sampled silhouette.
+
+    python -m benchmarks.bench_stages --rows 100000 1000000 10000000 --output bench_stages.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+STAGES = ("ingestion", "validation", "transformation", "trainer", "evaluation", "export", "prediction")
+
+
+def run_stage(stage) -> dict:
+    """
+    Runs one stage in the current process (cwd is the work directory) and
+    returns its measurements. Imports happen before the timer starts.
+    """
+    from src.config.configuration import ConfigurationManager
+    from src.components.data_ingestion import DataIngestion
+    from src.components.data_validation import DataValidation
+    from src.components.data_transformation import DataTransformation
+    from src.components.model_trainer import ModelTrainer
+    from src.components.model_evaluation import ModelEvaluation
+    from src.components.serving_export import ServingExport
+    from src.pipeline.predict_pipeline import PredictionPipeline
+    from src.utils.common import count_table_rows
+    from src.utils.instrumentation import peak_rss_mb
+
+    manager = ConfigurationManager()
+    if stage == "ingestion":
+        config = manager.get_data_ingestion_config()
+        run, rows_path = DataIngestion(config=config).ingest_data, config.ingested_data_path
+    elif stage == "validation":
+        config = manager.get_data_validation_config()
+        run, rows_path = DataValidation(config=config).run_validation, config.data_path
+    elif stage == "transformation":
+        config = manager.get_data_transformation_config()
+        run, rows_path = DataTransformation(config=config).run_transformation, config.data_path
+    elif stage == "trainer":
+        config = manager.get_model_trainer_config()
+        run, rows_path = ModelTrainer(config=config).train_model, config.data_path
+    elif stage == "evaluation":
+        config = manager.get_model_evaluation_config()
+        run, rows_path = ModelEvaluation(config=config).evaluate_model, config.data_path
+    elif stage == "export":
+        config = manager.get_serving_export_config()
+        run, rows_path = ServingExport(config=config).export, None
+    elif stage == "prediction":
+        import numpy as np
+        import pandas as pd
+        from src.utils.common import write_table_chunks
+        trainer_config = manager.get_model_trainer_config()
+        # Raw RFM of every customer, as a scoring job would receive it (not timed).
+        records = np.load(trainer_config.segment_table_path, mmap_mode="r")
+        rows_path = Path("artifacts/bench/customers.parquet")
+        rows_path.parent.mkdir(parents=True, exist_ok=True)
+        write_table_chunks([pd.DataFrame({
+            "CustomerID": records["customer_id"], "Recency": records["recency"],
+            "Frequency": records["frequency"], "Monetary": records["monetary"],
+        })], rows_path)
+        pipeline = PredictionPipeline()
+        run = lambda: pipeline.predict_file(rows_path, "artifacts/bench/assignments.parquet")
+    else:
+        raise ValueError(f"Unknown stage: {stage}. Expected one of {list(STAGES)}")
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    rows = count_table_rows(rows_path) if rows_path else None
+    return {
+        "stage": stage,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds, 1) if rows else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_before_mb": round(rss_before, 1),
+    }
+
+
+def prepare_workdir(workdir, n_rows, args) -> bool:
+    """
+    Writes the config and the synthetic data for one size. Returns whether
+    DataIngestion is part of the run (only when the data fits in an .xlsx).
+    """
+    from benchmarks.synthetic_retail import write_synthetic
+    from src.utils.common import with_artifact_format
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    (workdir / "config").mkdir(parents=True)
+    (workdir / "data").mkdir()
+    with open(REPO_ROOT / "config" / "config.yaml") as f:
+        config = yaml.safe_load(f)
+    config["artifact_format"] = args.artifact_format
+    config["data_ingestion"]["ingest_mode"] = "stream"
+    config["model_sweep"]["enabled"] = False
+    config["model_trainer"]["model_name"] = args.model
+    config["model_trainer"]["use_sweep_result"] = False
+    config["model_evaluation"]["silhouette_mode"] = args.silhouette_mode
+    with open(workdir / "config" / "config.yaml", "w") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+    ingested_path = workdir / with_artifact_format(Path(config["data_ingestion"]["ingested_data_path"]), args.artifact_format)
+    with_ingestion = n_rows <= args.xlsx_max_rows
+    if with_ingestion:
+        write_synthetic(n_rows, workdir / config["data_ingestion"]["source_path"], seed=args.seed)
+    else:
+        ingested_path.parent.mkdir(parents=True, exist_ok=True)
+        write_synthetic(n_rows, ingested_path, seed=args.seed)
+    return with_ingestion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default="bench_workdir", help="scratch directory, one subdirectory per size")
+    parser.add_argument("--artifact-format", default="parquet", choices=["csv", "parquet", "feather"])
+    parser.add_argument("--model", default="minibatch_kmeans")
+    parser.add_argument("--silhouette-mode", default="sampled", choices=["exact", "sampled"])
+    parser.add_argument("--xlsx-max-rows", type=int, default=200_000,
+                        help="largest size that goes through the .xlsx and DataIngestion (writing Excel is slow)")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--output", default=None, help="optional JSON results file")
+    parser.add_argument("--run-stage", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage)))
+        return
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])))
+    env.setdefault("MPLBACKEND", "Agg")
+    results = []
+    for n_rows in args.rows:
+        workdir = Path(args.workdir).resolve() / f"rows_{n_rows}"
+        start = time.perf_counter()
+        with_ingestion = prepare_workdir(workdir, n_rows, args)
+        print(f"Generated {n_rows} rows in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        for stage in args.stages:
+            if stage == "ingestion" and not with_ingestion:
+                continue
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_stages", "--run-stage", stage],
+                cwd=workdir, env=env, capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                sys.stderr.write(completed.stderr)
+                raise RuntimeError(f"Stage {stage} failed at {n_rows} rows")
+            row = {"input_rows": n_rows, **json.loads(completed.stdout.strip().splitlines()[-1])}
+            print(json.dumps(row))
+            results.append(row)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "artifact_format": args.artifact_format,
+                "model": args.model,
+                "silhouette_mode": args.silhouette_mode,
+                "seed": args.seed,
+                "results": results,
+            }, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cold-start budget check for the serving path. In fresh interpreters (like a
+new container or a new scoring worker), measures
+
+  * import: `import src.pipeline.predict_pipeline` and `src.components.segment_lookup`
+  * first prediction: import + `PredictionPipeline()` + one `predict` call
+
+takes the median over `--repeats` runs, and exits non-zero when a budget is
+exceeded or a heavy module (pandas, pyarrow, scipy, sklearn, matplotlib, dill)
+gets imported along the way. The budgets are meant for the default centroid
+assignment: models trained with knn assignment unpickle a scikit-learn tree,
+which pulls in scipy and pandas (see `--allow-modules`). Run it from a project
+directory that has artifacts/serving/model.npz (i.e. after `python main.py`):
+
+    python -m benchmarks.check_cold_start --import-budget-ms 500 --first-prediction-budget-ms 750
+
+tests/test_cold_start.py enforces the same budgets on a tiny exported artifact.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("pandas", "pyarrow", "scipy", "sklearn", "matplotlib", "dill", "PIL")
+IMPORT_BUDGET_MS = 500.0
+FIRST_PREDICTION_BUDGET_MS = 750.0
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import src.pipeline.predict_pipeline
+import src.components.segment_lookup
+imported = time.perf_counter()
+first_prediction = None
+if {predict!r}:
+    pipeline = src.pipeline.predict_pipeline.PredictionPipeline()
+    pipeline.predict([[50.0, 5.0, 1500.0]])
+    first_prediction = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "first_prediction_seconds": first_prediction,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(predict: bool, cwd) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])))
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(predict=predict, heavy=HEAVY_MODULES)],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise RuntimeError("Cold-start probe failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project-dir", default=".", help="directory holding artifacts/serving/model.npz")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--first-prediction-budget-ms", type=float, default=FIRST_PREDICTION_BUDGET_MS)
+    parser.add_argument("--allow-modules", nargs="*", default=[], help="heavy modules the serving path may import")
+    parser.add_argument("--output", default=None, help="optional JSON results file")
+    args = parser.parse_args()
+
+    # Warm the OS file cache once, so the runs measure interpreter work rather than disk.
+    probe(True, args.project_dir)
+    import_runs = [probe(False, args.project_dir) for _ in range(args.repeats)]
+    prediction_runs = [probe(True, args.project_dir) for _ in range(args.repeats)]
+
+    heavy = sorted({
+        name for run in import_runs + prediction_runs for name in run["heavy_modules"] if name not in args.allow_modules
+    })
+    result = {
+        "import_ms": round(statistics.median(run["import_seconds"] for run in import_runs) * 1000, 1),
+        "first_prediction_ms": round(statistics.median(run["first_prediction_seconds"] for run in prediction_runs) * 1000, 1),
+        "import_budget_ms": args.import_budget_ms,
+        "first_prediction_budget_ms": args.first_prediction_budget_ms,
+        "heavy_modules": heavy,
+    }
+    failures = []
+    if result["import_ms"] > args.import_budget_ms:
+        failures.append(f"import took {result['import_ms']} ms (budget {args.import_budget_ms} ms)")
+    if result["first_prediction_ms"] > args.first_prediction_budget_ms:
+        failures.append(f"first prediction took {result['first_prediction_ms']} ms (budget {args.first_prediction_budget_ms} ms)")
+    if heavy:
+        failures.append(f"heavy modules imported on the serving path: {heavy}")
+    result["passed"] = not failures
+
+    print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=4)
+    if failures:
+        sys.exit("Cold-start budget exceeded: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Deterministic synthetic Online Retail transactions with the columns and dtypes
+of `data_validation.column_schemas`, for benchmarks at 100k to 100M rows.
+
+Customers are drawn with log-normal popularity (a few heavy buyers, a long tail),
+invoices have geometric line counts (about 20 lines on average), ~25% of lines
+have no CustomerID, ~2% belong to cancelled ("C"-prefixed) invoices with
+negative quantities, and invoice dates increase through Dec 2010 - Dec 2011.
+The same `seed`, `rows` and block size always give the same data.
+
+    python -m benchmarks.synthetic_retail --rows 1000000 --output data/synthetic.parquet
+"""
+import argparse
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from src.utils.common import write_table_chunks
+from src.components.data_transformation import JUNK_STOCK_CODES
+
+COLUMNS = ["InvoiceNo", "StockCode", "Description", "Quantity", "InvoiceDate", "UnitPrice", "CustomerID", "Country"]
+# Excel's row limit, minus the header row.
+XLSX_MAX_ROWS = 1_048_575
+START = np.datetime64("2010-12-01T08:00")
+SPAN_MINUTES = 373 * 24 * 60
+BLOCK_ROWS = 1_000_000
+
+COUNTRIES = np.array(["United Kingdom", "Germany", "France", "EIRE", "Spain", "Netherlands", "Belgium", "Switzerland", "Portugal", "Australia"])
+COUNTRY_WEIGHTS = np.array([0.89, 0.02, 0.02, 0.018, 0.01, 0.01, 0.008, 0.008, 0.006, 0.01])
+
+
+def _customers(n_rows, seed):
+    # About 125 lines per customer, as in the original workbook.
+    n_customers = max(n_rows // 125, 50)
+    rng = np.random.default_rng([seed, 0])
+    popularity = rng.lognormal(0.0, 1.5, n_customers)
+    countries = rng.choice(len(COUNTRIES), n_customers, p=COUNTRY_WEIGHTS / COUNTRY_WEIGHTS.sum())
+    return np.cumsum(popularity / popularity.sum()), countries
+
+
+def _stock_catalogue(seed):
+    rng = np.random.default_rng([seed, 1])
+    codes = np.array([str(code) for code in range(20000, 24000)] + list(JUNK_STOCK_CODES), dtype=object)
+    popularity = rng.lognormal(0.0, 1.0, len(codes))
+    popularity[-len(JUNK_STOCK_CODES):] = popularity.mean() * 0.05
+    prices = np.round(rng.gamma(2.0, 2.0, len(codes)) + 0.1, 2)
+    descriptions = np.array([f"ITEM {code}" for code in codes], dtype=object)
+    return codes, np.cumsum(popularity / popularity.sum()), prices, descriptions
+
+
+def generate_blocks(n_rows, seed=42, block_rows=BLOCK_ROWS):
+    """
+    Yields the transactions as DataFrames of up to `block_rows` rows. Each
+    block has its own random stream, so any block can be generated on its own.
+    """
+    customer_cdf, customer_countries = _customers(n_rows, seed)
+    codes, code_cdf, prices, descriptions = _stock_catalogue(seed)
+    n_blocks = -(-n_rows // block_rows)
+
+    for block in range(n_blocks):
+        rows = min(block_rows, n_rows - block * block_rows)
+        rng = np.random.default_rng([seed, 2, block])
+
+        # Invoices with geometric line counts, trimmed to exactly `rows` lines.
+        lines = rng.geometric(1 / 20, rows // 10 + 16)
+        while lines.sum() < rows:
+            lines = np.concatenate([lines, rng.geometric(1 / 20, rows // 10 + 16)])
+        n_invoices = int(np.searchsorted(np.cumsum(lines), rows)) + 1
+        lines = lines[:n_invoices]
+        lines[-1] -= lines.sum() - rows
+
+        invoice_customer = np.searchsorted(customer_cdf, rng.random(n_invoices))
+        invoice_guest = rng.random(n_invoices) < 0.25
+        invoice_cancelled = rng.random(n_invoices) < 0.02
+        # Dates increase over the blocks, so the file is in time order like the original.
+        offsets = np.sort(rng.integers(0, SPAN_MINUTES // n_blocks, n_invoices)) + block * (SPAN_MINUTES // n_blocks)
+        invoice_numbers = 536365 + block * block_rows + np.arange(n_invoices)
+
+        invoice_of_line = np.repeat(np.arange(n_invoices), lines)
+        stock = np.searchsorted(code_cdf, rng.random(rows))
+        cancelled = invoice_cancelled[invoice_of_line]
+        quantity = rng.geometric(0.25, rows) * np.where(cancelled, -1, 1)
+        customers = invoice_customer[invoice_of_line]
+
+        yield pd.DataFrame({
+            "InvoiceNo": np.char.add(np.where(invoice_cancelled, "C", ""), invoice_numbers.astype(str))[invoice_of_line].astype(object),
+            "StockCode": codes[stock],
+            "Description": descriptions[stock],
+            "Quantity": quantity.astype(np.int64),
+            "InvoiceDate": (START + offsets.astype("timedelta64[m]"))[invoice_of_line],
+            "UnitPrice": prices[stock],
+            "CustomerID": np.where(invoice_guest[invoice_of_line], np.nan, (customers + 12346).astype(np.float64)),
+            "Country": COUNTRIES[customer_countries[customers]].astype(object),
+        }, columns=COLUMNS)
+
+
+def write_xlsx(blocks, path):
+    """
+    Writes the transactions as a single-sheet workbook like Online_Retail.xlsx
+    (write-only mode, so memory stays flat).
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Online Retail")
+    sheet.append(COLUMNS)
+    rows = 0
+    for block in blocks:
+        block = block.astype({"InvoiceDate": object})
+        block["CustomerID"] = block["CustomerID"].astype(object).where(block["CustomerID"].notna(), None)
+        for row in block.itertuples(index=False, name=None):
+            sheet.append(row)
+        rows += len(block)
+    workbook.save(path)
+    return rows
+
+
+def write_synthetic(n_rows, path, seed=42, block_rows=BLOCK_ROWS) -> int:
+    """
+    Writes `n_rows` synthetic transactions to `path`: .xlsx (up to Excel's
+    row limit), or .csv/.parquet/.feather streamed block by block.
+    """
+    blocks = generate_blocks(n_rows, seed=seed, block_rows=block_rows)
+    if str(path).endswith(".xlsx"):
+        if n_rows > XLSX_MAX_ROWS:
+            raise ValueError(f"Excel holds at most {XLSX_MAX_ROWS} rows, got {n_rows}")
+        return write_xlsx(blocks, path)
+    return write_table_chunks(blocks, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help=".xlsx, .csv, .parquet or .feather")
+    args = parser.parse_args()
+    rows = write_synthetic(args.rows, args.output, seed=args.seed)
+    print(f"Wrote {rows} synthetic transactions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
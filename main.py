@@ -1,12 +1,22 @@
-from src.pipeline.train_pipeline import TrainPipeline
+import argparse
+from src.pipeline.train_pipeline import TrainPipeline, STAGES
 from src.utils.common import logger
 
-try:
-    logger.info(">>> Main: Starting training pipeline <<<")
-    pipeline = TrainPipeline()
-    pipeline.run()
+parser = argparse.ArgumentParser(description="Run the customer segmentation training pipeline.")
+parser.add_argument(
+    "--force", action="append", default=[], choices=[*STAGES, "all"],
+    help="Rerun a stage even if its inputs, config and code are unchanged (repeatable)."
+)
+# Stages start spawned worker processes, which re-import this module.
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    try:
+        logger.info(">>> Main: Starting training pipeline <<<")
+        pipeline = TrainPipeline(force=args.force)
+        pipeline.run()
     
-    logger.info(">>> Main: Training pipeline completed successfully <<<")
-except Exception as e:
-    logger.error(f"Error encountered in main.py: {e}")
-    raise e
\ No newline at end of file
+        logger.info(">>> Main: Training pipeline completed successfully <<<")
+    except Exception as e:
+        logger.error(f"Error encountered in main.py: {e}")
+        raise e
@@ -0,0 +1,27 @@
+import os
+import argparse
+from src.pipeline.predict_pipeline import PredictionPipeline
+from src.utils.common import logger
+
+parser = argparse.ArgumentParser(description="Assign every customer of an RFM file to a segment.")
+parser.add_argument("input_path", help="RFM table with CustomerID, Recency, Frequency and Monetary (.csv, .parquet or .feather).")
+parser.add_argument("output_path", help="Where to write CustomerID -> Cluster; the suffix picks the format.")
+parser.add_argument("--chunk-size", type=int, default=100000, help="Rows scored per chunk (bounds memory).")
+parser.add_argument("--metrics-dir", default=None, help="Write the per-chunk latency report (JSON), Prometheus metrics, live feature statistics and drift report here.")
+args = parser.parse_args()
+
+try:
+    logger.info(">>> Predict: Starting batch scoring <<<")
+    pipeline = PredictionPipeline()
+    pipeline.predict_file(args.input_path, args.output_path, chunksize=args.chunk_size)
+    if args.metrics_dir:
+        pipeline.write_metrics(
+            os.path.join(args.metrics_dir, "predict_report.json"),
+            os.path.join(args.metrics_dir, "predict_metrics.prom"),
+            stats_path=os.path.join(args.metrics_dir, "live_feature_stats.npz"),
+            drift_path=os.path.join(args.metrics_dir, "drift_report.json")
+        )
+    logger.info(">>> Predict: Batch scoring completed successfully <<<")
+except Exception as e:
+    logger.error(f"Error encountered in predict.py: {e}")
+    raise e
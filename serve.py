@@ -0,0 +1,38 @@
+import argparse
+import socket
+import multiprocessing
+from src.pipeline.scoring_service import run_worker
+from src.utils.common import logger
+
+parser = argparse.ArgumentParser(description="Serve customer segment predictions over HTTP with micro-batching.")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8000)
+parser.add_argument("--workers", type=int, default=1, help="Worker processes; each loads the model once and shares the listening socket.")
+parser.add_argument("--max-batch-size", type=int, default=1024, help="Rows after which a micro-batch is scored without waiting further.")
+parser.add_argument("--max-wait-ms", type=float, default=2.0, help="How long the first request of a micro-batch waits for others.")
+args = parser.parse_args()
+
+try:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(1024)
+    logger.info(f">>> Serve: Listening on http://{args.host}:{args.port} with {args.workers} worker(s) <<<")
+
+    if args.workers == 1:
+        run_worker(sock, args.max_batch_size, args.max_wait_ms)
+    else:
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=run_worker, args=(sock, args.max_batch_size, args.max_wait_ms))
+            for _ in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+except KeyboardInterrupt:
+    logger.info(">>> Serve: Shutting down <<<")
+except Exception as e:
+    logger.error(f"Error encountered in serve.py: {e}")
+    raise e
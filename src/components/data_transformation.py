@@ -2,84 +2,282 @@ import os
 import pandas as pd
 import numpy as np
 import datetime as dt
+from pathlib import Path
 from sklearn.preprocessing import StandardScaler
-from src.utils.common import logger, save_dill
+from src.utils.common import logger, load_table, save_table, iter_table, write_table_chunks
+from src.utils.artifact_store import ArtifactStore, artifact_key
 from src.entity.config_entity import DataTransformationConfig
+from src.components.rfm_state import RFMStateStore
+from src.components.rfm_engine import (
+    compute_rfm_fused, compute_rfm_parallel, compute_rfm_partitioned, compute_rfm_snapshots, month_end_snapshots
+)
+from src.components.partitioning import scale_partitions
+from src.components.feature_stats import fit_feature_stats
+
+RFM_SOURCE_COLUMNS = ['InvoiceNo', 'StockCode', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID']
+# Fixed column types of the Feather spill, so every chunk is written with the same schema
+# (a CSV chunk of only numeric invoices would otherwise infer an integer InvoiceNo).
+SPILL_DTYPES = {
+    'InvoiceNo': object, 'StockCode': object, 'Quantity': np.float64, 'UnitPrice': np.float64, 'CustomerID': np.float64,
+}
+JUNK_STOCK_CODES = ['POST', 'D', 'M', 'BANK CHARGES', 'AMAZONFEE', 'CRUK', 'B', 'S']
+# Hashed into the stage fingerprint and into the keys of the artifacts this stage stores.
+TRANSFORMATION_MODULES = [
+    "src.components.data_transformation", "src.components.rfm_engine", "src.components.partitioning", "src.components.feature_stats",
+    "src.components.rfm_state", "src.utils.common", "src.utils.artifact_store",
+]
 
 class DataTransformation:
     def __init__(self, config: DataTransformationConfig):
         self.config = config
+        if config.rfm_mode == "incremental" and (config.partition_key or config.multi_snapshot):
+            # Both read the full history from data_path, not the delta folded into the incremental state.
+            raise ValueError("partition_key and multi_snapshot are not supported with rfm_mode 'incremental'")
         logger.info(f"Data Transformation component initialized with config.")
 
+    def _clean(self, df):
+        logger.info("Starting 'The Great Cleanse'...")
+        df_clean = df.dropna(subset=['CustomerID'])
+
+        df_clean = df_clean[df_clean['Quantity'] > 0]
+
+        df_clean = df_clean[~df_clean['StockCode'].str.upper().isin(JUNK_STOCK_CODES)]
+        df_clean['CustomerID'] = df_clean['CustomerID'].astype(int)
+
+        df_clean['InvoiceDate'] = pd.to_datetime(df_clean['InvoiceDate'])
+        df_clean['total_price'] = df_clean['Quantity'] * df_clean['UnitPrice']
+
+        logger.info(f"Cleaning complete. New shape: {df_clean.shape}")
+        return df_clean
+
+    def _build_rfm(self, df_clean):
+        logger.info("Starting RFM Feature Engineering...")
+        snapshot_date = df_clean['InvoiceDate'].max() + dt.timedelta(days=1)
+
+        recency_df = df_clean.groupby('CustomerID').agg(
+            Last_Purchase_Date=('InvoiceDate', 'max')
+        ).reset_index()
+        recency_df['Recency'] = (snapshot_date - recency_df['Last_Purchase_Date']).dt.days
+
+        frequency_df = df_clean.groupby('CustomerID').agg(
+            Frequency=('InvoiceNo', 'nunique')
+        ).reset_index()
+
+        monetary_df = df_clean.groupby('CustomerID').agg(
+            Monetary=('total_price', 'sum')
+        ).reset_index()
+
+        rfm_df = recency_df[['CustomerID', 'Recency']].merge(
+            frequency_df[['CustomerID', 'Frequency']], on='CustomerID'
+        )
+        rfm_df = rfm_df.merge(
+            monetary_df[['CustomerID', 'Monetary']], on='CustomerID'
+        )
+
+        logger.info(f"RFM table created successfully. Shape: {rfm_df.shape}")
+        return rfm_df
+
+    def _build_rfm_fused(self, path):
+        df = load_table(path, columns=RFM_SOURCE_COLUMNS)
+        logger.info(f"Loaded raw data from {path}. Shape: {df.shape}")
+        logger.info("Starting fused cleaning and RFM aggregation...")
+        rfm_df = compute_rfm_fused(df, JUNK_STOCK_CODES)
+        logger.info(f"RFM table created successfully. Shape: {rfm_df.shape}")
+        return rfm_df
+
+    def _build_rfm_parallel(self, path):
+        n_jobs = self.config.n_jobs or os.cpu_count()
+        logger.info(f"Starting parallel RFM aggregation over {n_jobs} customer partitions...")
+        if path.suffix in ('.feather', '.arrow'):
+            rfm_df = compute_rfm_parallel(path, RFM_SOURCE_COLUMNS, JUNK_STOCK_CODES, n_jobs)
+        else:
+            # Workers share data through a memory-mapped Feather file, so other
+            # formats are spilled to one first, chunk by chunk.
+            spill_path = Path(self.config.root_dir) / 'rfm_partition_spill.feather'
+            write_table_chunks(
+                (chunk.astype(SPILL_DTYPES) for chunk in iter_table(path, self.config.spill_chunk_size, columns=RFM_SOURCE_COLUMNS)),
+                spill_path
+            )
+            try:
+                rfm_df = compute_rfm_parallel(spill_path, RFM_SOURCE_COLUMNS, JUNK_STOCK_CODES, n_jobs)
+            finally:
+                os.remove(spill_path)
+        logger.info(f"RFM table created successfully. Shape: {rfm_df.shape}")
+        return rfm_df
+
+    def _scaler_from_stats(self, stats):
+        """
+        A StandardScaler set from the merged running moments, which equal what
+        `StandardScaler.fit` would compute on the log-RFM frame.
+        """
+        scaler = StandardScaler()
+        scaler.mean_, scaler.scale_ = stats.scaler()
+        scaler.var_ = stats.moments.variance
+        scaler.n_samples_seen_ = stats.count
+        scaler.n_features_in_ = len(stats.feature_names)
+        scaler.feature_names_in_ = np.asarray(stats.feature_names, dtype=object)
+        return scaler
+
+    def _source_inputs(self) -> list:
+        # The files the RFM table is built from, for the keys of the artifacts fitted on it.
+        if self.config.rfm_mode != "incremental":
+            return [self.config.data_path]
+        # Taken before the run folds the delta into the state and saves it.
+        inputs = [self.config.delta_data_path]
+        if os.path.exists(self.config.state_path):
+            inputs.append(self.config.state_path)
+        else:
+            inputs.append(self.config.data_path)
+        return inputs
+
+    def _scale_and_save(self, rfm_df, inputs):
+        """
+        One chunked pass over the RFM table accumulates the moments and
+        histogram sketch of log-RFM (merged across threads); the scaler is set
+        from those moments. A second chunked pass log-transforms, scales and
+        writes each chunk, so the full log-RFM frame is never materialized.
+        The scaler and feature_stats artifacts are keyed by the content of the
+        source `inputs` the RFM table was built from, plus config and code.
+        """
+        logger.info("Starting log-transform and scaling...")
+
+        feature_names = [col for col in rfm_df.columns if col != 'CustomerID']
+        raw = rfm_df[feature_names].to_numpy(dtype=np.float64)
+        customer_ids = rfm_df['CustomerID'].to_numpy()
+        chunk_size = self.config.scaler_chunk_size
+        stats = fit_feature_stats(raw, feature_names, chunk_size, self.config.n_jobs or os.cpu_count())
+        scaler = self._scaler_from_stats(stats)
+
+        def scaled_chunks():
+            for begin in range(0, len(raw), chunk_size):
+                chunk = pd.DataFrame(
+                    (np.log1p(raw[begin:begin + chunk_size]) - scaler.mean_) / scaler.scale_, columns=feature_names
+                )
+                chunk['CustomerID'] = customer_ids[begin:begin + chunk_size]
+                yield chunk
+
+        write_table_chunks(scaled_chunks(), self.config.transformed_data_path)
+        logger.info("Log-transform and scaling complete.")
+        logger.info(f"Transformed data saved to: {self.config.transformed_data_path}")
+
+
+        store = ArtifactStore(self.config.artifact_store_dir)
+        store.put(
+            name=self.config.scaler_artifact,
+            key=artifact_key({"artifact": "standard_scaler", "rfm_mode": self.config.rfm_mode}, inputs, TRANSFORMATION_MODULES),
+            arrays={"mean": scaler.mean_, "scale": scaler.scale_},
+            meta={"feature_names": feature_names},
+            obj=scaler
+        )
+        logger.info(f"Scaler stored as artifact '{self.config.scaler_artifact}'.")
+
+        stats_arrays = stats.arrays()
+        del stats_arrays["feature_names"]
+        store.put(
+            name=self.config.feature_stats_artifact,
+            key=artifact_key({"artifact": "feature_stats", "rfm_mode": self.config.rfm_mode}, inputs, TRANSFORMATION_MODULES),
+            arrays=stats_arrays,
+            meta={"feature_names": feature_names, **stats.summary()}
+        )
+        logger.info(f"Feature statistics of {stats.count} customers stored as artifact '{self.config.feature_stats_artifact}'.")
+
+    def run_partitioned_transformation(self):
+        """
+        RFM per (partition_key value, customer) in one pass over the data,
+        scaled per partition, for the per-partition models. A customer who
+        bought in two markets appears once in each. The per-partition scalers
+        are stored together as one artifact of (partitions x features) arrays.
+        """
+        key = self.config.partition_key
+        df = load_table(self.config.data_path, columns=[*RFM_SOURCE_COLUMNS, key])
+        logger.info(f"Starting RFM aggregation per {key}...")
+        rfm_df = compute_rfm_partitioned(df, key, JUNK_STOCK_CODES)
+        del df
+
+        feature_names = [col for col in rfm_df.columns if col not in (key, 'CustomerID')]
+        scaled_df, scalers = scale_partitions(rfm_df, key, feature_names)
+        save_table(scaled_df, self.config.partitioned_data_path)
+        logger.info(f"Partitioned RFM for {len(scalers)} values of {key} saved to: {self.config.partitioned_data_path}")
+
+        partitions = list(scalers)
+        mean = np.stack([scalers[p][0] for p in partitions])
+        scale = np.stack([scalers[p][1] for p in partitions])
+        ArtifactStore(self.config.artifact_store_dir).put(
+            name=self.config.partition_scaler_artifact,
+            key=artifact_key({"artifact": "partition_scalers", "partition_key": key, "partitions": partitions}, [mean, scale], TRANSFORMATION_MODULES),
+            arrays={"mean": mean, "scale": scale},
+            meta={"partition_key": key, "partitions": partitions, "feature_names": feature_names}
+        )
+        logger.info(f"Per-partition scalers stored as artifact '{self.config.partition_scaler_artifact}'.")
+
+    def run_snapshot_transformation(self):
+        """
+        Raw RFM of every customer as of each of the last `snapshot_months`
+        month-ends, as one long table, from a single date-ordered pass over
+        the transactions (see `compute_rfm_snapshots`).
+        """
+        df = load_table(self.config.data_path, columns=RFM_SOURCE_COLUMNS)
+        snapshot_dates = month_end_snapshots(pd.to_datetime(df['InvoiceDate']).max(), self.config.snapshot_months)
+        window = f"{self.config.snapshot_window_days}-day window" if self.config.snapshot_window_days else "all history"
+        logger.info(f"Starting RFM aggregation at {len(snapshot_dates)} month-end snapshots ({window})...")
+        snapshots_df = compute_rfm_snapshots(
+            df, JUNK_STOCK_CODES, snapshot_dates, window_days=self.config.snapshot_window_days
+        )
+        save_table(snapshots_df, self.config.snapshots_data_path)
+        logger.info(f"RFM snapshots ({len(snapshots_df)} rows) saved to: {self.config.snapshots_data_path}")
+
+    def _load_clean(self, path):
+        df = load_table(path, columns=RFM_SOURCE_COLUMNS)
+        logger.info(f"Loaded raw data from {path}. Shape: {df.shape}")
+        return self._clean(df)
+
+    def run_incremental_transformation(self):
+        """
+        Folds only the new invoices in `delta_data_path` into the persisted
+        per-customer state, then recomputes Recency against the new snapshot.
+        The state is saved only after `verify_incremental` (if on) passes.
+        The first run bootstraps the state from the full history.
+        """
+        store = RFMStateStore(self.config.state_path)
+        if store.exists():
+            delta_clean = self._load_clean(self.config.delta_data_path)
+            state = store.apply_delta(store.load(), delta_clean)
+        else:
+            logger.info("No RFM state found, bootstrapping it from the full history...")
+            state = store.build(self._load_clean(self.config.data_path))
+
+        rfm_df = store.to_rfm(state)
+        logger.info(f"RFM table created from state. Shape: {rfm_df.shape}")
+
+        if self.config.verify_incremental:
+            # Before saving, so a divergent state is never persisted for the next run to build on.
+            logger.info("Verifying incremental RFM against a full rebuild...")
+            store.verify(rfm_df, self._build_rfm(self._load_clean(self.config.data_path)))
+        store.save(state)
+        return rfm_df
+
     def run_transformation(self):
         logger.info("--- Starting Data Transformation ---")
-        
+
         try:
-            df = pd.read_csv(self.config.data_path)
-            logger.info(f"Loaded raw data from {self.config.data_path}. Shape: {df.shape}")
-
-            logger.info("Starting 'The Great Cleanse'...")
-            df_clean = df.dropna(subset=['CustomerID'])
-
-            df_clean = df_clean[df_clean['Quantity'] > 0]
-            junk_codes_list = ['POST', 'D', 'M', 'BANK CHARGES', 'AMAZONFEE', 'CRUK', 'B', 'S']
-
-            df_clean = df_clean[~df_clean['StockCode'].str.upper().isin(junk_codes_list)]
-            df_clean['CustomerID'] = df_clean['CustomerID'].astype(int)
-
-            df_clean['InvoiceDate'] = pd.to_datetime(df_clean['InvoiceDate'])
-            df_clean['total_price'] = df_clean['Quantity'] * df_clean['UnitPrice']
-            
-            logger.info(f"Cleaning complete. New shape: {df_clean.shape}")
-
-            logger.info("Starting RFM Feature Engineering...")
-            snapshot_date = df_clean['InvoiceDate'].max() + dt.timedelta(days=1)
-
-            recency_df = df_clean.groupby('CustomerID').agg(
-                Last_Purchase_Date=('InvoiceDate', 'max')
-            ).reset_index()
-            recency_df['Recency'] = (snapshot_date - recency_df['Last_Purchase_Date']).dt.days
-            
-            frequency_df = df_clean.groupby('CustomerID').agg(
-                Frequency=('InvoiceNo', 'nunique')
-            ).reset_index()
-            
-            monetary_df = df_clean.groupby('CustomerID').agg(
-                Monetary=('total_price', 'sum')
-            ).reset_index()
-            
-            rfm_df = recency_df[['CustomerID', 'Recency']].merge(
-                frequency_df[['CustomerID', 'Frequency']], on='CustomerID'
-            )
-            rfm_df = rfm_df.merge(
-                monetary_df[['CustomerID', 'Monetary']], on='CustomerID'
-            )
-            
-            logger.info(f"RFM table created successfully. Shape: {rfm_df.shape}")
-            logger.info("Starting log-transform and scaling...")
-            
-            rfm_features = rfm_df.drop('CustomerID', axis=1)
-            rfm_log = np.log1p(rfm_features)
-            
-
-            scaler = StandardScaler()
-            scaler.fit(rfm_log)
-            
-            
-            rfm_scaled_data = scaler.transform(rfm_log)
-            rfm_scaled_df = pd.DataFrame(rfm_scaled_data, columns=rfm_features.columns)
-            rfm_scaled_df['CustomerID'] = rfm_df['CustomerID'].values
-            
-            logger.info("Log-transform and scaling complete.")
-
-            
-            rfm_scaled_df.to_csv(self.config.transformed_data_path, index=False)
-            logger.info(f"Transformed data saved to: {self.config.transformed_data_path}")
-            
-            
-            save_dill(data=scaler, path=self.config.scaler_path)
-            logger.info(f"Scaler object saved to: {self.config.scaler_path}")
+            inputs = self._source_inputs()
+            if self.config.rfm_mode == "incremental":
+                rfm_df = self.run_incremental_transformation()
+            elif self.config.rfm_engine == "parallel":
+                rfm_df = self._build_rfm_parallel(Path(self.config.data_path))
+            elif self.config.rfm_engine == "fused":
+                rfm_df = self._build_rfm_fused(self.config.data_path)
+            else:
+                rfm_df = self._build_rfm(self._load_clean(self.config.data_path))
+
+            self._scale_and_save(rfm_df, inputs)
+
+            if self.config.partition_key:
+                self.run_partitioned_transformation()
+
+            if self.config.multi_snapshot:
+                self.run_snapshot_transformation()
 
         except Exception as e:
             logger.error(f"Error during data transformation: {e}")
-            raise e
\ No newline at end of file
+            raise e
@@ -1,79 +1,131 @@
+import json
 import pandas as pd
-from src.utils.common import logger
+from src.utils.common import logger, iter_table, read_table_columns, save_json
 from src.entity.config_entity import DataValidationConfig
 
+
+def _dtype_family(dtype) -> str:
+    # Typed artifacts (Parquet/Feather) carry int32, float32, category, string and
+    # datetime columns where the CSV round trip yields int64/float64/object.
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    return "object"
+
+
+def _merge_families(first, second) -> str:
+    # A CSV chunk of all-numeric InvoiceNo parses as int while the file as a
+    # whole is object, so families widen across chunks the way read_csv would.
+    if first == second:
+        return first
+    if {first, second} == {"int", "float"}:
+        return "float"
+    return "object"
+
+
+# Row-level rules: (column, check) where check marks the failing values of a chunk.
+ROW_RULES = {
+    "customer_id_not_null": ("CustomerID", lambda values, rule: values.isna()),
+    "quantity_sign": ("Quantity", lambda values, rule: ~(values > 0)),
+    "invoice_date_parseable": ("InvoiceDate", lambda values, rule: pd.to_datetime(values, errors='coerce').isna()),
+    "unit_price_range": ("UnitPrice", lambda values, rule: ~values.between(rule.get('min', 0.0), rule.get('max', float('inf')))),
+}
+
+
 class DataValidation:
     def __init__(self, config: DataValidationConfig):
         self.config = config
 
-    def validate_columns(self) -> bool:
-        validation_passed = True
-        try:
-            data = pd.read_csv(self.config.data_path)
-            all_cols = list(data.columns)
-            required_cols = self.config.required_columns
-
-            logger.info("Validating column presence...")
-            for col in required_cols:
-                if col not in all_cols:
-                    validation_passed = False
-                    logger.warning(f"Validation FAILED: Missing column: {col}")
-            
-            if validation_passed:
-                logger.info("Column presence validation PASSED.")
-            
-            return validation_passed
+    def _observe_schema(self, chunk, observed):
+        for col in chunk.columns:
+            family = _dtype_family(chunk[col].dtype)
+            observed[col] = _merge_families(observed[col], family) if col in observed else family
 
-        except Exception as e:
-            logger.error(f"Error during column validation: {e}")
-            return False
+    def _schema_mismatches(self, observed):
+        mismatches = {}
+        for col, expected_dtype in self.config.column_schemas.items():
+            if col not in observed:
+                continue
+            if observed[col] != _dtype_family(pd.api.types.pandas_dtype(expected_dtype)):
+                mismatches[col] = {"expected": expected_dtype, "actual": observed[col]}
+                logger.warning(f"Validation FAILED for column '{col}': Expected type '{expected_dtype}', but got '{observed[col]}'")
+        return mismatches
 
-    def validate_schemas(self) -> bool:
-        validation_passed = True
-        try:
-            data = pd.read_csv(self.config.data_path)
-            schemas = self.config.column_schemas
-            
-            logger.info("Validating column data types (schemas)...")
-            for col, expected_dtype in schemas.items():
-                actual_dtype = str(data[col].dtype)
-                
-                if actual_dtype != expected_dtype:
-                    validation_passed = False
-                    logger.warning(f"Validation FAILED for column '{col}': Expected type '{expected_dtype}', but got '{actual_dtype}'")
-            
-            if validation_passed:
-                logger.info("Column schema validation PASSED.")
-                
-            return validation_passed
-            
-        except Exception as e:
-            logger.error(f"Error during schema validation: {e}")
-            return False
+    def _failure_samples(self, chunk, failed, limit):
+        sample = chunk[failed].head(limit)
+        records = json.loads(sample.to_json(orient='records', date_format='iso'))
+        return [{"row": int(row), **record} for row, record in zip(sample.index, records)]
 
     def run_validation(self):
+        """
+        Validates the ingested data in a single streaming pass: the header is
+        read once for column presence, then every chunk is checked against the
+        dtype families in `column_schemas` and the vectorized row rules. Only
+        counters and a bounded number of failing rows are kept, and the result
+        is written as a JSON report.
+        """
         logger.info("Data Validation component: Starting validation...")
-        columns_ok = self.validate_columns()
-        schemas_ok = self.validate_schemas()
-        
-        validation_status = (columns_ok and schemas_ok)
         try:
-            with open(self.config.validation_status_file, 'w') as f:
-                if validation_status:
-                    f.write("Validation Status: PASS")
-                    logger.info("Data validation successful. Status file written.")
-                else:
-                    f.write("Validation Status: FAIL")
-                    logger.warning("Data validation FAILED. Status file written.")
-                    
-                    raise Exception("Data validation failed. Check logs for details.")
-                
-        except Exception as e:
-            logger.error(f"Error writing validation status file or raising exception: {e}")
-            
-            if "Data validation failed" in str(e):
-                raise e 
-            else:
-                raise Exception(f"Failed to write status file: {e}")
+            all_cols = read_table_columns(self.config.data_path)
+            missing = [col for col in self.config.required_columns if col not in all_cols]
+            for col in missing:
+                logger.warning(f"Validation FAILED: Missing column: {col}")
+
+            rules = {}
+            for name, rule in self.config.rules.items():
+                if name not in ROW_RULES:
+                    raise ValueError(f"Unknown validation rule in config: {name}")
+                if ROW_RULES[name][0] in all_cols:
+                    rules[name] = rule
+            results = {
+                name: {"failures": 0, "samples": []} for name in rules
+            }
+            observed_families = {}
+            columns = [col for col in all_cols if col in self.config.column_schemas]
+            rows = 0
 
+            logger.info(f"Validating schemas and row rules in chunks of {self.config.chunk_size} rows...")
+            for chunk in iter_table(self.config.data_path, self.config.chunk_size, columns=columns):
+                rows += len(chunk)
+                self._observe_schema(chunk, observed_families)
+                for name, rule in rules.items():
+                    column, check = ROW_RULES[name]
+                    failed = check(chunk[column], rule).to_numpy(dtype=bool)
+                    result = results[name]
+                    result["failures"] += int(failed.sum())
+                    room = self.config.max_failure_samples - len(result["samples"])
+                    if failed.any() and room > 0:
+                        result["samples"].extend(self._failure_samples(chunk, failed, room))
+
+            schema_mismatches = self._schema_mismatches(observed_families)
+            for name, result in results.items():
+                result["failure_rate"] = result["failures"] / rows if rows else 0.0
+                result["max_failure_rate"] = rules[name].get('max_failure_rate', 0.0)
+                result["passed"] = result["failure_rate"] <= result["max_failure_rate"]
+                if not result["passed"]:
+                    logger.warning(
+                        f"Validation FAILED for rule '{name}': {result['failures']} rows "
+                        f"({result['failure_rate']:.2%} > {result['max_failure_rate']:.2%})"
+                    )
+
+            validation_status = not missing and not schema_mismatches and all(r["passed"] for r in results.values())
+            report = {
+                "status": "PASS" if validation_status else "FAIL",
+                "rows": rows,
+                "missing_columns": missing,
+                "schema_mismatches": schema_mismatches,
+                "rules": results,
+            }
+            save_json(path=self.config.validation_report_file, data=report)
+
+        except Exception as e:
+            logger.error(f"Error during data validation: {e}")
+            raise e
 
+        if not validation_status:
+            logger.warning(f"Data validation FAILED. Report written to {self.config.validation_report_file}")
+            raise Exception("Data validation failed. Check the validation report for details.")
+        logger.info(f"Data validation successful over {rows} rows. Report written to {self.config.validation_report_file}")
@@ -0,0 +1,352 @@
+"""
+Constant-memory, mergeable statistics of log-RFM features.
+
+`RunningMoments` keeps count / mean / sum of squared deviations per feature
+and merges two accumulators exactly (Chan et al.'s pairwise update), so a
+scaler fitted chunk by chunk, or on shards in separate workers, matches one
+fitted on the whole table. `HistogramSketch` is a fixed-bin histogram per
+feature (plus under- and overflow bins) that answers approximate quantiles and
+merges by adding counts. `FeatureStats` combines the two over log1p of raw
+features, is what DataTransformation fits the scaler with and what
+PredictionPipeline keeps for live traffic, and compares two distributions for
+drift. Memory never depends on the number of rows seen.
+
+Run as a module to merge the live statistics of several scoring workers and
+compare them against the training reference:
+
+    python -m src.components.feature_stats artifacts/serving/feature_stats.npz live_1.npz live_2.npz
+"""
+import os
+import sys
+import json
+import threading
+import numpy as np
+
+# log1p of RFM values: Recency and Frequency stay well below 16 (e^16 ~ 9 million); 0.05-wide bins.
+DEFAULT_RANGE = (0.0, 16.0)
+DEFAULT_BINS = 320
+# Buckets of the population stability index, cut at reference quantiles.
+PSI_BUCKETS = 10
+
+
+def scale_from_variance(variance) -> np.ndarray:
+    # StandardScaler semantics: population std, 1 where it is (numerically) 0.
+    scale = np.sqrt(np.maximum(variance, 0.0))
+    scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+    return scale
+
+
+class RunningMoments:
+    """
+    Count, mean and sum of squared deviations (M2) per feature.
+    """
+    def __init__(self, n_features: int):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        self._combine(len(X), batch_mean, batch_m2)
+
+    def _combine(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+
+    def merge(self, other: "RunningMoments") -> "RunningMoments":
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+        return self
+
+    @property
+    def variance(self) -> np.ndarray:
+        return self.m2 / self.count if self.count else np.zeros_like(self.m2)
+
+    @property
+    def scale(self) -> np.ndarray:
+        return scale_from_variance(self.variance)
+
+
+class HistogramSketch:
+    """
+    Fixed-bin histogram per feature over [low, high), with one underflow and
+    one overflow bin on either side. Quantiles interpolate linearly inside a
+    bin, so they are exact to within one bin width in range.
+    """
+    def __init__(self, n_features: int, low: float = DEFAULT_RANGE[0], high: float = DEFAULT_RANGE[1], n_bins: int = DEFAULT_BINS):
+        self.low, self.high, self.n_bins = float(low), float(high), int(n_bins)
+        self.width = (self.high - self.low) / self.n_bins
+        self.counts = np.zeros((n_features, self.n_bins + 2), dtype=np.int64)
+
+    @property
+    def edges(self) -> np.ndarray:
+        return np.linspace(self.low, self.high, self.n_bins + 1)
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return
+        bins = np.floor((X - self.low) / self.width)
+        # Bin 0 is the underflow, n_bins + 1 the overflow.
+        bins = np.clip(bins, -1, self.n_bins).astype(np.int64) + 1
+        bins += np.arange(X.shape[1]) * (self.n_bins + 2)
+        np.add.at(self.counts.reshape(-1), bins.reshape(-1), 1)
+
+    def _check_compatible(self, other):
+        if (self.low, self.high, self.n_bins) != (other.low, other.high, other.n_bins) or self.counts.shape != other.counts.shape:
+            raise ValueError("Histogram sketches with different bins or features cannot be combined")
+
+    def merge(self, other: "HistogramSketch") -> "HistogramSketch":
+        self._check_compatible(other)
+        self.counts += other.counts
+        return self
+
+    def quantiles(self, q) -> np.ndarray:
+        """
+        Approximate quantiles, as a (len(q), n_features) array; values in the
+        under/overflow bins are reported as `low` / `high`.
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        result = np.full((len(q), len(self.counts)), np.nan)
+        edges = np.concatenate([[self.low], self.edges, [self.high]])
+        for feature, counts in enumerate(self.counts):
+            total = counts.sum()
+            if total == 0:
+                continue
+            cumulative = np.cumsum(counts)
+            targets = q * total
+            bins = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(counts) - 1)
+            before = np.where(bins > 0, cumulative[bins - 1], 0)
+            fraction = np.where(counts[bins] > 0, (targets - before) / np.maximum(counts[bins], 1), 0.0)
+            # edges[b]..edges[b + 1] bound bin b (the outer bins collapse to low / high).
+            result[:, feature] = edges[bins] + np.clip(fraction, 0.0, 1.0) * (edges[bins + 1] - edges[bins])
+        return result
+
+
+class FeatureStats:
+    """
+    Moments and histogram sketch of log1p(features), with a count of rows
+    skipped for non-finite values. `update` is thread-safe.
+
+    With `buffer_rows`, raw rows are first copied into a fixed buffer and
+    folded in a block at a time (and before any read), which keeps per-call
+    updates of one or a few rows cheap on the serving hot path.
+    """
+    def __init__(self, feature_names, low: float = DEFAULT_RANGE[0], high: float = DEFAULT_RANGE[1],
+                 n_bins: int = DEFAULT_BINS, buffer_rows: int = 0):
+        self.feature_names = [str(name) for name in feature_names]
+        self.moments = RunningMoments(len(self.feature_names))
+        self.sketch = HistogramSketch(len(self.feature_names), low, high, n_bins)
+        self.n_invalid = 0
+        self._buffer = np.empty((buffer_rows, len(self.feature_names))) if buffer_rows else None
+        self._buffered = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def like(cls, other: "FeatureStats", buffer_rows: int = 0) -> "FeatureStats":
+        """
+        An empty accumulator with the same features and bins as `other`.
+        """
+        return cls(other.feature_names, other.sketch.low, other.sketch.high, other.sketch.n_bins, buffer_rows)
+
+    @property
+    def count(self) -> int:
+        self.flush()
+        return self.moments.count
+
+    def _fold(self, X):
+        # Caller holds the lock.
+        X = np.log1p(X)
+        finite = np.isfinite(X).all(axis=1)
+        if not finite.all():
+            X = X[finite]
+        self.n_invalid += int(len(finite) - len(X))
+        self.moments.update(X)
+        self.sketch.update(X)
+
+    def update(self, X):
+        """
+        Adds raw feature rows (n x features, in `feature_names` order).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        with self._lock:
+            if self._buffer is None or len(X) >= len(self._buffer):
+                self._fold(X)
+                return
+            if self._buffered + len(X) > len(self._buffer):
+                self._fold(self._buffer[:self._buffered])
+                self._buffered = 0
+            self._buffer[self._buffered:self._buffered + len(X)] = X
+            self._buffered += len(X)
+
+    def flush(self):
+        """
+        Folds any buffered rows into the moments and sketch.
+        """
+        if self._buffered:
+            with self._lock:
+                if self._buffered:
+                    self._fold(self._buffer[:self._buffered])
+                    self._buffered = 0
+
+    def merge(self, other: "FeatureStats") -> "FeatureStats":
+        if other.feature_names != self.feature_names:
+            raise ValueError(f"Cannot merge statistics of {other.feature_names} into {self.feature_names}")
+        self.flush()
+        other.flush()
+        with self._lock:
+            self.moments.merge(other.moments)
+            self.sketch.merge(other.sketch)
+            self.n_invalid += other.n_invalid
+        return self
+
+    def scaler(self):
+        """
+        (mean, scale) of log1p(features), as StandardScaler would fit them.
+        """
+        self.flush()
+        return self.moments.mean.copy(), self.moments.scale
+
+    def summary(self, quantiles=(0.05, 0.5, 0.95)) -> dict:
+        self.flush()
+        values = self.sketch.quantiles(quantiles)
+        std = np.sqrt(self.moments.variance)
+        return {
+            "count": int(self.count),
+            "n_invalid": int(self.n_invalid),
+            "features": {
+                name: {
+                    "mean": float(self.moments.mean[i]),
+                    "std": float(std[i]),
+                    **{f"p{round(q * 100)}": float(values[j, i]) for j, q in enumerate(quantiles)},
+                }
+                for i, name in enumerate(self.feature_names)
+            },
+        }
+
+    def arrays(self) -> dict:
+        """
+        The accumulator state as plain arrays (for the artifact store or an
+        npz); counts are one-element arrays, as the store memory-maps them.
+        """
+        self.flush()
+        return {
+            "count": np.asarray([self.moments.count], dtype=np.int64),
+            "mean": self.moments.mean,
+            "m2": self.moments.m2,
+            "histogram": self.sketch.counts,
+            "range": np.asarray([self.sketch.low, self.sketch.high]),
+            "n_invalid": np.asarray([self.n_invalid], dtype=np.int64),
+            "feature_names": np.asarray(self.feature_names, dtype=str),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, feature_names=None) -> "FeatureStats":
+        if feature_names is None:
+            feature_names = np.asarray(arrays["feature_names"]).tolist()
+        low, high = (float(v) for v in arrays["range"])
+        histogram = np.asarray(arrays["histogram"], dtype=np.int64)
+        stats = cls(feature_names, low, high, histogram.shape[1] - 2)
+        stats.moments.count = int(arrays["count"][0])
+        stats.moments.mean = np.array(arrays["mean"], dtype=np.float64)
+        stats.moments.m2 = np.array(arrays["m2"], dtype=np.float64)
+        stats.sketch.counts = histogram.copy()
+        stats.n_invalid = int(arrays["n_invalid"][0])
+        return stats
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(str(path)) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        arrays = self.arrays()
+        with self._lock:
+            np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> "FeatureStats":
+        with np.load(path) as arrays:
+            return cls.from_arrays(arrays)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def drift(self, reference: "FeatureStats", buckets: int = PSI_BUCKETS) -> dict:
+        """
+        Per-feature drift of this distribution against `reference`: the mean
+        shift in reference standard deviations, and the population stability
+        index over `buckets` buckets cut at the reference's quantiles (rule of
+        thumb: < 0.1 stable, 0.1-0.25 moderate, > 0.25 significant shift).
+        """
+        self.flush()
+        reference.flush()
+        self.sketch._check_compatible(reference.sketch)
+        reference_std = reference.moments.scale
+        result = {"count": int(self.count), "reference_count": int(reference.count), "features": {}}
+        for i, name in enumerate(self.feature_names):
+            psi = None
+            if self.count and reference.count:
+                ref_counts, live_counts = reference.sketch.counts[i], self.sketch.counts[i]
+                # Group the shared bins into buckets of about equal reference mass.
+                cuts = np.searchsorted(np.cumsum(ref_counts), np.arange(1, buckets) * ref_counts.sum() / buckets, side='left')
+                cuts = np.unique(np.concatenate([[0], cuts + 1, [len(ref_counts)]]))
+                ref_share = np.add.reduceat(ref_counts, cuts[:-1]) / ref_counts.sum()
+                live_share = np.add.reduceat(live_counts, cuts[:-1]) / live_counts.sum()
+                ref_share, live_share = np.maximum(ref_share, 1e-4), np.maximum(live_share, 1e-4)
+                psi = float(((live_share - ref_share) * np.log(live_share / ref_share)).sum())
+            result["features"][name] = {
+                "mean_shift_std": float((self.moments.mean[i] - reference.moments.mean[i]) / reference_std[i]) if self.count else None,
+                "psi": psi,
+            }
+        return result
+
+
+def merge_feature_stats(stats) -> FeatureStats:
+    """
+    Merges accumulators (e.g. one per worker) into a new one.
+    """
+    stats = list(stats)
+    merged = FeatureStats.like(stats[0])
+    for item in stats:
+        merged.merge(item)
+    return merged
+
+
+def fit_feature_stats(X, feature_names, chunk_size: int, n_jobs: int = 1) -> FeatureStats:
+    """
+    Statistics of raw rows `X`, accumulated over `chunk_size`-row chunks by
+    `n_jobs` threads (NumPy releases the GIL in the per-chunk work) and
+    merged; the result does not depend on the chunking.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fit(begin):
+        stats = FeatureStats(feature_names)
+        stats.update(X[begin:begin + chunk_size])
+        return stats
+
+    starts = range(0, len(X), chunk_size)
+    if n_jobs <= 1 or len(starts) <= 1:
+        return merge_feature_stats([FeatureStats(feature_names)] + [fit(begin) for begin in starts])
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return merge_feature_stats([FeatureStats(feature_names)] + list(executor.map(fit, starts)))
+
+
+if __name__ == "__main__":
+    reference = FeatureStats.load(sys.argv[1])
+    live = merge_feature_stats(FeatureStats.load(path) for path in sys.argv[2:])
+    print(json.dumps({"live": live.summary(), "drift": live.drift(reference)}, indent=4))
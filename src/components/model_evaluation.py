@@ -1,107 +1,142 @@
+import os
+from multiprocessing import parent_process
 import pandas as pd
-from sklearn.metrics import silhouette_score, silhouette_samples
-import matplotlib.pyplot as plt
+from sklearn.metrics import davies_bouldin_score, calinski_harabasz_score
 import numpy as np
-import matplotlib.cm as cm  
-from src.utils.common import logger, load_dill, save_json
+from src.utils.common import logger, save_json, load_table
+from src.utils.artifact_store import ArtifactStore
+from src.utils.dag_scheduler import DAGScheduler
 from src.entity.config_entity import ModelEvaluationConfig
+from src.components.silhouette_engine import chunked_silhouette_samples, stratified_silhouette_estimate
+from src.components.silhouette_plot import (
+    PLOT_MODES, silhouette_curves, save_curves, render_silhouette_plot, render_in_background
+)
 from pathlib import Path
 
 class ModelEvaluation:
     def __init__(self, config: ModelEvaluationConfig):
         self.config = config
+        if config.silhouette_plot_mode not in PLOT_MODES:
+            raise ValueError(f"Unknown silhouette plot mode: {config.silhouette_plot_mode}. Expected one of {PLOT_MODES}")
         logger.info(f"Model Evaluation component initialized.")
 
-    def _generate_silhouette_plot(self, data, cluster_labels, n_clusters, silhouette_avg):
+    def _generate_silhouette_plot(self, sample_silhouette_values, cluster_labels, n_clusters, silhouette_avg):
+        """
+        Saves the silhouette curves (quantile-reduced) as JSON for the app, and
+        renders the PNG: from every sample in "full" mode, from the reduced
+        curves in "quantile" mode, in a background process if configured and
+        this is the pipeline's main process (a pool worker renders inline, as
+        nothing would wait for its renders).
+        """
         logger.info(f"Generating Silhouette Plot for {n_clusters} clusters...")
         try:
-            
-            fig, ax1 = plt.subplots(1, 1)
-            fig.set_size_inches(10, 7)
-
-            ax1.set_xlim([-0.2, 0.7])
-            ax1.set_ylim([0, len(data) + (n_clusters + 1) * 10])
-
-            
-            sample_silhouette_values = silhouette_samples(data, cluster_labels)
-
-            y_lower = 10
-            for i in range(n_clusters):
-                ith_cluster_silhouette_values = sample_silhouette_values[cluster_labels == i]
-                ith_cluster_silhouette_values.sort()
-
-                size_cluster_i = ith_cluster_silhouette_values.shape[0]
-                y_upper = y_lower + size_cluster_i
-
-                color = cm.nipy_spectral(float(i) / n_clusters)
-                ax1.fill_betweenx(
-                    np.arange(y_lower, y_upper),
-                    0,
-                    ith_cluster_silhouette_values,
-                    facecolor=color,
-                    edgecolor=color,
-                    alpha=0.7,
-                )
-                
-                ax1.text(-0.05, y_lower + 0.5 * size_cluster_i, str(i))
-                y_lower = y_upper + 10  
-
-            ax1.set_title("Silhouette Plot for the various clusters")
-            ax1.set_xlabel("Silhouette coefficient values")
-            ax1.set_ylabel("Cluster label")
-
-            
-            ax1.axvline(x=silhouette_avg, color="red", linestyle="--")
-            ax1.set_yticks([])  # Clear the yaxis labels / ticks
-            ax1.set_xticks([-0.2, 0, 0.2, 0.4, 0.6, 0.7])
+            reduced = silhouette_curves(
+                sample_silhouette_values, cluster_labels, n_clusters, silhouette_avg,
+                n_points=self.config.plot_quantiles
+            )
+            save_curves(reduced, self.config.silhouette_plot_data_path)
+            logger.info(f"Silhouette plot data saved to: {self.config.silhouette_plot_data_path}")
 
-            
-            plt.savefig(self.config.silhouette_plot_path)
+            if self.config.silhouette_plot_mode == "full":
+                curves = silhouette_curves(sample_silhouette_values, cluster_labels, n_clusters, silhouette_avg)
+                render_silhouette_plot(curves, self.config.silhouette_plot_path)
+            elif self.config.plot_in_background and parent_process() is None:
+                # Drop the previous plot, so a failed render leaves no stale PNG behind.
+                if os.path.exists(self.config.silhouette_plot_path):
+                    os.remove(self.config.silhouette_plot_path)
+                render_in_background(self.config.silhouette_plot_data_path, self.config.silhouette_plot_path)
+                logger.info(f"Silhouette plot rendering in the background to: {self.config.silhouette_plot_path}")
+                return
+            else:
+                render_silhouette_plot(reduced, self.config.silhouette_plot_path)
             logger.info(f"Silhouette plot saved to: {self.config.silhouette_plot_path}")
-            plt.close() 
         except Exception as e:
             logger.error(f"Error generating silhouette plot: {e}")
             raise e
 
+    def _compute_silhouette(self, features, cluster_labels):
+        # Per-sample silhouettes are computed once and reused for the score and the plot.
+        if self.config.silhouette_mode == "sampled":
+            logger.info(f"Estimating Silhouette Score from a stratified sample of {self.config.sample_size} rows...")
+            estimate = stratified_silhouette_estimate(
+                features, cluster_labels, self.config.sample_size,
+                memory_budget_mb=self.config.memory_budget_mb, confidence=self.config.confidence
+            )
+            logger.info(f"Estimated Silhouette Score: {estimate['estimate']:.4f} ({self.config.confidence:.0%} CI {estimate['ci_low']:.4f} to {estimate['ci_high']:.4f})")
+            return {
+                "score": estimate["estimate"],
+                "values": estimate["values"],
+                "labels": cluster_labels[estimate["rows"]],
+                "metrics": {
+                    "silhouette_ci": [estimate["ci_low"], estimate["ci_high"]],
+                    "silhouette_confidence": self.config.confidence,
+                    "silhouette_sample_size": int(len(estimate["rows"])),
+                },
+            }
+
+        logger.info(f"Calculating Silhouette Score in chunks (memory budget {self.config.memory_budget_mb} MB)...")
+        sample_silhouette_values = chunked_silhouette_samples(
+            features, cluster_labels, memory_budget_mb=self.config.memory_budget_mb
+        )
+        score = float(sample_silhouette_values.mean())
+        logger.info(f"Calculated Silhouette Score: {score:.4f}")
+        return {"score": score, "values": sample_silhouette_values, "labels": cluster_labels, "metrics": {}}
+
+    def _save_metrics(self, results):
+        silhouette = results["silhouette"]
+        metrics = {
+            "silhouette_score": silhouette["score"],
+            "silhouette_mode": self.config.silhouette_mode,
+            "davies_bouldin_score": float(results["davies_bouldin"]),
+            "calinski_harabasz_score": float(results["calinski_harabasz"]),
+            **silhouette["metrics"],
+        }
+        save_json(path=self.config.metrics_file_path, data=metrics)
+        logger.info(f"Metrics saved to: {self.config.metrics_file_path}")
+
+    def _plot_silhouette(self, results, n_clusters):
+        silhouette = results["silhouette"]
+        self._generate_silhouette_plot(
+            sample_silhouette_values=silhouette["values"],
+            cluster_labels=silhouette["labels"],
+            n_clusters=n_clusters,
+            silhouette_avg=silhouette["score"]
+        )
+
     def evaluate_model(self):
         """
-        Main method to run the evaluation.
+        Main method to run the evaluation. The silhouette, Davies-Bouldin and
+        Calinski-Harabasz computations are independent, as are writing the
+        metrics and rendering the plot once the silhouettes exist, so they run
+        as a small task graph on a thread pool.
         """
         logger.info("--- Starting Model Evaluation ---")
         try:
-            model_artifacts = load_dill(path=self.config.model_path)
-            model = model_artifacts['model']
+            model_artifact = ArtifactStore(self.config.artifact_store_dir).get(self.config.model_artifact)
 
             
-            data = pd.read_csv(self.config.data_path)
-            model = load_dill(path=self.config.model_path)
-            model = model_artifacts['model']
-            
-            
+            data = load_table(self.config.data_path)
+            features = data.drop('CustomerID', axis=1).to_numpy(dtype=np.float64)
             
-            features = data.drop('CustomerID', axis=1)
             
+            logger.info("Loading cluster labels from the model artifact...")
+            cluster_labels = np.asarray(model_artifact.arrays['labels'])
             
-            logger.info("Predicting cluster labels on the data...")
-            cluster_labels = model.labels_
             
-            
-            logger.info("Calculating Silhouette Score...")
-            score = silhouette_score(features, cluster_labels)
-            logger.info(f"Calculated Silhouette Score: {score:.4f}")
-            
-            
-            metrics = {"silhouette_score": score}
-            save_json(path=self.config.metrics_file_path, data=metrics)
-            logger.info(f"Metrics saved to: {self.config.metrics_file_path}")
-            
-            
-            self._generate_silhouette_plot(
-                data=features,
-                cluster_labels=cluster_labels,
-                n_clusters=model.n_clusters,
-                silhouette_avg=score
+            scheduler = DAGScheduler(max_workers=self.config.n_workers, executor="thread")
+            scheduler.add("silhouette", self._compute_silhouette, args=(features, cluster_labels))
+            scheduler.add("davies_bouldin", davies_bouldin_score, args=(features, cluster_labels))
+            scheduler.add("calinski_harabasz", calinski_harabasz_score, args=(features, cluster_labels))
+            scheduler.add(
+                "metrics", self._save_metrics, args=(scheduler.results,),
+                depends_on=["silhouette", "davies_bouldin", "calinski_harabasz"]
+            )
+            scheduler.add(
+                "silhouette_plot", self._plot_silhouette, args=(scheduler.results, model_artifact.meta['n_clusters']),
+                depends_on=["silhouette"]
             )
+            scheduler.run()
+            scheduler.log_summary("Model evaluation")
             
         except Exception as e:
             logger.error(f"Error during model evaluation: {e}")
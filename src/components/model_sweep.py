@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import numpy as np
+from multiprocessing import shared_memory, get_context
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import silhouette_score
+from src.utils.common import logger, load_table, save_json
+from src.entity.config_entity import ModelSweepConfig
+from src.components.model_trainer import build_model
+
+
+def _fit_candidate(shm_name, shape, model_name, params, silhouette_sample_size):
+    # Runs in a worker: the scaled RFM matrix is read straight from shared memory.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        features = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        labels = build_model(model_name, params).fit_predict(features)
+        if len(np.unique(labels)) < 2:
+            score = -1.0
+        else:
+            score = float(silhouette_score(
+                features, labels,
+                sample_size=min(silhouette_sample_size, shape[0]),
+                random_state=42
+            ))
+        del features
+        return {"model_name": model_name, "params": params, "silhouette_score": score}
+    finally:
+        shm.close()
+
+
+class ModelSweep:
+    def __init__(self, config: ModelSweepConfig):
+        self.config = config
+        logger.info(f"Model Sweep component initialized.")
+
+    def _candidates(self):
+        for model_name in self.config.models:
+            for num_clusters in self.config.k_values:
+                yield model_name, {**dict(self.config.params), 'num_clusters': int(num_clusters)}
+
+    def _cache_key(self, model_name, params, fingerprint):
+        payload = json.dumps({"model_name": model_name, "params": params, "data": fingerprint}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _load_cache(self):
+        if not os.path.exists(self.config.cache_path):
+            return {}
+        with open(self.config.cache_path) as f:
+            return json.load(f)
+
+    def run_sweep(self):
+        """
+        Fits every (model, k) pair of the configured grid on a process pool and
+        writes the best configuration by silhouette score for the trainer. The
+        scaled RFM matrix is copied into shared memory once; results are cached
+        by (model, params, data fingerprint) so reruns only fit new candidates.
+        """
+        logger.info("--- Starting Model Sweep ---")
+        shm = None
+        try:
+            data = load_table(self.config.data_path)
+            features = np.ascontiguousarray(data.drop('CustomerID', axis=1).to_numpy(dtype=np.float64))
+            fingerprint = hashlib.sha256(features.tobytes()).hexdigest()
+            logger.info(f"Sweep data loaded. Shape: {features.shape}, fingerprint: {fingerprint[:12]}")
+
+            cache = self._load_cache()
+            results, pending = [], []
+            for model_name, params in self._candidates():
+                key = self._cache_key(model_name, params, fingerprint)
+                if key in cache:
+                    results.append(cache[key])
+                else:
+                    pending.append((key, model_name, params))
+            logger.info(f"{len(results)} candidates served from cache, {len(pending)} to fit.")
+
+            if pending:
+                shm = shared_memory.SharedMemory(create=True, size=features.nbytes)
+                np.ndarray(features.shape, dtype=np.float64, buffer=shm.buf)[:] = features
+                n_jobs = self.config.n_jobs or os.cpu_count()
+                # Spawned workers: the sweep may run on a pipeline thread, where fork is unsafe.
+                with ProcessPoolExecutor(max_workers=n_jobs, mp_context=get_context("spawn")) as executor:
+                    futures = {
+                        executor.submit(
+                            _fit_candidate, shm.name, features.shape, model_name, params,
+                            self.config.silhouette_sample_size
+                        ): key
+                        for key, model_name, params in pending
+                    }
+                    for future, key in futures.items():
+                        result = future.result()
+                        logger.info(f"Fitted {result['model_name']} k={result['params']['num_clusters']}: silhouette={result['silhouette_score']:.4f}")
+                        cache[key] = result
+                        results.append(result)
+                save_json(path=self.config.cache_path, data=cache)
+
+            best = max(results, key=lambda result: result["silhouette_score"])
+            best_config = {**best, "data_fingerprint": fingerprint}
+            save_json(path=self.config.best_config_path, data=best_config)
+            logger.info(f"Best configuration: {best['model_name']} k={best['params']['num_clusters']} (silhouette={best['silhouette_score']:.4f}) saved to {self.config.best_config_path}")
+            return best_config
+
+        except Exception as e:
+            logger.error(f"Error during model sweep: {e}")
+            raise e
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
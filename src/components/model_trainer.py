@@ -1,66 +1,424 @@
+import os
+import time
 import pandas as pd
-from sklearn.cluster import SpectralClustering, KMeans, Birch 
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.cluster import SpectralClustering, KMeans, Birch, MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score, silhouette_score, davies_bouldin_score
 import numpy as np
-from src.utils.common import logger, save_dill
+from src.utils.common import logger, load_table, save_json, iter_table, read_table_columns
+from src.utils.artifact_store import ArtifactStore, artifact_key
 from src.entity.config_entity import ModelTrainerConfig
+from src.components.spectral_approx import LandmarkSpectralClustering
+from src.components.serving_kernel import KNNAssigner
+from src.components.segment_lookup import write_segment_table
+from src.components.partitioning import batch_partitions, partition_artifact_name
+
+APPROX_SPECTRAL_MODELS = ("sc_knn", "sc_landmark")
+STREAMING_MODELS = ("minibatch_kmeans", "birch")
+# Hashed into the stage fingerprint and into the keys of the artifacts this stage stores.
+TRAINER_MODULES = [
+    "src.components.model_trainer", "src.components.spectral_approx", "src.components.serving_kernel",
+    "src.components.segment_lookup", "src.components.partitioning", "src.utils.artifact_store",
+]
+
+
+def build_model(model_name, params):
+    if model_name == "sc":
+        model = SpectralClustering(
+            n_clusters=params['num_clusters'],
+            random_state=42 )
+
+    elif model_name == "sc_knn":
+        # Sparse k-nearest-neighbour affinity instead of the dense RBF kernel.
+        model = SpectralClustering(
+            n_clusters=params['num_clusters'],
+            affinity='nearest_neighbors',
+            n_neighbors=params.get('knn_neighbors', 10),
+            assign_labels='cluster_qr',
+            random_state=42
+        )
+
+    elif model_name == "sc_landmark":
+        model = LandmarkSpectralClustering(
+            n_clusters=params['num_clusters'],
+            n_landmarks=params.get('n_landmarks', 500),
+            n_neighbors=params.get('landmark_neighbors', 5),
+            random_state=42
+        )
+
+    elif model_name == "kmeans":
+        model = KMeans(
+            n_clusters=params['num_clusters'],
+            init=params.get('init', 'k-means++'),
+            random_state=42
+        )
+
+    elif model_name == "minibatch_kmeans":
+        model = MiniBatchKMeans(
+            n_clusters=params['num_clusters'],
+            batch_size=params.get('batch_size', 1024),
+            n_init=3,
+            random_state=42
+        )
+
+    elif model_name == "birch":
+        model = Birch(
+            n_clusters=params['num_clusters']
+        )
+
+    else:
+        raise ValueError(f"Unknown model name in config: {model_name}")
+    return model
+
+
+def _fit_partition(model_name, params, features, silhouette_sample_size) -> dict:
+    n_customers = len(features)
+    # A partition with fewer customers than clusters gets as many clusters as it can hold.
+    n_clusters = max(1, min(params['num_clusters'], n_customers - 1))
+    start = time.perf_counter()
+    labels = build_model(model_name, {**params, 'num_clusters': n_clusters}).fit_predict(features)
+    fit_seconds = time.perf_counter() - start
+
+    _, labels = np.unique(labels, return_inverse=True)
+    labels = labels.astype(np.int32)
+    sizes = np.bincount(labels)
+    centroids = np.zeros((len(sizes), features.shape[1]))
+    np.add.at(centroids, labels, features)
+    centroids /= sizes[:, None]
+
+    metrics = {
+        "n_customers": int(n_customers),
+        "n_clusters": int(len(sizes)),
+        "cluster_sizes": sizes.tolist(),
+        "fit_seconds": fit_seconds,
+        "silhouette_score": None,
+        "davies_bouldin_score": None,
+    }
+    if 1 < len(sizes) < n_customers:
+        metrics["silhouette_score"] = float(silhouette_score(
+            features, labels, sample_size=min(silhouette_sample_size, n_customers), random_state=42
+        ))
+        metrics["davies_bouldin_score"] = float(davies_bouldin_score(features, labels))
+    return {"labels": labels, "centroids": centroids, "metrics": metrics}
+
+
+def _fit_partition_batch(model_name, params, batch, silhouette_sample_size) -> list:
+    # Runs in a worker: fits each (partition, features) of the batch in turn.
+    return [
+        (partition, _fit_partition(model_name, params, features, silhouette_sample_size))
+        for partition, features in batch
+    ]
+
 
 class ModelTrainer:
     def __init__(self, config: ModelTrainerConfig):
         self.config = config
         logger.info(f"Model Trainer component initialized.")
 
+    def _report_spectral_agreement(self, features, cluster_labels):
+        """
+        Fits exact SpectralClustering on a random sample and reports its
+        agreement (adjusted Rand index) with the approximate labels.
+        """
+        sample_size = min(self.config.params.get('ari_sample_size', 2000), len(features))
+        sample = np.random.default_rng(42).choice(len(features), sample_size, replace=False)
+        logger.info(f"Fitting exact spectral clustering on a {sample_size}-row sample for comparison...")
+        exact_labels = build_model("sc", self.config.params).fit_predict(features.iloc[sample])
+        ari = adjusted_rand_score(exact_labels, cluster_labels[sample])
+        logger.info(f"Agreement of {self.config.model_name} with exact spectral clustering: ARI = {ari:.4f}")
+
+        save_json(
+            path=self.config.root_dir / "spectral_agreement.json",
+            data={"model_name": self.config.model_name, "sample_size": int(sample_size), "adjusted_rand_index": float(ari)}
+        )
+
+    def _report_assignment_agreement(self, assigner, features, centroids, labels):
+        """
+        Compares how often nearest-centroid and k-NN (leave-one-out) assignment
+        reproduce the training labels on a sample of the training points.
+        """
+        sample_size = min(self.config.assignment_sample_size, len(features))
+        sample = np.random.default_rng(42).choice(len(features), sample_size, replace=False)
+        points, expected = features[sample], labels[sample]
+        nearest_centroid = ((points[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        agreement = {
+            "sample_size": int(sample_size),
+            "centroid_accuracy": float((nearest_centroid == expected).mean()),
+            "knn_accuracy": float((assigner.predict_scaled(points, exclude_self=True) == expected).mean()),
+        }
+        logger.info(f"Assignment agreement with training labels: centroid {agreement['centroid_accuracy']:.4f}, k-NN {agreement['knn_accuracy']:.4f}")
+        save_json(path=self.config.root_dir / "assignment_agreement.json", data=agreement)
+
+    def _store_model(self, model, feature_names, centroids, labels, features=None):
+        """
+        Stores the model under a key of its training config and input data.
+        Centroids and labels go in as raw arrays, so prediction and evaluation
+        can memory-map them without unpickling the estimator. In "knn"
+        assignment mode the spatial index over `features` is stored too.
+        """
+        config = {
+            "model_name": self.config.model_name,
+            "params": dict(self.config.params),
+            "training_mode": self.config.training_mode,
+            "chunk_size": self.config.chunk_size if self.config.training_mode == "streaming" else None,
+            "assignment_mode": self.config.assignment_mode,
+        }
+        labels = np.asarray(labels, dtype=np.int32)
+        store = ArtifactStore(self.config.artifact_store_dir)
+        model_key = store.put(
+            name=self.config.model_artifact,
+            key=artifact_key(config, [self.config.data_path], TRAINER_MODULES),
+            arrays={"centroids": centroids, "labels": labels},
+            meta={**config, "feature_names": list(feature_names), "n_clusters": int(len(centroids))},
+            obj=model
+        )
+        logger.info(f"Trained model (with centroids) stored as artifact '{self.config.model_artifact}'.")
+        self._publish_segment_table(feature_names, labels)
+
+        if self.config.assignment_mode == "knn":
+            index_config = {
+                "n_neighbors": self.config.assign_neighbors,
+                "tree": self.config.assign_tree,
+                "leaf_size": self.config.assign_leaf_size,
+            }
+            logger.info(f"Building {self.config.assign_tree} assignment index over {len(features)} training points...")
+            assigner = KNNAssigner.build(features, labels, **index_config)
+            if self.config.assignment_sample_size:
+                self._report_assignment_agreement(assigner, features, centroids, labels)
+            store.put(
+                name=self.config.assignment_index_artifact,
+                key=artifact_key({**index_config, "model_key": model_key}, [], TRAINER_MODULES),
+                meta={**index_config, "n_points": int(len(features))},
+                obj=assigner
+            )
+            logger.info(f"k-NN assignment index stored as artifact '{self.config.assignment_index_artifact}'.")
+
+    def _publish_segment_table(self, feature_names, labels):
+        """
+        Writes the CustomerID -> cluster lookup table with each customer's raw
+        RFM, recovered from the scaled training table by inverting the log1p
+        and the stored scaler. Reads the table in chunks in training order.
+        """
+        scaler = ArtifactStore(self.config.artifact_store_dir).get(self.config.scaler_artifact)
+        order = [scaler.meta['feature_names'].index(name) for name in feature_names]
+        mean, scale = scaler.arrays['mean'][order], scaler.arrays['scale'][order]
+
+        ids, raw = [], []
+        for chunk in iter_table(self.config.data_path, self.config.chunk_size, columns=['CustomerID', *feature_names]):
+            ids.append(chunk['CustomerID'].to_numpy(dtype=np.int64))
+            raw.append(np.expm1(chunk[feature_names].to_numpy(dtype=np.float64) * scale + mean))
+        raw = np.concatenate(raw)
+        columns = {name: raw[:, i] for i, name in enumerate(feature_names)}
+
+        rows = write_segment_table(
+            self.config.segment_table_path,
+            customer_ids=np.concatenate(ids),
+            clusters=np.asarray(labels),
+            recency=columns['Recency'],
+            frequency=columns['Frequency'],
+            monetary=columns['Monetary']
+        )
+        logger.info(f"Segment lookup table for {rows} customers saved to: {self.config.segment_table_path}")
+
+    def _spill_path(self, name) -> str:
+        return str(self.config.root_dir / f"streaming_{name}.npy")
+
+    def train_model_streaming(self):
+        """
+        Trains on the transformed artifact chunk by chunk with `partial_fit`, so
+        memory is bounded by `chunk_size`. A second pass assigns labels and
+        accumulates per-cluster sums for the same centroid matrix that the
+        batch path produces. Labels (and, in knn assignment mode, the training
+        points for the index) are written chunk by chunk to memory-mapped .npy
+        spill files under root_dir rather than collected in memory. Clusters
+        that end up empty are dropped from the centroids and the labels are
+        renumbered to match, so label i is always centroid row i.
+        """
+        if self.config.model_name not in STREAMING_MODELS:
+            raise ValueError(f"Model {self.config.model_name} does not support streaming training. Use one of {STREAMING_MODELS}")
+
+        feature_columns = [col for col in read_table_columns(self.config.data_path) if col != 'CustomerID']
+        num_clusters = self.config.params['num_clusters']
+        model = build_model(self.config.model_name, self.config.params)
+        if self.config.model_name == "birch":
+            # Only grow the CF-tree per chunk; the global clustering runs once at the end.
+            model.set_params(n_clusters=None)
+
+        logger.info(f"Streaming {self.config.model_name} training in chunks of {self.config.chunk_size} rows...")
+        rows = 0
+        for chunk in iter_table(self.config.data_path, self.config.chunk_size, columns=feature_columns):
+            model.partial_fit(chunk[feature_columns].to_numpy(dtype=np.float64))
+            rows += len(chunk)
+        if self.config.model_name == "birch":
+            model.set_params(n_clusters=num_clusters)
+            model.partial_fit()
+        logger.info(f"Model training complete over {rows} rows. Found {num_clusters} clusters.")
+
+        sums = np.zeros((num_clusters, len(feature_columns)))
+        counts = np.zeros(num_clusters, dtype=np.int64)
+        labels = np.lib.format.open_memmap(self._spill_path("labels"), mode="w+", dtype=np.int32, shape=(rows,))
+        points = None
+        if self.config.assignment_mode == "knn":
+            points = np.lib.format.open_memmap(
+                self._spill_path("points"), mode="w+", dtype=np.float64, shape=(rows, len(feature_columns))
+            )
+        begin = 0
+        for chunk in iter_table(self.config.data_path, self.config.chunk_size, columns=feature_columns):
+            values = chunk[feature_columns].to_numpy(dtype=np.float64)
+            chunk_labels = model.predict(values)
+            np.add.at(sums, chunk_labels, values)
+            counts += np.bincount(chunk_labels, minlength=num_clusters)
+            labels[begin:begin + len(values)] = chunk_labels
+            if points is not None:
+                points[begin:begin + len(values)] = values
+            begin += len(values)
+
+        present = counts > 0
+        if not present.all():
+            logger.warning(f"{int((~present).sum())} of {num_clusters} clusters are empty; renumbering labels.")
+            renumber = (np.cumsum(present) - 1).astype(np.int32)
+            for begin in range(0, rows, self.config.chunk_size):
+                labels[begin:begin + self.config.chunk_size] = renumber[labels[begin:begin + self.config.chunk_size]]
+        labels.flush()
+        centroids = sums[present] / counts[present, None]
+        return model, feature_columns, centroids, labels, points
+
+    def train_partitioned(self):
+        """
+        Fits one `model_name` model per partition (e.g. per Country) on the
+        per-partition scaled RFM, across a process pool. Partitions smaller
+        than `min_partition_customers` get no model and are scored by the
+        global one; the rest are packed into pool tasks of about
+        `partition_batch_customers` customers, so small markets share a task.
+        Each model is stored as artifact `<model_artifact>@<partition>` with
+        its centroids, labels and scaler, and the per-partition metrics go
+        to `partition_metrics_path`. Partition models always assign new
+        customers to the nearest centroid.
+        """
+        key = self.config.partition_key
+        data = load_table(self.config.partitioned_data_path)
+        partition_values = data[key].astype(str).to_numpy()
+        feature_names = [col for col in data.columns if col not in (key, 'CustomerID')]
+        features = data[feature_names].to_numpy(dtype=np.float64)
+        customer_ids = data['CustomerID'].to_numpy(dtype=np.int64)
+        del data
+
+        rows = pd.Series(np.arange(len(partition_values))).groupby(partition_values, sort=True).indices
+        sizes = {partition: len(index) for partition, index in rows.items()}
+        eligible = {p: n for p, n in sizes.items() if n >= self.config.min_partition_customers}
+        batches = batch_partitions(eligible, self.config.partition_batch_customers)
+        n_jobs = min(self.config.partition_n_jobs or os.cpu_count(), len(batches)) or 1
+        logger.info(
+            f"Training {self.config.model_name} for {len(eligible)} of {len(sizes)} values of {key} "
+            f"in {len(batches)} tasks over {n_jobs} processes..."
+        )
+
+        params = dict(self.config.params)
+        sample_size = self.config.partition_silhouette_sample_size
+        # Spawned workers: the trainer may run on a pipeline thread, where fork is unsafe.
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=get_context("spawn")) as executor:
+            futures = [
+                executor.submit(
+                    _fit_partition_batch, self.config.model_name, params,
+                    [(p, features[rows[p]]) for p in batch], sample_size
+                )
+                for batch in batches
+            ]
+            results = dict(result for future in futures for result in future.result())
+
+        store = ArtifactStore(self.config.artifact_store_dir)
+        scalers = store.get(self.config.partition_scaler_artifact)
+        order = [scalers.meta['feature_names'].index(name) for name in feature_names]
+        config = {"model_name": self.config.model_name, "params": params, "partition_key": key}
+        metrics = {}
+        for partition in sorted(results):
+            result = results[partition]
+            i = scalers.meta['partitions'].index(partition)
+            artifact = partition_artifact_name(self.config.model_artifact, partition)
+            store.put(
+                name=artifact,
+                key=artifact_key(
+                    {**config, "partition": partition},
+                    [features[rows[partition]], scalers.arrays['mean'][i][order], scalers.arrays['scale'][i][order]],
+                    TRAINER_MODULES
+                ),
+                arrays={
+                    "centroids": result["centroids"],
+                    "labels": result["labels"],
+                    "customer_ids": customer_ids[rows[partition]],
+                    "mean": scalers.arrays['mean'][i][order],
+                    "scale": scalers.arrays['scale'][i][order],
+                },
+                meta={**config, "partition": partition, "feature_names": feature_names, "metrics": result["metrics"]}
+            )
+            metrics[partition] = {"artifact": artifact, **result["metrics"]}
+
+        save_json(path=self.config.partition_metrics_path, data={
+            **config,
+            "feature_names": feature_names,
+            "min_partition_customers": self.config.min_partition_customers,
+            "partitions": metrics,
+            # Scored by the global model.
+            "untrained_partitions": {p: n for p, n in sizes.items() if p not in eligible},
+        })
+        logger.info(f"Stored {len(metrics)} partition models; metrics saved to: {self.config.partition_metrics_path}")
+
     def train_model(self):
         logger.info("--- Starting Model Training ---")
+        self.train_global_model()
+        if self.config.partition_key:
+            try:
+                self.train_partitioned()
+            except Exception as e:
+                logger.error(f"Error during partitioned model training: {e}")
+                raise e
+
+    def train_global_model(self):
+        if self.config.training_mode == "streaming":
+            try:
+                model, feature_columns, centroids, labels, features = self.train_model_streaming()
+                try:
+                    self._store_model(model, feature_columns, centroids, labels, features)
+                finally:
+                    del labels, features
+                    for name in ("labels", "points"):
+                        if os.path.exists(self._spill_path(name)):
+                            os.remove(self._spill_path(name))
+                return
+            except Exception as e:
+                logger.error(f"Error during streaming model training: {e}")
+                raise e
+
         try:
-            data = pd.read_csv(self.config.data_path)
+            data = load_table(self.config.data_path)
             logger.info(f"Loaded transformed data from: {self.config.data_path}")
 
             features_for_clustering = data.drop('CustomerID', axis=1)
             logger.info(f"Features for clustering prepared (dropped CustomerID). Shape: {features_for_clustering.shape}")
 
             logger.info(f"Initializing model: {self.config.model_name}")
-            if self.config.model_name == "sc":
-                model = SpectralClustering(
-                    n_clusters=self.config.params['num_clusters'],
-                    random_state=42 )
-                
-            elif self.config.model_name == "kmeans":
-                model = KMeans(
-                    n_clusters=self.config.params['num_clusters'],
-                    init=self.config.params.get('init', 'k-means++'), 
-                    random_state=42
-                )
-            
-            elif self.config.model_name == "birch":
-                model = Birch(
-                    n_clusters=self.config.params['num_clusters']
-                )
+            model = build_model(self.config.model_name, self.config.params)
 
-            else:
-                raise ValueError(f"Unknown model name in config: {self.config.model_name}")
-            
             logger.info(f"Training {self.config.model_name}...")
-            cluster_labels = model.fit_predict(features_for_clustering) 
+            cluster_labels = model.fit_predict(features_for_clustering)
             logger.info(f"Model training complete. Found {self.config.params['num_clusters']} clusters.")
-            
-            
-            
+
+            if self.config.model_name in APPROX_SPECTRAL_MODELS and self.config.params.get('ari_sample_size', 0):
+                self._report_spectral_agreement(features_for_clustering, cluster_labels)
+
+
+            feature_names = list(features_for_clustering.columns)
+            features = features_for_clustering.to_numpy(dtype=np.float64)
             features_for_clustering['Cluster'] = cluster_labels
-            
-            
+
+
             centroids = features_for_clustering.groupby('Cluster').mean()
-            
-            
-            model_artifacts = {
-                'model': model,
-                'centroids': centroids.to_dict('list') 
-            }
-            logger.info("Calculated and packaged centroids for prediction.")
-            
-            
-            save_dill(data=model_artifacts, path=self.config.model_path)
-            logger.info(f"Trained model (with centroids) saved to: {self.config.model_path}")
-            
+            logger.info("Calculated centroids for prediction.")
+
+
+            self._store_model(model, feature_names, centroids[feature_names].to_numpy(dtype=np.float64), cluster_labels, features)
+
         except Exception as e:
             logger.error(f"Error during model training: {e}")
             raise e
@@ -0,0 +1,60 @@
+import re
+import numpy as np
+import pandas as pd
+
+
+def partition_slug(partition) -> str:
+    """
+    File- and artifact-name-safe form of a partition value ("United Kingdom" -> "united_kingdom").
+    """
+    return re.sub(r'[^0-9a-z]+', '_', str(partition).lower()).strip('_') or "blank"
+
+
+def partition_artifact_name(artifact, partition) -> str:
+    return f"{artifact}@{partition_slug(partition)}"
+
+
+def batch_partitions(sizes: dict, batch_customers: int) -> list:
+    """
+    Groups partitions into pool tasks of about `batch_customers` customers:
+    partitions at least that large get a task of their own, smaller ones are
+    packed together (largest first), so dozens of tiny markets do not each
+    pay for a task round trip.
+    """
+    batches, current, current_size = [], [], 0
+    for partition, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        if size >= batch_customers:
+            batches.append([partition])
+            continue
+        current.append(partition)
+        current_size += size
+        if current_size >= batch_customers:
+            batches.append(current)
+            current, current_size = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def scale_partitions(rfm_df: pd.DataFrame, partition_column, feature_names):
+    """
+    log1p + standard scaling fitted separately per partition (StandardScaler
+    semantics: population std, 1 where it is 0). Returns the scaled frame in
+    the same row order, plus {partition: (mean, scale)}.
+    """
+    logged = np.log1p(rfm_df[feature_names].to_numpy(dtype=np.float64))
+    codes, partitions = pd.factorize(rfm_df[partition_column], sort=True)
+    counts = np.bincount(codes, minlength=len(partitions))[:, None]
+    means = np.zeros((len(partitions), len(feature_names)))
+    squares = np.zeros_like(means)
+    np.add.at(means, codes, logged)
+    np.add.at(squares, codes, logged ** 2)
+    means /= counts
+    scales = np.sqrt(np.maximum(squares / counts - means ** 2, 0.0))
+    scales[scales < 10 * np.finfo(np.float64).eps] = 1.0
+
+    scaled_df = pd.DataFrame((logged - means[codes]) / scales[codes], columns=feature_names, index=rfm_df.index)
+    scaled_df.insert(0, partition_column, rfm_df[partition_column].to_numpy())
+    scaled_df['CustomerID'] = rfm_df['CustomerID'].to_numpy()
+    scalers = {partition: (means[i], scales[i]) for i, partition in enumerate(partitions)}
+    return scaled_df, scalers
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+
+NS_PER_DAY = 86_400_000_000_000
+
+
+def keep_stock_codes_mask(stock_codes, junk_codes) -> np.ndarray:
+    """
+    Boolean mask of rows whose StockCode is not a junk code. The upper-case
+    comparison runs once per distinct code instead of once per row.
+    """
+    if isinstance(stock_codes.dtype, pd.CategoricalDtype):
+        codes = stock_codes.cat.codes.to_numpy()
+        categories = stock_codes.cat.categories
+    else:
+        codes, categories = pd.factorize(stock_codes)
+    junk = pd.Index(categories).astype(str).str.upper().isin(junk_codes)
+    # Missing codes (-1) are kept, matching the str.upper().isin() path.
+    return np.append(~junk, True)[codes]
+
+
+def _distinct_invoice_counts(customer_codes, invoice_codes, n_customers):
+    n_invoices = int(invoice_codes.max()) + 1 if len(invoice_codes) else 0
+    first_customer = np.full(n_invoices, np.iinfo(np.int64).max)
+    last_customer = np.full(n_invoices, -1)
+    np.minimum.at(first_customer, invoice_codes, customer_codes)
+    np.maximum.at(last_customer, invoice_codes, customer_codes)
+    if np.array_equal(first_customer, last_customer):
+        # Every invoice belongs to a single customer, so counting invoices per
+        # customer is enough.
+        return np.bincount(last_customer, minlength=n_customers)
+
+    pairs = np.unique(customer_codes * n_invoices + invoice_codes)
+    return np.bincount(pairs // n_invoices, minlength=n_customers)
+
+
+def aggregate_rfm_arrays(customer_codes, invoice_codes, dates_ns, prices, n_customers):
+    """
+    Last purchase date, distinct invoice count and monetary sum per customer
+    code, each as a single scatter over the rows with no sort or join.
+    """
+    last_date = np.full(n_customers, np.iinfo(np.int64).min)
+    np.maximum.at(last_date, customer_codes, dates_ns)
+    frequency = _distinct_invoice_counts(customer_codes, invoice_codes, n_customers)
+    monetary = np.bincount(customer_codes, weights=prices, minlength=n_customers)
+    return last_date, frequency, monetary
+
+
+def _clean_columns(df: pd.DataFrame, junk_codes):
+    # The cleaning rules of DataTransformation._clean as one row mask, plus the cleaned columns.
+    customer = df['CustomerID'].to_numpy(dtype=np.float64, na_value=np.nan)
+    quantity = df['Quantity'].to_numpy()
+    mask = ~np.isnan(customer) & (quantity > 0) & keep_stock_codes_mask(df['StockCode'], junk_codes)
+
+    invoice_codes, _ = pd.factorize(df['InvoiceNo'][mask])
+    dates_ns = pd.to_datetime(df['InvoiceDate'][mask]).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    prices = quantity[mask].astype(np.float64) * df['UnitPrice'].to_numpy(dtype=np.float64)[mask]
+    return mask, customer[mask].astype(np.int64), invoice_codes.astype(np.int64), dates_ns, prices
+
+
+def _aggregate_transactions(df: pd.DataFrame, junk_codes):
+    _, customers, invoice_codes, dates_ns, prices = _clean_columns(df, junk_codes)
+    customer_codes, customer_ids = pd.factorize(customers, sort=True)
+
+    last_date, frequency, monetary = aggregate_rfm_arrays(
+        customer_codes.astype(np.int64), invoice_codes, dates_ns, prices, len(customer_ids)
+    )
+    return customer_ids.astype(np.int64), last_date, frequency, monetary
+
+
+def _to_rfm_frame(customer_ids, last_date, frequency, monetary) -> pd.DataFrame:
+    snapshot_ns = last_date.max() + NS_PER_DAY
+    return pd.DataFrame({
+        'CustomerID': customer_ids,
+        'Recency': (snapshot_ns - last_date) // NS_PER_DAY,
+        'Frequency': frequency,
+        'Monetary': monetary,
+    })
+
+
+def compute_rfm_fused(df: pd.DataFrame, junk_codes) -> pd.DataFrame:
+    """
+    Cleans the raw transactions and builds the RFM table without intermediate
+    frames: CustomerID and InvoiceNo are factorized once, the junk StockCode
+    filter works on category codes, and all three RFM columns come out of
+    `aggregate_rfm_arrays`. Output matches `DataTransformation._build_rfm`.
+    """
+    return _to_rfm_frame(*_aggregate_transactions(df, junk_codes))
+
+
+def compute_rfm_partitioned(df: pd.DataFrame, partition_column, junk_codes) -> pd.DataFrame:
+    """
+    RFM per (partition, customer), e.g. per Country, in the same single pass
+    as `compute_rfm_fused`: the aggregation key is the pair instead of the
+    customer. Recency is measured from the snapshot date of the whole data, so
+    it is comparable across partitions. Rows come out sorted by partition,
+    then CustomerID.
+    """
+    mask, customers, invoice_codes, dates_ns, prices = _clean_columns(df, junk_codes)
+    partition_codes, partitions = pd.factorize(df[partition_column][mask].astype(str), sort=True)
+    partition_codes = partition_codes.astype(np.int64)
+    id_span = int(customers.max()) + 1 if len(customers) else 1
+    group_codes, groups = pd.factorize(partition_codes * id_span + customers, sort=True)
+
+    last_date, frequency, monetary = aggregate_rfm_arrays(
+        group_codes.astype(np.int64), invoice_codes, dates_ns, prices, len(groups)
+    )
+    rfm_df = _to_rfm_frame(groups % id_span, last_date, frequency, monetary)
+    rfm_df.insert(0, partition_column, np.asarray(partitions, dtype=object)[groups // id_span])
+    return rfm_df
+
+
+def month_end_snapshots(last_date, n_months) -> pd.DatetimeIndex:
+    """
+    Snapshot dates closing the last `n_months` complete months up to
+    `last_date`: the midnight after each month-end (e.g. 2011-12-01 00:00 for
+    November), the same convention as the single snapshot's max date + 1 day.
+    """
+    last_date = pd.Timestamp(last_date)
+    # The month of last_date counts only if the data runs to its final day.
+    last_month = last_date.to_period('M')
+    if (last_date + pd.Timedelta(days=1)).to_period('M') == last_month:
+        last_month -= 1
+    months = pd.period_range(end=last_month, periods=n_months, freq='M')
+    return pd.DatetimeIndex([(month + 1).start_time for month in months])
+
+
+def compute_rfm_snapshots(df: pd.DataFrame, junk_codes, snapshot_dates, window_days=None) -> pd.DataFrame:
+    """
+    RFM of every customer at each of `snapshot_dates` as one long table
+    (SnapshotDate, CustomerID, Recency, Frequency, Monetary), from purchases
+    strictly before each snapshot date.
+
+    The cleaned transactions are sorted by date once. Walking the snapshots in
+    order, only the rows between the previous and the current snapshot date
+    are folded into running per-customer arrays (last purchase, invoice count,
+    spend), so the aggregation touches each row once however many snapshots
+    there are. With `window_days`, Frequency and Monetary cover only the
+    `window_days` days before each snapshot (rows leaving the window are
+    subtracted the same way); Recency is always since the last purchase.
+    Customers appear from their first purchase on. An invoice counts towards
+    Frequency from (and, with a window, until) the date of its first line.
+    """
+    _, customers, invoice_codes, dates_ns, prices = _clean_columns(df, junk_codes)
+    customer_codes, customer_ids = pd.factorize(customers, sort=True)
+    n_customers = len(customer_ids)
+
+    order = np.argsort(dates_ns, kind='stable')
+    customer_codes = customer_codes[order].astype(np.int64)
+    invoice_codes, dates_ns, prices = invoice_codes[order], dates_ns[order], prices[order]
+    # The first line of each (customer, invoice) pair carries its count.
+    n_invoices = int(invoice_codes.max()) + 1 if len(invoice_codes) else 1
+    new_invoice = np.zeros(len(order), dtype=np.int64)
+    new_invoice[np.unique(customer_codes * n_invoices + invoice_codes, return_index=True)[1]] = 1
+
+    # Customers ordered by first purchase: those active at a snapshot are a prefix.
+    first_date = np.full(n_customers, np.iinfo(np.int64).max)
+    np.minimum.at(first_date, customer_codes, dates_ns)
+    by_first_purchase = np.argsort(first_date, kind='stable')
+    first_date = first_date[by_first_purchase]
+
+    snapshot_ns = np.sort(pd.DatetimeIndex(snapshot_dates).to_numpy(dtype='datetime64[ns]').view(np.int64))
+    ends = np.searchsorted(dates_ns, snapshot_ns, side='left')
+    starts = np.searchsorted(dates_ns, snapshot_ns - window_days * NS_PER_DAY, side='left') if window_days else None
+
+    last_date = np.full(n_customers, np.iinfo(np.int64).min)
+    frequency = np.zeros(n_customers, dtype=np.int64)
+    monetary = np.zeros(n_customers)
+    snapshots, ids, recency, frequencies, monetaries = [], [], [], [], []
+    added = removed = 0
+    for i, snapshot in enumerate(snapshot_ns):
+        rows = slice(added, ends[i])
+        np.maximum.at(last_date, customer_codes[rows], dates_ns[rows])
+        np.add.at(frequency, customer_codes[rows], new_invoice[rows])
+        np.add.at(monetary, customer_codes[rows], prices[rows])
+        added = ends[i]
+        if starts is not None:
+            rows = slice(removed, starts[i])
+            np.subtract.at(frequency, customer_codes[rows], new_invoice[rows])
+            np.subtract.at(monetary, customer_codes[rows], prices[rows])
+            removed = starts[i]
+
+        active = np.sort(by_first_purchase[:np.searchsorted(first_date, snapshot, side='left')])
+        snapshots.append(np.full(len(active), snapshot))
+        ids.append(customer_ids[active])
+        recency.append((snapshot - last_date[active]) // NS_PER_DAY)
+        frequencies.append(frequency[active])
+        monetaries.append(monetary[active])
+
+    if not snapshots:
+        return pd.DataFrame(columns=['SnapshotDate', 'CustomerID', 'Recency', 'Frequency', 'Monetary'])
+    return pd.DataFrame({
+        'SnapshotDate': np.concatenate(snapshots).view('datetime64[ns]'),
+        'CustomerID': np.concatenate(ids).astype(np.int64),
+        'Recency': np.concatenate(recency),
+        'Frequency': np.concatenate(frequencies),
+        'Monetary': np.concatenate(monetaries),
+    })
+
+
+def _aggregate_partition(feather_path, columns, partition, n_partitions, junk_codes):
+    # Runs in a worker: the file is memory-mapped, so selecting this worker's
+    # customers only touches the pages it needs and nothing is pickled in.
+    table = feather.read_table(feather_path, columns=columns, memory_map=True)
+    customer = table.column('CustomerID').to_numpy().astype(np.float64)
+    in_partition = ~np.isnan(customer) & (np.nan_to_num(customer).astype(np.int64) % n_partitions == partition)
+    df = table.filter(pa.array(in_partition)).to_pandas(split_blocks=True)
+    return _aggregate_transactions(df, junk_codes)
+
+
+def compute_rfm_parallel(feather_path, columns, junk_codes, n_jobs) -> pd.DataFrame:
+    """
+    Hash-partitions customers by `CustomerID % n_jobs` across a process pool.
+    Every worker memory-maps the same uncompressed Feather file and returns
+    partial aggregates for a disjoint set of customers; rows keep their file
+    order inside a partition, so the result is bit-identical to
+    `compute_rfm_fused`.
+    """
+    # Spawned, not forked: this may run on a pipeline thread, and forking a
+    # multi-threaded process can deadlock the children.
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=get_context("spawn")) as executor:
+        futures = [
+            executor.submit(_aggregate_partition, str(feather_path), columns, partition, n_jobs, junk_codes)
+            for partition in range(n_jobs)
+        ]
+        partials = [future.result() for future in futures]
+
+    customer_ids, last_date, frequency, monetary = (np.concatenate(parts) for parts in zip(*partials))
+    order = np.argsort(customer_ids, kind='stable')
+    return _to_rfm_frame(customer_ids[order], last_date[order], frequency[order], monetary[order])
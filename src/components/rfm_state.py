@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import pandas as pd
+import datetime as dt
+from src.utils.common import logger, load_table, save_table
+
+STATE_COLUMNS = ['CustomerID', 'Last_Purchase_Date', 'Frequency', 'Monetary']
+
+
+class RFMStateStore:
+    """
+    Persisted per-customer RFM state: last purchase date, distinct invoice count
+    and monetary sum. Everything here is additive, so a batch of new invoices can
+    be folded in without touching the transaction history.
+
+    Deltas are expected to be cut on InvoiceDate (all lines of an invoice share
+    one timestamp). A delta entirely at or before the state's watermark is
+    treated as already folded in, which makes re-applying a delta a no-op; a
+    delta that mixes new rows with rows at or before the watermark (late-posted
+    invoices or returns) is rejected, as those rows cannot be folded in.
+    """
+    def __init__(self, state_path):
+        self.state_path = state_path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.state_path)
+
+    def load(self) -> pd.DataFrame:
+        state = load_table(self.state_path)
+        state['Last_Purchase_Date'] = pd.to_datetime(state['Last_Purchase_Date'])
+        logger.info(f"RFM state loaded from {self.state_path}. Customers: {len(state)}")
+        return state
+
+    def save(self, state: pd.DataFrame):
+        save_table(state, self.state_path)
+        logger.info(f"RFM state saved to {self.state_path}. Customers: {len(state)}")
+
+    def build(self, df_clean: pd.DataFrame) -> pd.DataFrame:
+        state = df_clean.groupby('CustomerID').agg(
+            Last_Purchase_Date=('InvoiceDate', 'max'),
+            Frequency=('InvoiceNo', 'nunique'),
+            Monetary=('total_price', 'sum')
+        ).reset_index()
+        return state[STATE_COLUMNS]
+
+    def apply_delta(self, state: pd.DataFrame, delta_clean: pd.DataFrame) -> pd.DataFrame:
+        watermark = state['Last_Purchase_Date'].max()
+        new_rows = delta_clean[delta_clean['InvoiceDate'] > watermark]
+        late = len(delta_clean) - len(new_rows)
+        if new_rows.empty:
+            logger.info(f"Delta has no invoices after the state watermark {watermark} (already applied); RFM state unchanged.")
+            return state
+        if late:
+            raise ValueError(
+                f"Delta has {late} rows at or before the state watermark {watermark} next to newer ones; "
+                "late-posted rows cannot be folded in. Rebuild the state from the full history."
+            )
+
+        delta_state = self.build(new_rows).set_index('CustomerID')
+        state = state.set_index('CustomerID')
+        known = delta_state.index.intersection(state.index)
+        new = delta_state.index.difference(state.index)
+
+        # Every delta row is newer than the watermark, so the delta's last date wins.
+        state.loc[known, 'Last_Purchase_Date'] = delta_state.loc[known, 'Last_Purchase_Date']
+        state.loc[known, 'Frequency'] += delta_state.loc[known, 'Frequency']
+        state.loc[known, 'Monetary'] += delta_state.loc[known, 'Monetary']
+        if len(new):
+            state = pd.concat([state, delta_state.loc[new]]).sort_index()
+
+        logger.info(
+            f"Applied delta of {len(new_rows)} rows: {len(known)} customers updated, {len(new)} new."
+        )
+        return state.reset_index()[STATE_COLUMNS]
+
+    def to_rfm(self, state: pd.DataFrame) -> pd.DataFrame:
+        snapshot_date = state['Last_Purchase_Date'].max() + dt.timedelta(days=1)
+        rfm_df = pd.DataFrame({
+            'CustomerID': state['CustomerID'].values,
+            'Recency': (snapshot_date - state['Last_Purchase_Date']).dt.days.values,
+            'Frequency': state['Frequency'].values,
+            'Monetary': state['Monetary'].values,
+        })
+        return rfm_df
+
+    def verify(self, rfm_incremental: pd.DataFrame, rfm_full: pd.DataFrame):
+        """
+        Checks an incrementally maintained RFM table against a full rebuild.
+        Monetary sums are compared with a float tolerance since they are summed
+        in a different order.
+        """
+        left = rfm_incremental.sort_values('CustomerID').reset_index(drop=True)
+        right = rfm_full.sort_values('CustomerID').reset_index(drop=True)
+
+        problems = []
+        if not np.array_equal(left['CustomerID'].values, right['CustomerID'].values):
+            problems.append(f"customer sets differ ({len(left)} vs {len(right)} customers)")
+        else:
+            for col in ['Recency', 'Frequency']:
+                mismatches = int((left[col].values != right[col].values).sum())
+                if mismatches:
+                    problems.append(f"{col} differs for {mismatches} customers")
+            if not np.allclose(left['Monetary'].values, right['Monetary'].values, rtol=1e-9, atol=1e-6):
+                problems.append("Monetary differs beyond float tolerance")
+
+        if problems:
+            raise ValueError(f"Incremental RFM does not match full rebuild: {'; '.join(problems)}")
+        logger.info(f"Incremental RFM matches full rebuild for {len(left)} customers.")
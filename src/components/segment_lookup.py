@@ -0,0 +1,141 @@
+import os
+import numpy as np
+
+# One packed record per customer, sorted by customer_id.
+SEGMENT_RECORD = np.dtype([
+    ('customer_id', '<i4'),
+    ('cluster', 'u1'),
+    ('recency', '<i4'),
+    ('frequency', '<i4'),
+    ('monetary', '<f8'),
+], align=False)
+
+# A direct-address index (customer_id - min_id -> row) is written when the ID range is at
+# most this many times the number of customers; otherwise lookups binary-search the IDs.
+MAX_INDEX_SPAN_RATIO = 8
+
+
+# The index is stored in the same file, as a second .npy block starting at the next
+# multiple of this many bytes after the records, so records and index are swapped together.
+INDEX_ALIGNMENT = 64
+
+
+def _legacy_index_path(path) -> str:
+    # Earlier versions kept the index in a separate file next to the table.
+    root, ext = os.path.splitext(str(path))
+    return f"{root}.index{ext}"
+
+
+def _index_offset(records) -> int:
+    end = records.offset + records.nbytes
+    return -(-end // INDEX_ALIGNMENT) * INDEX_ALIGNMENT
+
+
+def _load_index(path, records):
+    offset = _index_offset(records)
+    if os.path.getsize(path) <= offset:
+        return None
+    with open(path, "rb") as f:
+        f.seek(offset)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        data_offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=shape)
+
+
+def write_segment_table(path, customer_ids, clusters, recency, frequency, monetary):
+    """
+    Writes the CustomerID -> segment table as a memory-mappable .npy of packed
+    records sorted by CustomerID, followed in the same file by a direct-address
+    index for dense IDs. The file is written aside and renamed into place, so
+    readers always see a records/index pair from the same run.
+    """
+    records = np.empty(len(customer_ids), dtype=SEGMENT_RECORD)
+    records['customer_id'] = customer_ids
+    records['cluster'] = clusters
+    records['recency'] = np.rint(recency)
+    records['frequency'] = np.rint(frequency)
+    records['monetary'] = monetary
+    records.sort(order='customer_id')
+    if len(records) > 1 and (np.diff(records['customer_id']) == 0).any():
+        raise ValueError("Duplicate CustomerIDs in segment table")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}.npy"
+    ids = records['customer_id'].astype(np.int64)
+    with open(tmp_path, "wb") as f:
+        np.lib.format.write_array(f, records)
+        if len(ids) and ids[-1] - ids[0] + 1 <= MAX_INDEX_SPAN_RATIO * len(ids):
+            index = np.full(ids[-1] - ids[0] + 1, -1, dtype=np.int32)
+            index[ids - ids[0]] = np.arange(len(ids), dtype=np.int32)
+            f.write(b"\0" * (-f.tell() % INDEX_ALIGNMENT))
+            np.lib.format.write_array(f, index)
+    os.replace(tmp_path, path)
+    if os.path.exists(_legacy_index_path(path)):
+        os.remove(_legacy_index_path(path))
+    return len(records)
+
+
+class SegmentLookup:
+    """
+    Read-only CustomerID -> (cluster, Recency, Frequency, Monetary) lookups on
+    the memory-mapped segment table. Only the pages touched by a lookup are
+    read, so opening the table is instant regardless of its size. Lookups are
+    O(1) through the direct-address index when it exists, O(log n) otherwise.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.records = np.load(path, mmap_mode='r')
+        self.customer_ids = self.records['customer_id']
+        self.index = _load_index(path, self.records)
+        self.min_id = int(self.customer_ids[0]) if len(self.records) else 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def _row(self, customer_id: int) -> int:
+        if self.index is not None:
+            offset = customer_id - self.min_id
+            return int(self.index[offset]) if 0 <= offset < len(self.index) else -1
+        row = int(np.searchsorted(self.customer_ids, customer_id))
+        return row if row < len(self.records) and self.customer_ids[row] == customer_id else -1
+
+    def lookup(self, customer_id) -> dict:
+        """
+        Returns {"CustomerID", "Cluster", "Recency", "Frequency", "Monetary"}
+        for a known customer, or None.
+        """
+        row = self._row(int(customer_id))
+        if row < 0:
+            return None
+        record = self.records[row]
+        return {
+            "CustomerID": int(record['customer_id']),
+            "Cluster": int(record['cluster']),
+            "Recency": int(record['recency']),
+            "Frequency": int(record['frequency']),
+            "Monetary": float(record['monetary']),
+        }
+
+    def lookup_many(self, customer_ids) -> np.ndarray:
+        """
+        Clusters of many customers at once as an int array, -1 for unknown IDs.
+        """
+        customer_ids = np.asarray(customer_ids, dtype=np.int64)
+        if self.index is not None:
+            offsets = customer_ids - self.min_id
+            valid = (offsets >= 0) & (offsets < len(self.index))
+            rows = np.full(len(customer_ids), -1, dtype=np.int64)
+            rows[valid] = self.index[offsets[valid]]
+        else:
+            rows = np.searchsorted(self.customer_ids, customer_ids)
+            found = rows < len(self.records)
+            found[found] = self.customer_ids[rows[found]] == customer_ids[found]
+            rows = np.where(found, rows, -1)
+        clusters = np.full(len(customer_ids), -1, dtype=np.int64)
+        known = rows >= 0
+        clusters[known] = self.records['cluster'][rows[known]]
+        return clusters
@@ -0,0 +1,87 @@
+import os
+import json
+from src.utils.common import logger
+from src.utils.artifact_store import ArtifactStore
+from src.entity.config_entity import ServingExportConfig
+from src.components.serving_kernel import export_serving_artifact, export_partitioned_serving_artifact
+from src.components.feature_stats import FeatureStats
+
+
+class ServingExport:
+    def __init__(self, config: ServingExportConfig):
+        self.config = config
+        logger.info(f"Serving Export component initialized.")
+
+    def export(self):
+        """
+        Writes the slim serving artifact from the stored scaler and model: only
+        the scaler mean/scale and the centroid matrix, none of the estimator's
+        training-only state, plus the k-NN assignment index when the model
+        was trained with knn assignment, and the training feature statistics
+        that live traffic is checked against for drift.
+        """
+        logger.info("--- Starting Serving Export ---")
+        try:
+            store = ArtifactStore(self.config.artifact_store_dir)
+            scaler = store.get(self.config.scaler_artifact)
+            model = store.get(self.config.model_artifact)
+            if scaler.meta['feature_names'] != model.meta['feature_names']:
+                raise ValueError(
+                    f"Scaler features {scaler.meta['feature_names']} do not match model features {model.meta['feature_names']}"
+                )
+
+            assignment_mode = model.meta.get('assignment_mode', 'centroid')
+            assignment_index = None
+            if assignment_mode == "knn":
+                assignment_index = store.get(self.config.assignment_index_artifact).load_object()
+
+            export_serving_artifact(
+                self.config.serving_model_path,
+                mean=scaler.arrays['mean'],
+                scale=scaler.arrays['scale'],
+                centroids=model.arrays['centroids'],
+                feature_names=model.meta['feature_names'],
+                assignment_mode=assignment_mode,
+                assignment_index=assignment_index
+            )
+            logger.info(f"Serving artifact ({model.meta['n_clusters']} centroids, {assignment_mode} assignment) saved to: {self.config.serving_model_path}")
+
+            stats = store.get(self.config.feature_stats_artifact)
+            FeatureStats.from_arrays(stats.arrays, stats.meta['feature_names']).save(self.config.feature_stats_path)
+            logger.info(f"Training feature statistics (drift reference) saved to: {self.config.feature_stats_path}")
+
+            if self.config.partition_key:
+                self.export_partitioned(store)
+            elif os.path.exists(self.config.partitioned_model_path):
+                # Partitioning was switched off; stale partition models must not keep routing requests.
+                os.remove(self.config.partitioned_model_path)
+                logger.info(f"Removed stale partitioned serving artifact: {self.config.partitioned_model_path}")
+        except Exception as e:
+            logger.error(f"Error during serving export: {e}")
+            raise e
+
+    def export_partitioned(self, store):
+        """
+        Writes the per-partition scalers and centroids listed in the
+        partition metrics of the last training run as one npz.
+        """
+        with open(self.config.partition_metrics_path) as f:
+            index = json.load(f)
+        partitions, means, scales, centroids = [], [], [], []
+        for partition, metrics in sorted(index['partitions'].items()):
+            model = store.get(metrics['artifact'])
+            partitions.append(partition)
+            means.append(model.arrays['mean'])
+            scales.append(model.arrays['scale'])
+            centroids.append(model.arrays['centroids'])
+
+        export_partitioned_serving_artifact(
+            self.config.partitioned_model_path,
+            partition_key=index['partition_key'],
+            partitions=partitions,
+            means=means,
+            scales=scales,
+            centroids=centroids,
+            feature_names=index['feature_names']
+        )
+        logger.info(f"Partitioned serving artifact ({len(partitions)} values of {index['partition_key']}) saved to: {self.config.partitioned_model_path}")
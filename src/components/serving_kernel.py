@@ -0,0 +1,240 @@
+import os
+import threading
+from pathlib import Path
+import numpy as np
+
+ASSIGNMENT_MODES = ("centroid", "knn")
+
+
+def assignment_index_path(serving_model_path) -> Path:
+    return Path(serving_model_path).with_name("assignment_index.dill")
+
+
+def export_serving_artifact(path, mean, scale, centroids, feature_names, assignment_mode="centroid", assignment_index=None):
+    """
+    Writes the minimal serving artifact: scaler mean/scale, the centroid
+    matrix (in scaled space) and the feature order, as an uncompressed npz.
+    In "knn" assignment mode the `KNNAssigner` is written next to it.
+    """
+    if assignment_mode not in ASSIGNMENT_MODES:
+        raise ValueError(f"Unknown assignment mode: {assignment_mode}. Expected one of {ASSIGNMENT_MODES}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if assignment_mode == "knn":
+        index_path = assignment_index_path(path)
+        tmp_index_path = f"{index_path}.tmp-{os.getpid()}"
+        import dill
+        with open(tmp_index_path, "wb") as f:
+            dill.dump(assignment_index, f)
+        os.replace(tmp_index_path, index_path)
+
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    np.savez(
+        tmp_path,
+        mean=np.asarray(mean, dtype=np.float64),
+        scale=np.asarray(scale, dtype=np.float64),
+        centroids=np.asarray(centroids, dtype=np.float64),
+        feature_names=np.asarray(feature_names, dtype=str),
+        assignment_mode=np.asarray(assignment_mode),
+    )
+    os.replace(tmp_path, path)
+
+
+def export_partitioned_serving_artifact(path, partition_key, partitions, means, scales, centroids, feature_names):
+    """
+    Writes the per-partition models as one npz: each partition's scaler
+    mean/scale as rows of (partitions x features) arrays, and their centroid
+    matrices stacked, with `offsets[i]:offsets[i + 1]` the rows of partition i.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    offsets = np.concatenate([[0], np.cumsum([len(c) for c in centroids])]).astype(np.int64)
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    np.savez(
+        tmp_path,
+        partition_key=np.asarray(partition_key),
+        partitions=np.asarray(partitions, dtype=str),
+        mean=np.asarray(means, dtype=np.float64),
+        scale=np.asarray(scales, dtype=np.float64),
+        centroids=np.concatenate(centroids).astype(np.float64),
+        offsets=offsets,
+        feature_names=np.asarray(feature_names, dtype=str),
+    )
+    os.replace(tmp_path, path)
+
+
+class NearestCentroidKernel:
+    """
+    Fused log1p -> standard scaling -> nearest-centroid kernel.
+
+    The scaler is folded into the centroids once at load time. With
+    z = (log1p(x) - mean) / scale, the squared distance to centroid c is
+    |z|^2 - 2 z.c + |c|^2, and |z|^2 is the same for every centroid, so
+
+        argmin_c |z - c|^2 = argmin_c (bias_c - 2 log1p(x) @ weights_c)
+
+    with weights = c / scale and bias = |c|^2 + 2 (mean / scale) . c. A batch
+    is one in-place log1p and one matrix product into per-thread
+    preallocated buffers of `block_size` rows.
+    """
+    def __init__(self, mean, scale, centroids, feature_names, block_size=4096, assignment_mode="centroid"):
+        self.assignment_mode = assignment_mode
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.feature_names = [str(name) for name in feature_names]
+        self.block_size = block_size
+
+        inv_scale = 1.0 / self.scale
+        self.weights = np.ascontiguousarray((self.centroids * inv_scale).T)
+        self.bias = (self.centroids ** 2).sum(axis=1) + 2.0 * self.centroids @ (self.mean * inv_scale)
+        self._local = threading.local()
+
+    @classmethod
+    def load(cls, path, block_size=4096):
+        with np.load(path) as artifact:
+            assignment_mode = str(artifact["assignment_mode"]) if "assignment_mode" in artifact.files else "centroid"
+            return cls(
+                artifact["mean"], artifact["scale"], artifact["centroids"],
+                artifact["feature_names"].tolist(), block_size=block_size,
+                assignment_mode=assignment_mode
+            )
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.centroids)
+
+    def _buffers(self):
+        # Preallocated per thread, so concurrent requests never share scratch space.
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = (
+                np.empty((self.block_size, len(self.feature_names))),
+                np.empty((self.block_size, self.n_clusters)),
+            )
+            self._local.buffers = buffers
+        return buffers
+
+    def transform(self, X):
+        """
+        Scaled features, the same as log1p followed by StandardScaler.transform.
+        """
+        return (np.log1p(np.asarray(X, dtype=np.float64)) - self.mean) / self.scale
+
+    def predict(self, X):
+        """
+        Nearest-centroid assignment of raw RFM rows (n x features, in
+        `feature_names` order) as an int array.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        logged, scores = self._buffers()
+        labels = np.empty(len(X), dtype=np.intp)
+        for begin in range(0, len(X), self.block_size):
+            block = X[begin:begin + self.block_size]
+            n_rows = len(block)
+            x, s = logged[:n_rows], scores[:n_rows]
+            np.log1p(block, out=x)
+            np.matmul(x, self.weights, out=s)
+            s *= -2.0
+            s += self.bias
+            np.argmin(s, axis=1, out=labels[begin:begin + n_rows])
+        return labels
+
+
+class PartitionRouter:
+    """
+    Routes rows to per-partition `NearestCentroidKernel`s by the value of the
+    partition key (e.g. Country). Rows whose value has no model of its own go
+    to `fallback`, the global model's predict.
+    """
+    def __init__(self, partition_key, kernels, feature_names):
+        self.partition_key = partition_key
+        self.kernels = kernels
+        self.feature_names = [str(name) for name in feature_names]
+
+    @classmethod
+    def load(cls, path, block_size=4096):
+        with np.load(path) as artifact:
+            feature_names = artifact["feature_names"].tolist()
+            offsets = artifact["offsets"]
+            mean, scale, centroids = artifact["mean"], artifact["scale"], artifact["centroids"]
+            kernels = {
+                partition: NearestCentroidKernel(
+                    mean[i], scale[i], centroids[offsets[i]:offsets[i + 1]], feature_names, block_size=block_size
+                )
+                for i, partition in enumerate(artifact["partitions"].tolist())
+            }
+            return cls(str(artifact["partition_key"]), kernels, feature_names)
+
+    def has_model(self, partition) -> bool:
+        return str(partition) in self.kernels
+
+    def predict(self, X, partitions, fallback):
+        """
+        Labels of raw RFM rows `X` (in `feature_names` order), each from the
+        model of its entry in `partitions`, plus a boolean array of which rows
+        a partition model scored (the rest went to `fallback`).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        partitions = np.asarray(partitions, dtype=str).reshape(-1)
+        if len(partitions) == 1 and len(X) > 1:
+            partitions = np.broadcast_to(partitions, len(X))
+        if len(partitions) != len(X):
+            raise ValueError(f"Got {len(partitions)} partition values for {len(X)} rows")
+
+        labels = np.empty(len(X), dtype=np.intp)
+        routed = np.zeros(len(X), dtype=bool)
+        values, inverse = np.unique(partitions, return_inverse=True)
+        for i, value in enumerate(values):
+            rows = np.flatnonzero(inverse == i) if len(values) > 1 else slice(None)
+            kernel = self.kernels.get(str(value))
+            if kernel is None:
+                labels[rows] = fallback(X[rows])
+            else:
+                labels[rows] = kernel.predict(X[rows])
+                routed[rows] = True
+        return labels, routed
+
+
+class KNNAssigner:
+    """
+    Out-of-sample assignment by a k-nearest-neighbour vote over the scaled
+    training points, which follows non-convex (spectral) clusters where the
+    nearest centroid does not. The points live in a KD-tree or ball-tree built
+    once at training time, so a query is O(log n) rather than a scan.
+    """
+    def __init__(self, tree, labels, n_neighbors, n_clusters):
+        self.tree = tree
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.n_neighbors = n_neighbors
+        self.n_clusters = n_clusters
+
+    @classmethod
+    def build(cls, points, labels, n_neighbors=15, tree="kd_tree", leaf_size=40):
+        from sklearn.neighbors import KDTree, BallTree
+        trees = {"kd_tree": KDTree, "ball_tree": BallTree}
+        if tree not in trees:
+            raise ValueError(f"Unknown tree type: {tree}. Expected one of {list(trees)}")
+        labels = np.asarray(labels)
+        index = trees[tree](np.asarray(points, dtype=np.float64), leaf_size=leaf_size)
+        return cls(index, labels, min(n_neighbors, len(labels)), int(labels.max()) + 1)
+
+    @classmethod
+    def load(cls, path):
+        import dill
+        with open(path, "rb") as f:
+            return dill.load(f)
+
+    def predict_scaled(self, Z, exclude_self=False):
+        """
+        Majority label of the nearest training points of each scaled row (ties
+        go to the lowest label). `exclude_self` drops each row's first
+        neighbour, for leave-one-out checks on the training points themselves.
+        """
+        k = self.n_neighbors + int(exclude_self)
+        indices = self.tree.query(np.asarray(Z, dtype=np.float64), k=k, return_distance=False)
+        votes = self.labels[indices[:, int(exclude_self):]]
+        counts = (votes[:, :, None] == np.arange(self.n_clusters)).sum(axis=1)
+        return counts.argmax(axis=1)
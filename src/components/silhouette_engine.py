@@ -0,0 +1,88 @@
+import numpy as np
+from statistics import NormalDist
+from sklearn.metrics import pairwise_distances
+
+
+def _rows_per_chunk(n_samples, memory_budget_mb):
+    # One float64 distance row per sample, plus the same again for temporaries.
+    return max(1, int(memory_budget_mb * 2**20 // (n_samples * 8 * 2)))
+
+
+def chunked_silhouette_samples(X, labels, memory_budget_mb=256, rows=None):
+    """
+    Per-sample silhouette coefficients for `rows` (all rows by default),
+    computed against the full data in row chunks sized to `memory_budget_mb`.
+
+    Points are reordered by cluster once, so each chunk's per-cluster distance
+    sums are a single `np.add.reduceat` over contiguous columns. Matches
+    `sklearn.metrics.silhouette_samples`, including 0 for singleton clusters.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    _, codes = np.unique(labels, return_inverse=True)
+    counts = np.bincount(codes)
+    order = np.argsort(codes, kind='stable')
+    X_by_cluster = X[order]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    rows = np.arange(len(X)) if rows is None else np.asarray(rows)
+    values = np.empty(len(rows))
+    chunk_size = _rows_per_chunk(len(X), memory_budget_mb)
+    for begin in range(0, len(rows), chunk_size):
+        chunk_rows = rows[begin:begin + chunk_size]
+        distances = pairwise_distances(X[chunk_rows], X_by_cluster)
+        cluster_sums = np.add.reduceat(distances, starts, axis=1)
+        del distances
+
+        own = codes[chunk_rows]
+        index = np.arange(len(chunk_rows))
+        own_counts = counts[own]
+        a = cluster_sums[index, own] / np.maximum(own_counts - 1, 1)
+        mean_to_others = cluster_sums / counts
+        mean_to_others[index, own] = np.inf
+        b = mean_to_others.min(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chunk_values = (b - a) / np.maximum(a, b)
+        chunk_values[own_counts == 1] = 0.0
+        values[begin:begin + len(chunk_rows)] = np.nan_to_num(chunk_values)
+    return values
+
+
+def stratified_silhouette_estimate(X, labels, sample_size, memory_budget_mb=256, confidence=0.95, random_state=42):
+    """
+    Estimates the mean silhouette from a cluster-stratified sample: sampled
+    points are scored against the full data, so each sampled value is exact
+    and only the averaging is estimated. Returns the estimate, a normal
+    confidence interval, and the sampled rows with their values.
+    """
+    labels = np.asarray(labels)
+    n_samples = len(labels)
+    rng = np.random.default_rng(random_state)
+    clusters, codes = np.unique(labels, return_inverse=True)
+    counts = np.bincount(codes)
+    allocation = np.minimum(counts, np.maximum(2, np.round(sample_size * counts / n_samples).astype(int)))
+
+    rows = np.concatenate([
+        rng.choice(np.flatnonzero(codes == h), allocation[h], replace=False)
+        for h in range(len(clusters))
+    ])
+    values = chunked_silhouette_samples(X, labels, memory_budget_mb, rows=rows)
+
+    estimate, variance = 0.0, 0.0
+    offset = 0
+    for h, n_h in enumerate(allocation):
+        stratum = values[offset:offset + n_h]
+        offset += n_h
+        weight = counts[h] / n_samples
+        estimate += weight * stratum.mean()
+        if n_h > 1:
+            variance += weight ** 2 * (1 - n_h / counts[h]) * stratum.var(ddof=1) / n_h
+
+    half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * np.sqrt(variance)
+    return {
+        "estimate": float(estimate),
+        "ci_low": float(estimate - half_width),
+        "ci_high": float(estimate + half_width),
+        "rows": rows,
+        "values": values,
+    }
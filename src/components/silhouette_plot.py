@@ -0,0 +1,171 @@
+"""
+Silhouette plot data and rendering.
+
+`silhouette_curves` turns per-sample silhouettes into one sorted curve per
+cluster, optionally reduced to `n_points` quantile points. Each point keeps its
+rank within the cluster, so the reduced curve spans exactly the height of the
+full one and, with a few hundred points per cluster, draws the same shape at
+any figure resolution. The curves are small enough to save as JSON for the app
+to draw client-side, and `render_silhouette_plot` draws the PNG from them.
+Run as a module to render a saved curve file in a separate process:
+
+    python -m src.components.silhouette_plot curves.json silhouette_plot.png
+"""
+import os
+import sys
+import json
+import subprocess
+import numpy as np
+
+PLOT_MODES = ("full", "quantile")
+# Rows of blank space between clusters, as in the original plot.
+CLUSTER_GAP = 10
+
+
+def silhouette_curves(sample_silhouette_values, cluster_labels, n_clusters, silhouette_avg, n_points=None) -> dict:
+    """
+    Per-cluster sorted silhouette curves with their vertical placement in the
+    plot. `n_points=None` keeps every sample; otherwise clusters larger than
+    `n_points` are reduced to `n_points` evenly spaced quantiles (always
+    including their minimum and maximum).
+    """
+    values = np.asarray(sample_silhouette_values, dtype=np.float64)
+    cluster_labels = np.asarray(cluster_labels)
+    clusters = []
+    y_lower = CLUSTER_GAP
+    for i in range(n_clusters):
+        cluster_values = np.sort(values[cluster_labels == i])
+        size = len(cluster_values)
+        if n_points is not None and size > n_points:
+            ranks = np.linspace(0, size - 1, n_points)
+            # Linear interpolation between neighbouring ranks; the curve is sorted, so it is monotone.
+            cluster_values = np.interp(ranks, np.arange(size), cluster_values)
+        else:
+            ranks = np.arange(size, dtype=np.float64)
+        clusters.append({
+            "cluster": i,
+            "size": size,
+            "y_lower": y_lower,
+            "ranks": ranks,
+            "values": cluster_values,
+        })
+        y_lower += size + CLUSTER_GAP
+    return {
+        "n_clusters": int(n_clusters),
+        "n_samples": int(len(values)),
+        "silhouette_avg": float(silhouette_avg),
+        "cluster_gap": CLUSTER_GAP,
+        "clusters": clusters,
+    }
+
+
+def save_curves(curves: dict, path):
+    """
+    Writes the curves as compact JSON (ranks to 2 decimals, values to 5).
+    """
+    data = dict(curves)
+    data["clusters"] = [
+        {
+            **cluster,
+            "ranks": np.round(cluster["ranks"], 2).tolist(),
+            "values": np.round(cluster["values"], 5).tolist(),
+        }
+        for cluster in curves["clusters"]
+    ]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_curves(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def render_silhouette_plot(curves: dict, path):
+    """
+    Draws the silhouette plot of `curves` to `path`. The PNG is written to a
+    temporary file first, so readers never see a partial image.
+    """
+    # A bare Figure (no pyplot) can be drawn off the main thread, or in a fresh process, with any backend.
+    from matplotlib.figure import Figure
+    import matplotlib.cm as cm
+
+    n_clusters = curves["n_clusters"]
+    fig = Figure()
+    ax1 = fig.subplots(1, 1)
+    fig.set_size_inches(10, 7)
+
+    ax1.set_xlim([-0.2, 0.7])
+    ax1.set_ylim([0, curves["n_samples"] + (n_clusters + 1) * curves["cluster_gap"]])
+
+    for cluster in curves["clusters"]:
+        i, y_lower = cluster["cluster"], cluster["y_lower"]
+        color = cm.nipy_spectral(float(i) / n_clusters)
+        ax1.fill_betweenx(
+            y_lower + np.asarray(cluster["ranks"]),
+            0,
+            cluster["values"],
+            facecolor=color,
+            edgecolor=color,
+            alpha=0.7,
+        )
+        ax1.text(-0.05, y_lower + 0.5 * cluster["size"], str(i))
+
+    ax1.set_title("Silhouette Plot for the various clusters")
+    ax1.set_xlabel("Silhouette coefficient values")
+    ax1.set_ylabel("Cluster label")
+
+    ax1.axvline(x=curves["silhouette_avg"], color="red", linestyle="--")
+    ax1.set_yticks([])  # Clear the yaxis labels / ticks
+    ax1.set_xticks([-0.2, 0, 0.2, 0.4, 0.6, 0.7])
+
+    root, ext = os.path.splitext(str(path))
+    tmp_path = f"{root}.tmp-{os.getpid()}{ext}"
+    fig.savefig(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# Background renders started by this process, by plot path, so a pipeline can wait for them
+# before exiting and only then record the stage that started them.
+_BACKGROUND_RENDERS = {}
+
+
+def render_in_background(curves_path, plot_path) -> subprocess.Popen:
+    """
+    Renders the plot of a saved curve file in a separate Python process and
+    returns at once. Only the process that waits for it (see
+    `wait_for_background_renders`) should start one.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.components.silhouette_plot", str(curves_path), str(plot_path)],
+        env=dict(os.environ, MPLBACKEND="Agg"),
+    )
+    _BACKGROUND_RENDERS[str(plot_path)] = process
+    return process
+
+
+def rendering_in_background(paths) -> bool:
+    """
+    Whether any of `paths` is a plot still being rendered by this process.
+    """
+    return any(str(path) in _BACKGROUND_RENDERS for path in paths)
+
+
+def wait_for_background_renders() -> list:
+    """
+    Waits for this process's background renders; returns the plot paths
+    whose render failed.
+    """
+    failed = []
+    while _BACKGROUND_RENDERS:
+        plot_path, process = _BACKGROUND_RENDERS.popitem()
+        if process.wait() != 0:
+            failed.append(plot_path)
+    return failed
+
+
+if __name__ == "__main__":
+    render_silhouette_plot(load_curves(sys.argv[1]), sys.argv[2])
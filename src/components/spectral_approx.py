@@ -0,0 +1,57 @@
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, ClusterMixin
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.neighbors import NearestNeighbors
+from sklearn.utils import check_random_state
+
+
+class LandmarkSpectralClustering(ClusterMixin, BaseEstimator):
+    """
+    Landmark-based spectral clustering (Chen & Cai, 2011).
+
+    Every point is linked only to its `n_neighbors` nearest of `n_landmarks`
+    landmarks (mini-batch k-means centres), which gives a sparse n x m affinity.
+    The spectral embedding comes from the SVD of that matrix via its m x m Gram
+    matrix, so memory is O(n * n_neighbors + n_landmarks^2) instead of the
+    O(n^2) dense RBF affinity of `SpectralClustering`.
+    """
+    def __init__(self, n_clusters=8, n_landmarks=500, n_neighbors=5, random_state=None):
+        self.n_clusters = n_clusters
+        self.n_landmarks = n_landmarks
+        self.n_neighbors = n_neighbors
+        self.random_state = random_state
+
+    def fit(self, X, y=None):
+        X = np.asarray(X, dtype=np.float64)
+        n_samples = X.shape[0]
+        random_state = check_random_state(self.random_state)
+        n_landmarks = min(self.n_landmarks, n_samples)
+        n_neighbors = min(self.n_neighbors, n_landmarks)
+
+        self.landmarks_ = MiniBatchKMeans(
+            n_clusters=n_landmarks, n_init=1, random_state=random_state
+        ).fit(X).cluster_centers_
+
+        distances, indices = NearestNeighbors(n_neighbors=n_neighbors).fit(self.landmarks_).kneighbors(X)
+        bandwidth = distances.mean() or 1.0
+        weights = np.exp(-distances ** 2 / (2 * bandwidth ** 2))
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        z = sparse.csr_matrix(
+            (weights.ravel(), indices.ravel(), np.arange(0, n_samples * n_neighbors + 1, n_neighbors)),
+            shape=(n_samples, n_landmarks),
+        )
+        landmark_degree = np.asarray(z.sum(axis=0)).ravel()
+        z = z @ sparse.diags(1.0 / np.sqrt(np.maximum(landmark_degree, 1e-12)))
+
+        # Left singular vectors of z from the eigenvectors of the small z^T z.
+        eigenvalues, eigenvectors = np.linalg.eigh((z.T @ z).toarray())
+        top = np.argsort(eigenvalues)[::-1][:self.n_clusters]
+        singular_values = np.sqrt(np.maximum(eigenvalues[top], 1e-12))
+        self.embedding_ = (z @ eigenvectors[:, top]) / singular_values
+
+        self.labels_ = KMeans(
+            n_clusters=self.n_clusters, n_init=10, random_state=random_state
+        ).fit_predict(self.embedding_)
+        return self
@@ -1,10 +1,15 @@
-from src.utils.common import read_yaml, create_directories
+import json
+from src.utils.common import read_yaml, create_directories, with_artifact_format, table_fingerprint, logger
 from src.entity.config_entity import (
     DataIngestionConfig,
     DataValidationConfig,
     DataTransformationConfig,
     ModelTrainerConfig,
-    ModelEvaluationConfig)
+    ModelSweepConfig,
+    ModelEvaluationConfig,
+    ServingExportConfig,
+    TrainPipelineConfig,
+    InstrumentationConfig)
 
 from pathlib import Path
 
@@ -16,15 +21,26 @@ class ConfigurationManager:
         config_filepath = CONFIG_FILE_PATH):
 
         self.config = read_yaml(config_filepath)
+        self.artifact_format = self.config.get('artifact_format', 'csv')
+        self.artifact_store_dir = Path(self.config.get('artifact_store_dir', Path(self.config.artifacts_root) / 'store'))
         create_directories([Path(self.config.artifacts_root)])
 
+    def _table_path(self, path) -> Path:
+        return with_artifact_format(Path(path), self.artifact_format)
+
+    def _partition_key(self):
+        # Set once, on the transformation; training and export follow it.
+        return self.config.data_transformation.get('partition_key')
+
     def get_data_ingestion_config(self) -> DataIngestionConfig:
         config = self.config.data_ingestion
         create_directories([Path(config.root_dir)])
         data_ingestion_config = DataIngestionConfig(
             root_dir=Path(config.root_dir),
             source_path=Path(config.source_path), 
-            ingested_data_path=Path(config.ingested_data_path)
+            ingested_data_path=self._table_path(config.ingested_data_path),
+            ingest_mode=config.get('ingest_mode', 'full'),
+            batch_size=int(config.get('batch_size', 100000))
         )
         
         return data_ingestion_config
@@ -34,10 +50,13 @@ class ConfigurationManager:
         create_directories([Path(config.root_dir)])
         data_validation_config = DataValidationConfig(
             root_dir=Path(config.root_dir),
-            data_path=Path(config.data_path), 
-            validation_status_file=Path(config.validation_status_file), #
+            data_path=self._table_path(config.data_path), 
+            validation_report_file=Path(config.validation_report_file),
             required_columns=config.required_columns, 
-            column_schemas=config.column_schemas 
+            column_schemas=config.column_schemas,
+            chunk_size=int(config.get('chunk_size', 100000)),
+            max_failure_samples=int(config.get('max_failure_samples', 5)),
+            rules=config.get('rules', {})
         )
         
         return data_validation_config
@@ -47,46 +66,156 @@ class ConfigurationManager:
         create_directories([Path(config.root_dir)])
         data_transformation_config = DataTransformationConfig(
             root_dir=Path(config.root_dir),
-            data_path=Path(config.data_path), 
-            transformed_data_path=Path(config.transformed_data_path), 
-            scaler_path=Path(config.scaler_path) 
+            data_path=self._table_path(config.data_path), 
+            transformed_data_path=self._table_path(config.transformed_data_path), 
+            artifact_store_dir=self.artifact_store_dir,
+            scaler_artifact=config.get('scaler_artifact', 'scaler'),
+            scaler_chunk_size=int(config.get('scaler_chunk_size', 100000)),
+            feature_stats_artifact=config.get('feature_stats_artifact', 'feature_stats'),
+            rfm_mode=config.get('rfm_mode', 'full'),
+            rfm_engine=config.get('rfm_engine', 'pandas'),
+            n_jobs=config.get('n_jobs'),
+            spill_chunk_size=int(config.get('spill_chunk_size', 1000000)),
+            state_path=self._table_path(config.get('state_path', Path(config.root_dir) / 'rfm_state.csv')),
+            delta_data_path=self._table_path(config.get('delta_data_path', config.data_path)),
+            verify_incremental=bool(config.get('verify_incremental', False)),
+            partition_key=config.get('partition_key'),
+            partitioned_data_path=self._table_path(config.get('partitioned_data_path', Path(config.root_dir) / 'rfm_partitioned.csv')),
+            partition_scaler_artifact=config.get('partition_scaler_artifact', 'partition_scalers'),
+            multi_snapshot=bool(config.get('multi_snapshot', False)),
+            snapshot_months=int(config.get('snapshot_months', 24)),
+            snapshot_window_days=config.get('snapshot_window_days'),
+            snapshots_data_path=self._table_path(config.get('snapshots_data_path', Path(config.root_dir) / 'rfm_snapshots.csv'))
         )
         return data_transformation_config
     
     def get_model_trainer_config(self) -> ModelTrainerConfig:
         config = self.config.model_trainer
         params = self.config.model_trainer.params
+        model_name = config.model_name
         create_directories([Path(config.root_dir)])
+
+        best_config_path = Path(self.config.model_sweep.best_config_path) if 'model_sweep' in self.config else None
+        if config.get('use_sweep_result', False) and best_config_path and best_config_path.exists():
+            with open(best_config_path) as f:
+                best_config = json.load(f)
+            data_path = self._table_path(config.data_path)
+            fingerprint = table_fingerprint(data_path) if data_path.exists() else None
+            if best_config.get('data_fingerprint') != fingerprint:
+                logger.warning(f"Ignoring sweep result {best_config_path}: it was chosen on different data than {data_path}. Rerun the sweep.")
+            else:
+                model_name = best_config['model_name']
+                params = {**params, **best_config['params']}
+                logger.info(f"Using sweep result from {best_config_path}: {model_name} with k={params['num_clusters']}")
         
         model_trainer_config = ModelTrainerConfig(
             root_dir=Path(config.root_dir),
-            data_path=Path(config.data_path), 
-            model_path=Path(config.model_path), 
-            model_name=config.model_name, 
-            params=params 
+            data_path=self._table_path(config.data_path), 
+            artifact_store_dir=self.artifact_store_dir,
+            model_artifact=config.get('model_artifact', 'model'),
+            model_name=model_name, 
+            params=params,
+            training_mode=config.get('training_mode', 'batch'),
+            chunk_size=int(config.get('chunk_size', 100000)),
+            assignment_mode=config.get('assignment_mode', 'centroid'),
+            assignment_index_artifact=config.get('assignment_index_artifact', 'assignment_index'),
+            assign_neighbors=int(config.get('assign_neighbors', 15)),
+            assign_tree=config.get('assign_tree', 'kd_tree'),
+            assign_leaf_size=int(config.get('assign_leaf_size', 40)),
+            assignment_sample_size=int(config.get('assignment_sample_size', 2000)),
+            scaler_artifact=config.get('scaler_artifact', 'scaler'),
+            segment_table_path=Path(config.get('segment_table_path', 'artifacts/serving/customer_segments.npy')),
+            partition_key=self._partition_key(),
+            partitioned_data_path=self._table_path(config.get('partitioned_data_path', 'artifacts/data_transformation/rfm_partitioned.csv')),
+            partition_scaler_artifact=config.get('partition_scaler_artifact', 'partition_scalers'),
+            min_partition_customers=int(config.get('min_partition_customers', 50)),
+            partition_batch_customers=int(config.get('partition_batch_customers', 5000)),
+            partition_n_jobs=config.get('partition_n_jobs'),
+            partition_silhouette_sample_size=int(config.get('partition_silhouette_sample_size', 5000)),
+            partition_metrics_path=Path(config.get('partition_metrics_path', Path(config.root_dir) / 'partition_metrics.json'))
         )
         return model_trainer_config
 
        
     
+    def get_model_sweep_config(self) -> ModelSweepConfig:
+        config = self.config.model_sweep
+        create_directories([Path(config.root_dir)])
+        model_sweep_config = ModelSweepConfig(
+            root_dir=Path(config.root_dir),
+            data_path=self._table_path(config.data_path),
+            best_config_path=Path(config.best_config_path),
+            cache_path=Path(config.cache_path),
+            enabled=bool(config.get('enabled', False)),
+            models=list(config.models),
+            k_values=list(config.k_values),
+            params=config.get('params', {}),
+            n_jobs=config.get('n_jobs'),
+            silhouette_sample_size=int(config.get('silhouette_sample_size', 10000))
+        )
+        return model_sweep_config
+
     def get_model_evaluation_config(self) -> ModelEvaluationConfig:
         config = self.config.model_evaluation
         create_directories([Path(config.root_dir)])
         model_evaluation_config = ModelEvaluationConfig(
             root_dir=Path(config.root_dir),
-            model_path=Path(config.model_path),
-            scaler_path=Path(config.scaler_path), 
-            data_path=Path(config.data_path), 
+            artifact_store_dir=self.artifact_store_dir,
+            model_artifact=config.get('model_artifact', 'model'),
+            data_path=self._table_path(config.data_path), 
             metrics_file_path=Path(config.metrics_file_path), 
-            silhouette_plot_path=Path(config.silhouette_plot_path) 
+            silhouette_plot_path=Path(config.silhouette_plot_path),
+            silhouette_plot_data_path=Path(config.get('silhouette_plot_data_path', Path(config.root_dir) / 'silhouette_plot.json')),
+            silhouette_plot_mode=config.get('silhouette_plot_mode', 'quantile'),
+            plot_quantiles=int(config.get('plot_quantiles', 512)),
+            plot_in_background=bool(config.get('plot_in_background', True)),
+            silhouette_mode=config.get('silhouette_mode', 'exact'),
+            memory_budget_mb=float(config.get('memory_budget_mb', 256)),
+            sample_size=int(config.get('sample_size', 20000)),
+            confidence=float(config.get('confidence', 0.95)),
+            n_workers=int(config.get('n_workers', 3))
         )
         return model_evaluation_config
 
+    def get_serving_export_config(self) -> ServingExportConfig:
+        config = self.config.serving_export
+        create_directories([Path(config.root_dir)])
+        serving_export_config = ServingExportConfig(
+            root_dir=Path(config.root_dir),
+            artifact_store_dir=self.artifact_store_dir,
+            model_artifact=config.get('model_artifact', 'model'),
+            scaler_artifact=config.get('scaler_artifact', 'scaler'),
+            assignment_index_artifact=config.get('assignment_index_artifact', 'assignment_index'),
+            serving_model_path=Path(config.serving_model_path),
+            partition_key=self._partition_key(),
+            partition_metrics_path=Path(config.get('partition_metrics_path', 'artifacts/model_trainer/partition_metrics.json')),
+            partitioned_model_path=Path(config.get('partitioned_model_path', Path(config.root_dir) / 'partitions.npz')),
+            feature_stats_artifact=config.get('feature_stats_artifact', 'feature_stats'),
+            feature_stats_path=Path(config.get('feature_stats_path', Path(config.root_dir) / 'feature_stats.npz'))
+        )
+        return serving_export_config
 
+    def get_train_pipeline_config(self) -> TrainPipelineConfig:
+        config = self.config.get('train_pipeline', {})
+        train_pipeline_config = TrainPipelineConfig(
+            state_path=Path(config.get('state_path', Path(self.config.artifacts_root) / 'pipeline_state.json')),
+            skip_unchanged=bool(config.get('skip_unchanged', True)),
+            executor=config.get('executor', 'thread'),
+            max_workers=int(config.get('max_workers', 2)),
+            timing_report_path=Path(config.get('timing_report_path', Path(self.config.artifacts_root) / 'pipeline_timing.json'))
+        )
+        return train_pipeline_config
 
-
-
-
-
-
-
+    def get_instrumentation_config(self) -> InstrumentationConfig:
+        config = self.config.get('instrumentation', {})
+        instrumentation_dir = Path(self.config.artifacts_root) / 'instrumentation'
+        instrumentation_config = InstrumentationConfig(
+            enabled=bool(config.get('enabled', True)),
+            report_path=Path(config.get('report_path', instrumentation_dir / 'run_report.json')),
+            prometheus_path=Path(config.get('prometheus_path', instrumentation_dir / 'metrics.prom')),
+            count_rows=bool(config.get('count_rows', True)),
+            rss_sample_interval=float(config.get('rss_sample_interval', 0.05)),
+            profile=bool(config.get('profile', False)),
+            profile_dir=Path(config.get('profile_dir', instrumentation_dir / 'profiles'))
+        )
+        return instrumentation_config
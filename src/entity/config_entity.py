@@ -6,36 +6,135 @@ class DataIngestionConfig:
     root_dir: Path
     source_path: str
     ingested_data_path: Path
+    ingest_mode: str
+    batch_size: int
 
 @dataclass(frozen=True)
 class DataValidationConfig:
     root_dir: Path
     data_path: Path
-    validation_status_file: Path
+    validation_report_file: Path
     required_columns: list
     column_schemas: dict
+    chunk_size: int
+    max_failure_samples: int
+    rules: dict
 
 @dataclass(frozen=True)
 class DataTransformationConfig:
     root_dir: Path
     data_path: Path
     transformed_data_path: Path
-    scaler_path: Path
+    artifact_store_dir: Path
+    scaler_artifact: str
+    scaler_chunk_size: int
+    feature_stats_artifact: str
+    rfm_mode: str
+    rfm_engine: str
+    n_jobs: int
+    spill_chunk_size: int
+    state_path: Path
+    delta_data_path: Path
+    verify_incremental: bool
+    partition_key: str
+    partitioned_data_path: Path
+    partition_scaler_artifact: str
+    multi_snapshot: bool
+    snapshot_months: int
+    snapshot_window_days: int
+    snapshots_data_path: Path
 
 @dataclass(frozen=True)
 class ModelTrainerConfig:
     root_dir: Path
     data_path: Path
-    model_path: Path
+    artifact_store_dir: Path
+    model_artifact: str
     model_name: str 
     params: dict
+    training_mode: str
+    chunk_size: int
+    assignment_mode: str
+    assignment_index_artifact: str
+    assign_neighbors: int
+    assign_tree: str
+    assign_leaf_size: int
+    assignment_sample_size: int
+    scaler_artifact: str
+    segment_table_path: Path
+    partition_key: str
+    partitioned_data_path: Path
+    partition_scaler_artifact: str
+    min_partition_customers: int
+    partition_batch_customers: int
+    partition_n_jobs: int
+    partition_silhouette_sample_size: int
+    partition_metrics_path: Path
     
 
+@dataclass(frozen=True)
+class ModelSweepConfig:
+    root_dir: Path
+    data_path: Path
+    best_config_path: Path
+    cache_path: Path
+    enabled: bool
+    models: list
+    k_values: list
+    params: dict
+    n_jobs: int
+    silhouette_sample_size: int
+
+
 @dataclass(frozen=True)
 class ModelEvaluationConfig:
     root_dir: Path
-    model_path: Path
-    scaler_path: Path
+    artifact_store_dir: Path
+    model_artifact: str
     data_path: Path
     metrics_file_path: Path
-    silhouette_plot_path: Path
\ No newline at end of file
+    silhouette_plot_path: Path
+    silhouette_plot_data_path: Path
+    silhouette_plot_mode: str
+    plot_quantiles: int
+    plot_in_background: bool
+    silhouette_mode: str
+    memory_budget_mb: float
+    sample_size: int
+    confidence: float
+    n_workers: int
+
+
+@dataclass(frozen=True)
+class ServingExportConfig:
+    root_dir: Path
+    artifact_store_dir: Path
+    model_artifact: str
+    scaler_artifact: str
+    assignment_index_artifact: str
+    serving_model_path: Path
+    partition_key: str
+    partition_metrics_path: Path
+    partitioned_model_path: Path
+    feature_stats_artifact: str
+    feature_stats_path: Path
+
+
+@dataclass(frozen=True)
+class TrainPipelineConfig:
+    state_path: Path
+    skip_unchanged: bool
+    executor: str
+    max_workers: int
+    timing_report_path: Path
+
+
+@dataclass(frozen=True)
+class InstrumentationConfig:
+    enabled: bool
+    report_path: Path
+    prometheus_path: Path
+    count_rows: bool
+    rss_sample_interval: float
+    profile: bool
+    profile_dir: Path
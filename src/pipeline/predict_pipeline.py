@@ -1,28 +1,50 @@
 import os
-import pandas as pd
+import sys
+import time
 import numpy as np
-from src.utils.common import load_dill, logger
+from src.utils.common import logger, iter_table, write_table_chunks, read_table_columns, save_json
+from src.components.serving_kernel import NearestCentroidKernel, KNNAssigner, PartitionRouter, assignment_index_path
+from src.components.feature_stats import FeatureStats
+from src.utils.instrumentation import Instrumentation, METRIC_PREFIX
 from pathlib import Path
-from scipy.spatial.distance import cdist
 class PredictionPipeline:
     """
     This class loads the trained model and scaler, and uses them
     to predict the cluster for new, incoming RFM data.
     """
     def __init__(self):
-        # We hardcode the paths to the artifacts, which are relative to the root project directory.
-        self.model_path = Path('artifacts/models/model.dill')
-        self.scaler_path = Path('artifacts/models/scaler.dill')
+        # We hardcode the path to the serving artifact, which is relative to the root project directory.
+        self.serving_model_path = Path('artifacts/serving/model.npz')
+        # Per-partition (e.g. per-Country) models, present when training was partitioned.
+        self.partitioned_model_path = Path('artifacts/serving/partitions.npz')
+        # Distribution of the training customers, the reference for drift checks.
+        self.feature_stats_path = Path('artifacts/serving/feature_stats.npz')
+        # Per-call latency histograms of predict / predict_batch (no RSS sampling on the hot path).
+        self.instrumentation = Instrumentation(rss_sample_interval=0)
         
-        # Load the objects into memory *once* when the class is initialized.
-        logger.info("Loading model and scaler objects for prediction...")
+        # Load the serving artifact into memory *once* when the class is initialized.
+        # It holds only the scaler mean/scale and the centroids, so nothing is unpickled.
+        logger.info("Loading serving artifact (scaler + centroids) for prediction...")
         try:
-            model_artifacts = load_dill(self.model_path)
-            self.model = model_artifacts['model']
-            
-            # Convert centroids dictionary back to a DataFrame for easy math
-            self.centroids = pd.DataFrame(model_artifacts['centroids'])
-            self.scaler = load_dill(self.scaler_path)
+            self.kernel = NearestCentroidKernel.load(self.serving_model_path)
+            self.feature_names = self.kernel.feature_names
+            # Models trained with knn assignment label by a vote over their training points instead.
+            self.assigner = None
+            if self.kernel.assignment_mode == "knn":
+                self.assigner = KNNAssigner.load(assignment_index_path(self.serving_model_path))
+            self.router = None
+            self.partition_key = None
+            if self.partitioned_model_path.exists():
+                self.router = PartitionRouter.load(self.partitioned_model_path)
+                self.partition_key = self.router.partition_key
+                logger.info(f"Loaded {len(self.router.kernels)} per-{self.partition_key} models.")
+            # Live input distribution: fixed memory however much traffic is scored.
+            self.reference_stats = None
+            if self.feature_stats_path.exists():
+                self.reference_stats = FeatureStats.load(self.feature_stats_path)
+                self.live_stats = FeatureStats.like(self.reference_stats, buffer_rows=1024)
+            else:
+                self.live_stats = FeatureStats(self.feature_names, buffer_rows=1024)
             logger.info("Model and scaler (with centroids) loaded successfully.")
         except Exception as e:
             logger.error(f"Error loading model/scaler: {e}")
@@ -33,37 +55,176 @@ class PredictionPipeline:
         Applies the *exact* pre-processing (log + scale) to new data.
         """
         try:
-            # 1. Log-transform (using np.log1p which is log(x+1))
+            # Log-transform (np.log1p, i.e. log(x+1)) and scale with the stored mean/scale
             # We assume rfm_data contains the necessary numerical columns
-            rfm_log = np.log1p(rfm_data)
-            
-            # 2. Scale using our *loaded* scaler
-            rfm_scaled = self.scaler.transform(rfm_log)
-            
-            return rfm_scaled
+            return self.kernel.transform(rfm_data)
             
         except Exception as e:
             logger.error(f"Error during data transformation for prediction: {e}")
             raise e
 
-    def predict(self, rfm_data_df):
+    def _predict_global(self, X):
+        if self.assigner is not None:
+            return self.assigner.predict_scaled(self.kernel.transform(X))
+        return self.kernel.predict(X)
+
+    def _score(self, rfm_data, partitions=None):
+        # Labels, plus which rows a partition model scored (None when nothing was routed).
+        # pandas is only imported by callers that build DataFrames; if it is not loaded, this is not one.
+        pd = sys.modules.get("pandas")
+        if pd is not None and isinstance(rfm_data, pd.DataFrame):
+            if partitions is None and self.router is not None and self.partition_key in rfm_data.columns:
+                partitions = rfm_data[self.partition_key].to_numpy()
+            if list(rfm_data.columns) != self.feature_names:
+                rfm_data = rfm_data[self.feature_names]
+            rfm_data = rfm_data.to_numpy(dtype=np.float64)
+        rfm_data = np.asarray(rfm_data, dtype=np.float64)
+        if self.router is not None and partitions is not None:
+            result = self.router.predict(rfm_data, partitions, self._predict_global)
+        else:
+            result = self._predict_global(rfm_data), None
+        # Only inputs that were scored count towards the live distribution.
+        self.live_stats.update(rfm_data)
+        return result
+
+    def predict_batch(self, rfm_data, partitions=None):
+        """
+        Predicts the cluster of every row of new RFM data in one vectorized
+        pass and returns them as an int array. Accepts a DataFrame (columns
+        are picked in training order, extras such as CustomerID are ignored)
+        or a raw array already in `feature_names` order.
+
+        With partitioned models loaded, rows are routed by `partitions` (one
+        value per row, or one for all), or by the DataFrame's partition key
+        column; values without a model of their own use the global model.
+        Cluster numbers are then relative to the model that scored the row.
+        """
+        start = time.perf_counter()
+        labels, _ = self._score(rfm_data, partitions)
+        self.instrumentation.observe("predict_batch", time.perf_counter() - start, rows=len(labels))
+        return labels
+
+    def model_for(self, partition=None) -> str:
+        """
+        Name of the model that scores rows of `partition`: the partition value, or "global".
+        """
+        if partition is not None and self.router is not None and self.router.has_model(partition):
+            return str(partition)
+        return "global"
+
+    def predict(self, rfm_data_df, partition=None):
         """
         Predicts the cluster for new RFM data.
         """
         try:
             logger.info("Starting prediction...")
+            start = time.perf_counter()
             
-            # 1. Transform the new data
-            scaled_data = self.transform_input(rfm_data_df)
-            centroid_points = self.centroids.values
-            # 2. Predict
             # The [0] gets the first (and only) prediction from the array
-            distances = cdist(scaled_data, centroid_points)
-            prediction = np.argmin(distances, axis=1)[0]
+            # Scored directly rather than through predict_batch, so the call lands in one latency histogram.
+            prediction = self._score(rfm_data_df, None if partition is None else [partition])[0][0]
             
+            self.instrumentation.observe("predict", time.perf_counter() - start, rows=1)
             logger.info(f"Prediction complete. Cluster: {prediction}")
             return int(prediction)
             
         except Exception as e:
             logger.error(f"Error during prediction: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def predict_file(self, input_path, output_path, chunksize=100000):
+        """
+        Scores a whole customer file: streams the RFM table at `input_path`
+        (CSV, Parquet or Feather) in chunks of `chunksize` rows and writes
+        CustomerID -> Cluster to `output_path`, whose suffix picks the format.
+        When the input has the partition key column and partitioned models
+        are loaded, rows are routed by it and a Model column records which
+        model (partition value or "global") scored each row.
+        Memory is bounded by the chunk size.
+        """
+        import pandas as pd
+        columns = ['CustomerID', *self.feature_names]
+        routed = self.router is not None and self.partition_key in read_table_columns(Path(input_path))
+        if routed:
+            columns.append(self.partition_key)
+
+        def scored_chunks():
+            for chunk in iter_table(Path(input_path), chunksize, columns=columns):
+                start = time.perf_counter()
+                labels, by_partition = self._score(chunk)
+                self.instrumentation.observe("predict_batch", time.perf_counter() - start, rows=len(labels))
+                scored = pd.DataFrame({
+                    'CustomerID': chunk['CustomerID'].to_numpy(),
+                    'Cluster': labels.astype(np.int32),
+                })
+                if routed:
+                    scored['Model'] = np.where(by_partition, chunk[self.partition_key].astype(str).to_numpy(), "global")
+                yield scored
+
+        try:
+            logger.info(f"Scoring {input_path} in chunks of {chunksize} rows...")
+            rows = write_table_chunks(scored_chunks(), Path(output_path))
+            logger.info(f"Scored {rows} customers. Assignments saved to: {output_path}")
+            return rows
+        except Exception as e:
+            logger.error(f"Error during file prediction: {e}")
+            raise e
+
+    def drift_report(self) -> dict:
+        """
+        Summary of the inputs scored so far (moments and quantiles of
+        log-RFM) and their drift against the training distribution: per
+        feature, the mean shift in training standard deviations and the
+        population stability index.
+        """
+        return {
+            "live": self.live_stats.summary(),
+            "drift": self.live_stats.drift(self.reference_stats) if self.reference_stats is not None else None,
+        }
+
+    def metrics_text(self) -> str:
+        """
+        The latency metrics in Prometheus text format, plus per-feature drift gauges.
+        """
+        lines = [self.instrumentation.prometheus_text().rstrip("\n")]
+        lines += [
+            f"# HELP {METRIC_PREFIX}_scored_rows_total Rows in the live feature statistics (non-finite rows excluded).",
+            f"# TYPE {METRIC_PREFIX}_scored_rows_total counter",
+            f"{METRIC_PREFIX}_scored_rows_total {self.live_stats.count}",
+        ]
+        report = self.drift_report()["drift"]
+        if report is not None and report["count"]:
+            gauges = [
+                ("feature_psi", "psi", "Population stability index of live inputs against the training distribution."),
+                ("feature_mean_shift_std", "mean_shift_std", "Shift of the live log-feature mean, in training standard deviations."),
+            ]
+            for metric, key, help_text in gauges:
+                lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{metric} gauge")
+                for feature, values in report["features"].items():
+                    lines.append(f'{METRIC_PREFIX}_{metric}{{feature="{feature}"}} {values[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, report_path, prometheus_path, stats_path=None, drift_path=None):
+        """
+        Writes the latency histograms of this pipeline's calls as a JSON
+        report and a Prometheus text-format file (with the drift gauges), and
+        optionally the live feature statistics (an npz that
+        `python -m src.components.feature_stats` merges across workers) and
+        the drift report.
+        """
+        self.instrumentation.write_report(report_path)
+        try:
+            os.makedirs(os.path.dirname(prometheus_path), exist_ok=True)
+            tmp_path = f"{prometheus_path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                f.write(self.metrics_text())
+            os.replace(tmp_path, prometheus_path)
+            if stats_path is not None:
+                self.live_stats.save(stats_path)
+            if drift_path is not None:
+                save_json(path=Path(drift_path), data=self.drift_report())
+            logger.info(f"Prediction metrics saved at: {prometheus_path}")
+        except Exception as e:
+            logger.error(f"Error saving prediction metrics: {e}")
+            raise e
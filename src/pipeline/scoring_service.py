@@ -0,0 +1,207 @@
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.utils.common import logger
+
+
+class MicroBatcher:
+    """
+    Collects concurrent scoring requests into one batch: the first queued
+    request opens a window of `max_wait_ms`, and the batch is closed early once
+    it holds `max_batch_size` rows. Each batch is a single vectorized
+    `predict_fn` call, run on a worker thread so the event loop keeps
+    accepting requests meanwhile. Requests may carry per-row partition values;
+    a batch holding any is scored with `predict_fn(rows, partitions)`.
+    """
+    def __init__(self, predict_fn, max_batch_size=1024, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, rows: np.ndarray, partitions=None) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((rows, partitions, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        n_rows = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while n_rows < self.max_batch_size:
+            if self.queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self.queue.get_nowait()
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            try:
+                rows = np.concatenate([rows for rows, _, _ in batch])
+                if any(partitions is not None for _, partitions, _ in batch):
+                    # Rows sent without a partition value go to the global model.
+                    partitions = np.concatenate([
+                        np.full(len(rows), "", dtype=object) if partitions is None else np.asarray(partitions, dtype=object)
+                        for rows, partitions, _ in batch
+                    ])
+                    labels = await loop.run_in_executor(self.executor, self.predict_fn, rows, partitions)
+                else:
+                    labels = await loop.run_in_executor(self.executor, self.predict_fn, rows)
+            except Exception as e:
+                logger.error(f"Error scoring a batch of {len(batch)} requests: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for rows, _, future in batch:
+                if not future.done():
+                    future.set_result(labels[offset:offset + len(rows)])
+                offset += len(rows)
+
+
+class ScoringService:
+    """
+    Minimal asyncio HTTP/1.1 scoring service around `PredictionPipeline`.
+
+    POST /predict with either one customer ({"Recency": .., "Frequency": ..,
+    "Monetary": ..}) -> {"cluster": c}, or many ({"instances": [...]} or a
+    bare list, each a dict like above or a list in feature order) ->
+    {"clusters": [...]}. With partitioned models loaded, dict instances may
+    also carry the partition key (e.g. "Country") to be routed to that
+    partition's model; the response then names the model that scored each
+    instance ("model" / "models": the partition value or "global").
+    GET /health reports readiness, GET /metrics the pipeline's latency
+    histograms and input drift gauges in Prometheus text format, and GET
+    /drift the live input distribution and its drift as JSON (all per worker
+    process). Connections
+    are kept alive.
+    """
+    def __init__(self, pipeline, max_batch_size=1024, max_wait_ms=2.0):
+        self.pipeline = pipeline
+        self.feature_names = list(pipeline.feature_names)
+        self.partition_key = getattr(pipeline, "partition_key", None)
+        self.batcher = MicroBatcher(pipeline.predict_batch, max_batch_size, max_wait_ms)
+
+    def _parse_rows(self, payload):
+        if isinstance(payload, list):
+            instances = payload
+        else:
+            instances = payload.get("instances") if isinstance(payload, dict) else None
+        single = instances is None
+        if single:
+            instances = [payload]
+        rows = [
+            [instance[name] for name in self.feature_names] if isinstance(instance, dict) else instance
+            for instance in instances
+        ]
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim != 2 or rows.shape[1] != len(self.feature_names):
+            raise ValueError(f"Each instance needs the features {self.feature_names}")
+        partitions = None
+        if self.partition_key is not None and any(
+            isinstance(instance, dict) and self.partition_key in instance for instance in instances
+        ):
+            partitions = [instance.get(self.partition_key) if isinstance(instance, dict) else None for instance in instances]
+        return rows, partitions, single
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "features": self.feature_names}
+        if method == "GET" and path == "/metrics":
+            return 200, self.pipeline.metrics_text()
+        if method == "GET" and path == "/drift":
+            return 200, self.pipeline.drift_report()
+        if method == "POST" and path == "/predict":
+            try:
+                rows, partitions, single = self._parse_rows(json.loads(body))
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, {"error": f"Invalid payload: {e}"}
+            labels = await self.batcher.submit(rows, partitions)
+            if partitions is not None:
+                models = [self.pipeline.model_for(partition) for partition in partitions]
+                if single:
+                    return 200, {"cluster": int(labels[0]), "model": models[0]}
+                return 200, {"clusters": labels.tolist(), "models": models}
+            if single:
+                return 200, {"cluster": int(labels[0])}
+            return 200, {"clusters": labels.tolist()}
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    status, response = await self._route(method, path, body)
+                except Exception as e:
+                    logger.error(f"Error handling {method} {path}: {e}")
+                    status, response = 500, {"error": str(e)}
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if isinstance(response, str):
+                    payload, content_type = response.encode(), "text/plain; version=0.0.4"
+                else:
+                    payload, content_type = json.dumps(response).encode(), "application/json"
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, sock):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, sock=sock, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+
+def run_worker(sock, max_batch_size, max_wait_ms):
+    """
+    Entry point of one worker process: the model is loaded here, once per
+    process, and the worker accepts connections on the shared listening socket.
+    """
+    from src.pipeline.predict_pipeline import PredictionPipeline
+    service = ScoringService(PredictionPipeline(), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    logger.info(f"Scoring worker ready (max batch {max_batch_size} rows, max wait {max_wait_ms} ms).")
+    try:
+        asyncio.run(service.serve(sock))
+    except KeyboardInterrupt:
+        pass
@@ -1,69 +1,252 @@
 from src.config.configuration import ConfigurationManager
 from src.components.data_ingestion import DataIngestion
 from src.components.data_validation import DataValidation
-from src.components.data_transformation import DataTransformation
-from src.components.model_trainer import ModelTrainer
+from src.components.data_transformation import DataTransformation, TRANSFORMATION_MODULES
+from src.components.model_trainer import ModelTrainer, TRAINER_MODULES
+from src.components.model_sweep import ModelSweep
 from src.components.model_evaluation import ModelEvaluation
-from src.utils.common import logger
+from src.components.serving_export import ServingExport
+from pathlib import Path
+from src.utils.common import logger, save_json, count_table_rows, ARTIFACT_FORMATS
+from src.utils.stage_cache import StageCache
+from src.utils.dag_scheduler import DAGScheduler
+from src.utils.instrumentation import Instrumentation
+from src.components.silhouette_plot import rendering_in_background, wait_for_background_renders
+
+STAGES = ("ingestion", "validation", "transformation", "sweep", "trainer", "evaluation", "export")
+
 
 class TrainPipeline:
-    def __init__(self):
+    def __init__(self, force: list = None):
         self.config_manager = ConfigurationManager()
+        self.pipeline_config = self.config_manager.get_train_pipeline_config()
+        self.stage_cache = StageCache(self.pipeline_config.state_path)
+        self.instrumentation_config = self.config_manager.get_instrumentation_config()
+        self.instrumentation = Instrumentation(
+            profile=self.instrumentation_config.profile,
+            profile_dir=self.instrumentation_config.profile_dir,
+            rss_sample_interval=self.instrumentation_config.rss_sample_interval if self.instrumentation_config.enabled else 0
+        )
+        force = set(force or [])
+        unknown = force - set(STAGES) - {"all"}
+        if unknown:
+            raise ValueError(f"Unknown stage(s) to force: {sorted(unknown)}. Expected any of {list(STAGES)} or 'all'")
+        self.force = set(STAGES) if "all" in force else force
+        # stage -> (outputs, fingerprint) of stages whose plots are still rendering in the background.
+        self.deferred_records = {}
         logger.info("Training Pipeline initialized.")
 
+    def _count_rows(self, paths):
+        tables = [Path(path) for path in paths if Path(path).suffix in ARTIFACT_FORMATS.values() and Path(path).exists()]
+        return sum(count_table_rows(path) for path in tables) if tables else None
+
+    def _run_stage(self, stage, title, config, inputs, outputs, modules, run):
+        """
+        Runs a stage unless its fingerprint (config, input file contents and
+        code) matches the one recorded by its last successful run and its
+        outputs still exist. Forced stages always run. A stage whose outputs
+        are still rendering in the background is recorded once they finish.
+        Returns the stage's instrumentation record (duration, peak RSS delta,
+        rows in/out).
+        """
+        fingerprint = self.stage_cache.fingerprint(config, inputs, modules)
+        if (
+            self.pipeline_config.skip_unchanged
+            and stage not in self.force
+            and self.stage_cache.is_fresh(stage, fingerprint, outputs)
+        ):
+            logger.info(f"--- Skipping {title} stage (inputs, config and code unchanged) ---")
+            return self.instrumentation.skip(stage)
+        self.stage_cache.invalidate(stage)
+        logger.info(f"--- Starting {title} stage ---")
+        record = None
+        try:
+            with self.instrumentation.stage(stage) as record:
+                run()
+            logger.info(f"--- Completed {title} stage in {record['duration_seconds']:.3f}s (peak RSS +{record['peak_rss_delta_mb']:.1f} MB) ---")
+        except Exception as e:
+            logger.error(f"{title} stage FAILED: {e}")
+            if record is not None:
+                # Travels with the exception, so a process-pool stage's failed record reaches the parent.
+                e.stage_record = record
+            raise e
+        if self.instrumentation_config.enabled and self.instrumentation_config.count_rows:
+            record["rows_in"], record["rows_out"] = self._count_rows(inputs), self._count_rows(outputs)
+        fingerprint = fingerprint or self.stage_cache.fingerprint(config, inputs, modules)
+        if rendering_in_background(outputs):
+            self.deferred_records[stage] = ([str(path) for path in outputs], fingerprint)
+        else:
+            self.stage_cache.record(stage, fingerprint)
+        return record
+
     def run_data_ingestion(self):
-        logger.info("--- Starting Data Ingestion stage ---")
         ingestion_config = self.config_manager.get_data_ingestion_config()
-        data_ingestion = DataIngestion(config=ingestion_config)
-        data_ingestion.ingest_data()
-        logger.info("--- Completed Data Ingestion stage ---")
+        return self._run_stage(
+            "ingestion", "Data Ingestion", ingestion_config,
+            inputs=[ingestion_config.source_path],
+            outputs=[ingestion_config.ingested_data_path],
+            modules=["src.components.data_ingestion", "src.utils.common"],
+            run=lambda: DataIngestion(config=ingestion_config).ingest_data()
+        )
 
     def run_data_validation(self):
-        logger.info("--- Starting Data Validation stage ---")
         validation_config = self.config_manager.get_data_validation_config()
-        data_validation = DataValidation(config=validation_config)
-        data_validation.run_validation()
-        logger.info("--- Completed Data Validation stage ---")
+        return self._run_stage(
+            "validation", "Data Validation", validation_config,
+            inputs=[validation_config.data_path],
+            outputs=[validation_config.validation_report_file],
+            modules=["src.components.data_validation", "src.utils.common"],
+            run=lambda: DataValidation(config=validation_config).run_validation()
+        )
 
     def run_data_transformation(self):
-        logger.info("--- Starting Data Transformation stage ---")
-        try:
-            transform_config = self.config_manager.get_data_transformation_config()
-            data_transformation = DataTransformation(config=transform_config)
-            data_transformation.run_transformation()
-            logger.info("--- Completed Data Transformation stage ---")
-        except Exception as e:
-            logger.error(f"Data Transformation stage FAILED: {e}")
-            raise e
+        transform_config = self.config_manager.get_data_transformation_config()
+        inputs = [transform_config.data_path]
+        if transform_config.rfm_mode == "incremental":
+            inputs.append(transform_config.delta_data_path)
+        outputs = [
+            transform_config.transformed_data_path,
+            transform_config.artifact_store_dir / "refs" / f"{transform_config.scaler_artifact}.json",
+            transform_config.artifact_store_dir / "refs" / f"{transform_config.feature_stats_artifact}.json",
+        ]
+        if transform_config.partition_key:
+            outputs += [
+                transform_config.partitioned_data_path,
+                transform_config.artifact_store_dir / "refs" / f"{transform_config.partition_scaler_artifact}.json",
+            ]
+        if transform_config.multi_snapshot:
+            outputs.append(transform_config.snapshots_data_path)
+        return self._run_stage(
+            "transformation", "Data Transformation", transform_config,
+            inputs=inputs,
+            outputs=outputs,
+            modules=TRANSFORMATION_MODULES,
+            run=lambda: DataTransformation(config=transform_config).run_transformation()
+        )
+
+    def run_model_sweep(self):
+        sweep_config = self.config_manager.get_model_sweep_config()
+        if not sweep_config.enabled:
+            logger.info("--- Skipping Model Sweep stage (disabled in config) ---")
+            return self.instrumentation.skip("sweep")
+        return self._run_stage(
+            "sweep", "Model Sweep", sweep_config,
+            inputs=[sweep_config.data_path],
+            outputs=[sweep_config.best_config_path],
+            modules=["src.components.model_sweep", "src.components.model_trainer", "src.components.spectral_approx"],
+            run=lambda: ModelSweep(config=sweep_config).run_sweep()
+        )
 
     def run_model_trainer(self):
-        logger.info("--- Starting Model Trainer stage ---")
-        try:
-            trainer_config = self.config_manager.get_model_trainer_config()
-            model_trainer = ModelTrainer(config=trainer_config)
-            model_trainer.train_model()
-            logger.info("--- Completed Model Trainer stage ---")
-        except Exception as e:
-            logger.error(f"Model Trainer stage FAILED: {e}")
-            raise e
+        trainer_config = self.config_manager.get_model_trainer_config()
+        inputs = [trainer_config.data_path]
+        outputs = [
+            trainer_config.artifact_store_dir / "refs" / f"{trainer_config.model_artifact}.json",
+            trainer_config.segment_table_path,
+        ]
+        if trainer_config.partition_key:
+            inputs.append(trainer_config.partitioned_data_path)
+            outputs.append(trainer_config.partition_metrics_path)
+        return self._run_stage(
+            "trainer", "Model Trainer", trainer_config,
+            inputs=inputs,
+            outputs=outputs,
+            modules=TRAINER_MODULES,
+            run=lambda: ModelTrainer(config=trainer_config).train_model()
+        )
         
     def run_model_evaluation(self):
-        logger.info("--- Starting Model Evaluation stage ---")
-        try:
-            eval_config = self.config_manager.get_model_evaluation_config()
-            model_evaluation = ModelEvaluation(config=eval_config)
-            model_evaluation.evaluate_model()
-            logger.info("--- Completed Model Evaluation stage ---")
-        except Exception as e:
-            logger.error(f"Model Evaluation stage FAILED: {e}")
-            raise e
+        eval_config = self.config_manager.get_model_evaluation_config()
+        return self._run_stage(
+            "evaluation", "Model Evaluation", eval_config,
+            # The model ref holds the content key of the current model.
+            inputs=[eval_config.data_path, eval_config.artifact_store_dir / "refs" / f"{eval_config.model_artifact}.json"],
+            # The PNG may render in the background after the stage returns; the stage is then recorded once it exists.
+            outputs=[eval_config.metrics_file_path, eval_config.silhouette_plot_data_path, eval_config.silhouette_plot_path],
+            modules=["src.components.model_evaluation", "src.components.silhouette_engine", "src.components.silhouette_plot"],
+            run=lambda: ModelEvaluation(config=eval_config).evaluate_model()
+        )
 
+    def run_serving_export(self):
+        export_config = self.config_manager.get_serving_export_config()
+        refs_dir = export_config.artifact_store_dir / "refs"
+        inputs = [
+            refs_dir / f"{export_config.model_artifact}.json",
+            refs_dir / f"{export_config.scaler_artifact}.json",
+            refs_dir / f"{export_config.feature_stats_artifact}.json",
+        ]
+        outputs = [export_config.serving_model_path, export_config.feature_stats_path]
+        if export_config.partition_key:
+            # Lists the partition models (and their artifact names) of the last training run.
+            inputs.append(export_config.partition_metrics_path)
+            outputs.append(export_config.partitioned_model_path)
+        return self._run_stage(
+            "export", "Serving Export", export_config,
+            inputs=inputs,
+            outputs=outputs,
+            modules=["src.components.serving_export", "src.components.serving_kernel", "src.components.feature_stats"],
+            run=lambda: ServingExport(config=export_config).export()
+        )
+
+
+    def build_graph(self) -> DAGScheduler:
+        """
+        The stage dependency graph. Transformation publishes the training
+        table and the scaler, so it waits for validation to pass.
+        """
+        scheduler = DAGScheduler(
+            max_workers=self.pipeline_config.max_workers,
+            executor=self.pipeline_config.executor
+        )
+        scheduler.add("ingestion", self.run_data_ingestion)
+        scheduler.add("validation", self.run_data_validation, depends_on=["ingestion"])
+        scheduler.add("transformation", self.run_data_transformation, depends_on=["validation"])
+        scheduler.add("sweep", self.run_model_sweep, depends_on=["transformation"])
+        scheduler.add("trainer", self.run_model_trainer, depends_on=["sweep"])
+        scheduler.add("evaluation", self.run_model_evaluation, depends_on=["trainer"])
+        scheduler.add("export", self.run_serving_export, depends_on=["trainer"])
+        return scheduler
 
     def run(self):
         logger.info(">>> Starting entire training pipeline <<<")
-        self.run_data_ingestion()
-        self.run_data_validation()
-        self.run_data_transformation()
-        self.run_model_trainer()
-        self.run_model_evaluation()
+        scheduler = self.build_graph()
+        try:
+            scheduler.run()
+        finally:
+            scheduler.log_summary("Training pipeline")
+            save_json(path=self.pipeline_config.timing_report_path, data=scheduler.report())
+            self.write_instrumentation(scheduler)
+            self.record_deferred_stages()
         logger.info(">>> Completed entire training pipeline <<<")
+
+    def record_deferred_stages(self):
+        """
+        Waits for background plot renders and records the stages that started
+        them, unless a render failed, so those stages rerun next time.
+        """
+        failed = set(wait_for_background_renders())
+        for stage, (outputs, fingerprint) in self.deferred_records.items():
+            if failed.intersection(outputs):
+                logger.error(f"Background rendering of {sorted(failed.intersection(outputs))} failed; the {stage} stage will rerun next time.")
+            else:
+                self.stage_cache.record(stage, fingerprint)
+        self.deferred_records.clear()
+
+    def write_instrumentation(self, scheduler):
+        """
+        Writes the run report and the Prometheus metrics. Stages run in a
+        process pool measured themselves in the worker; their records come
+        back as the task results, or attached to the exception of a failed
+        stage.
+        """
+        if not self.instrumentation_config.enabled:
+            return
+        for record in scheduler.results.values():
+            if isinstance(record, dict):
+                self.instrumentation.add_stage_record(record)
+        for error in scheduler.errors.values():
+            record = getattr(error, "stage_record", None)
+            if record is not None:
+                self.instrumentation.add_stage_record(record)
+        self.instrumentation.write_report(self.instrumentation_config.report_path)
+        self.instrumentation.write_prometheus(self.instrumentation_config.prometheus_path)
@@ -0,0 +1,180 @@
+import os
+import json
+import importlib.util
+import shutil
+import hashlib
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+import dill
+import numpy as np
+from src.utils.common import logger
+
+
+MANIFEST_FILE = "manifest.json"
+OBJECT_FILE = "object.dill"
+
+# (resolved path, size, mtime_ns) -> sha256, so an unchanged input file is hashed once per process.
+_FILE_HASHES = {}
+
+
+def fingerprint_file(path, block_size=1 << 20) -> str:
+    path = Path(path).resolve()
+    stat = path.stat()
+    cache_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if cache_key not in _FILE_HASHES:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        _FILE_HASHES[cache_key] = digest.hexdigest()
+    return _FILE_HASHES[cache_key]
+
+
+def _fingerprint_input(value) -> str:
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        return hashlib.sha256(f"{value.dtype}{value.shape}".encode() + value.tobytes()).hexdigest()
+    if isinstance(value, (str, Path)) and os.path.isfile(value):
+        return fingerprint_file(value)
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def code_version(modules: list) -> dict:
+    # The source of the modules that implement a stage stands in for its code version.
+    return {name: fingerprint_file(importlib.util.find_spec(name).origin) for name in modules}
+
+
+def artifact_key(config: dict, inputs: list, modules: list = ()) -> str:
+    """
+    Content key of an artifact: the sha256 of its config, the content of
+    each input (file paths are hashed by content, arrays by their bytes) and
+    the source of the `modules` that produce it, so a code change never
+    reuses an artifact built by the old code.
+    """
+    payload = {
+        "config": config,
+        "inputs": [_fingerprint_input(value) for value in inputs],
+        "code": code_version(modules),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Artifact:
+    """
+    A loaded artifact. `arrays` are read-only memory maps of the stored .npy
+    files; the pickled object, if any, is only unpickled on `load_object()`.
+    """
+    def __init__(self, path: Path, manifest: dict):
+        self.path = path
+        self.key = manifest["key"]
+        self.meta = manifest["meta"]
+        self.arrays = {
+            name: np.load(path / spec["file"], mmap_mode="r")
+            for name, spec in manifest["arrays"].items()
+        }
+        self._has_object = manifest["object"] is not None
+        self._object = None
+        self._lock = threading.Lock()
+
+    def load_object(self):
+        if not self._has_object:
+            raise ValueError(f"Artifact {self.key[:12]} has no pickled object")
+        with self._lock:
+            if self._object is None:
+                with open(self.path / OBJECT_FILE, "rb") as f:
+                    self._object = dill.load(f)
+                logger.info(f"Artifact object unpickled from: {self.path / OBJECT_FILE}")
+        return self._object
+
+
+class ArtifactStore:
+    """
+    Content-addressed artifact store. Each artifact lives in
+    `objects/<key>/` as raw .npy arrays, an optional dill-pickled object and a
+    small JSON manifest; `refs/<name>.json` points a name at its current key.
+    Loaded artifacts are kept in an in-process cache, which is safe because a
+    key's content never changes.
+    """
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, root_dir: Path):
+        self.root_dir = Path(root_dir)
+        self.objects_dir = self.root_dir / "objects"
+        self.refs_dir = self.root_dir / "refs"
+
+    def has(self, key: str) -> bool:
+        return (self.objects_dir / key / MANIFEST_FILE).exists()
+
+    def put(self, name: str, key: str, arrays: dict = None, meta: dict = None, obj=None) -> str:
+        """
+        Stores an artifact under `key` unless it already exists, then points
+        `name` at it. Writes go to a temporary directory that is renamed into
+        place, so readers never see a partial artifact.
+        """
+        arrays = arrays or {}
+        if self.has(key):
+            logger.info(f"Artifact '{name}' already stored under key {key[:12]}, reusing it.")
+        else:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            tmp_dir = self.objects_dir / f".tmp-{key}-{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            manifest = {
+                "key": key,
+                "name": name,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "arrays": {},
+                "meta": meta or {},
+                "object": None,
+            }
+            for array_name, value in arrays.items():
+                value = np.ascontiguousarray(value)
+                np.save(tmp_dir / f"{array_name}.npy", value)
+                manifest["arrays"][array_name] = {
+                    "file": f"{array_name}.npy", "dtype": str(value.dtype), "shape": list(value.shape)
+                }
+            if obj is not None:
+                with open(tmp_dir / OBJECT_FILE, "wb") as f:
+                    dill.dump(obj, f)
+                manifest["object"] = OBJECT_FILE
+            with open(tmp_dir / MANIFEST_FILE, "w") as f:
+                json.dump(manifest, f, indent=4)
+            try:
+                os.rename(tmp_dir, self.objects_dir / key)
+            except OSError:
+                # Another writer stored the same content first.
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.info(f"Artifact '{name}' stored under key {key[:12]} at: {self.objects_dir / key}")
+
+        os.makedirs(self.refs_dir, exist_ok=True)
+        ref_path = self.refs_dir / f"{name}.json"
+        tmp_ref = ref_path.with_suffix(f".tmp-{os.getpid()}")
+        with open(tmp_ref, "w") as f:
+            json.dump({"key": key}, f)
+        os.replace(tmp_ref, ref_path)
+        return key
+
+    def resolve(self, name: str) -> str:
+        ref_path = self.refs_dir / f"{name}.json"
+        if not ref_path.exists():
+            raise FileNotFoundError(f"No artifact named '{name}' in store at: {self.root_dir}")
+        with open(ref_path) as f:
+            return json.load(f)["key"]
+
+    def get(self, name: str = None, key: str = None) -> Artifact:
+        """
+        Loads an artifact by name (its current key) or by key. Repeated loads
+        of the same key return the cached `Artifact`.
+        """
+        key = key or self.resolve(name)
+        path = self.objects_dir / key
+        cache_key = (str(path.resolve()), key)
+        with self._cache_lock:
+            if cache_key not in self._cache:
+                with open(path / MANIFEST_FILE) as f:
+                    manifest = json.load(f)
+                self._cache[cache_key] = Artifact(path, manifest)
+                logger.info(f"Artifact {key[:12]} loaded from: {path}")
+            return self._cache[cache_key]
@@ -3,9 +3,10 @@ import yaml
 from box import ConfigBox  
 from ensure import ensure_annotations 
 from pathlib import Path
-import dill                 
 import json
 import logging
+# dill, pandas and pyarrow are imported inside the functions that use them, so that
+# light importers (the prediction path, the app, the scoring workers) start fast.
 
 
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s]: %(message)s:')
@@ -34,6 +35,7 @@ def save_dill(data: object, path: Path):
     try:
         dir_path = os.path.dirname(path)
         os.makedirs(dir_path, exist_ok=True)
+        import dill
         with open(path, "wb") as file:
             dill.dump(data, file)
         logger.info(f"Dill file saved successfully at: {path}")
@@ -44,6 +46,7 @@ def save_dill(data: object, path: Path):
 @ensure_annotations
 def load_dill(path: Path) -> object:
     try:
+        import dill
         with open(path, "rb") as file:
             data = dill.load(file)
         logger.info(f"Dill file loaded successfully from: {path}")
@@ -62,4 +65,183 @@ def save_json(path: Path, data: dict):
         logger.info(f"JSON file saved successfully at: {path}")
     except Exception as e:
         logger.error(f"Error saving JSON file at: {path}\n{e}")
-        raise e
\ No newline at end of file
+        raise e
+
+ARTIFACT_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+@ensure_annotations
+def with_artifact_format(path: Path, artifact_format: str) -> Path:
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unknown artifact format: {artifact_format}. Expected one of {list(ARTIFACT_FORMATS)}")
+    return Path(path).with_suffix(ARTIFACT_FORMATS[artifact_format])
+
+def _table_format(path) -> str:
+    suffix = Path(path).suffix.lower()
+    if suffix == ".arrow":
+        return "feather"
+    for name, ext in ARTIFACT_FORMATS.items():
+        if ext == suffix:
+            return name
+    raise ValueError(f"Unsupported table artifact: {path}")
+
+def _to_arrow_table(df: "pd.DataFrame") -> "pa.Table":
+    import pyarrow as pa
+    df = df.copy(deep=False)
+    for col in df.columns[df.dtypes == object]:
+        # Excel columns such as InvoiceNo/StockCode mix ints and strings
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def save_table(df: "pd.DataFrame", path: Path):
+    """
+    Writes a DataFrame in the format given by the file suffix. Feather files are
+    written uncompressed so readers can memory-map them without a decode step.
+    """
+    try:
+        dir_path = os.path.dirname(path)
+        os.makedirs(dir_path, exist_ok=True)
+        table_format = _table_format(path)
+        if table_format == "csv":
+            df.to_csv(path, index=False)
+        elif table_format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(_to_arrow_table(df), path)
+        else:
+            import pyarrow.feather as feather
+            feather.write_feather(_to_arrow_table(df), path, compression="uncompressed")
+        logger.info(f"Table saved successfully at: {path}")
+    except Exception as e:
+        logger.error(f"Error saving table at: {path}\n{e}")
+        raise e
+
+def load_table(path: Path, columns: list = None) -> "pd.DataFrame":
+    """
+    Reads a table artifact, optionally only the given columns. Parquet and
+    Feather files are memory-mapped; uncompressed Feather columns without nulls
+    come back as views on the mapped file instead of copies.
+    """
+    try:
+        table_format = _table_format(path)
+        if table_format == "csv":
+            import pandas as pd
+            df = pd.read_csv(path, usecols=columns)
+        else:
+            import pyarrow.feather as feather
+            import pyarrow.parquet as pq
+            if table_format == "parquet":
+                table = pq.read_table(path, columns=columns, memory_map=True)
+            else:
+                table = feather.read_table(path, columns=columns, memory_map=True)
+            df = table.to_pandas(split_blocks=True)
+        logger.info(f"Table loaded successfully from: {path}")
+        return df
+    except Exception as e:
+        logger.error(f"Error loading table at: {path}\n{e}")
+        raise e
+
+def read_table_columns(path: Path) -> list:
+    """
+    Returns the column names of a table artifact without reading any rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table_format = _table_format(path)
+    if table_format == "csv":
+        import pandas as pd
+        return list(pd.read_csv(path, nrows=0).columns)
+    if table_format == "parquet":
+        return pq.read_schema(path).names
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+def count_table_rows(path: Path) -> int:
+    """
+    Number of rows of a table artifact. Parquet and Feather only read their
+    footer; CSV files are scanned for newlines, without parsing.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table_format = _table_format(path)
+    if table_format == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    if table_format == "feather":
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    with open(path, "rb") as f:
+        newlines = sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+    # Minus the header row.
+    return max(newlines - 1, 0)
+
+def iter_table(path: Path, chunksize: int, columns: list = None):
+    """
+    Yields a table artifact as DataFrames of at most `chunksize` rows, indexed
+    by their row number in the file, so memory stays bounded by the chunk size.
+    """
+    import pandas as pd
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    table_format = _table_format(path)
+    if table_format == "csv":
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+        return
+
+    if table_format == "parquet":
+        batches = pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunksize, columns=columns)
+    else:
+        batches = feather.read_table(path, columns=columns, memory_map=True).to_batches(max_chunksize=chunksize)
+    offset = 0
+    for batch in batches:
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+def write_table_chunks(chunks, path: Path) -> int:
+    """
+    Writes an iterable of DataFrames with the same columns to one table
+    artifact as they arrive, so only one chunk is held in memory. Returns the
+    number of rows written.
+    """
+    dir_path = os.path.dirname(path)
+    os.makedirs(dir_path, exist_ok=True)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table_format = _table_format(path)
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            if table_format == "csv":
+                chunk.to_csv(path, mode="w" if rows == 0 else "a", header=rows == 0, index=False)
+            else:
+                table = _to_arrow_table(chunk)
+                if writer is None:
+                    if table_format == "parquet":
+                        writer = pq.ParquetWriter(path, table.schema)
+                    else:
+                        writer = pa.ipc.new_file(str(path), table.schema)
+                writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    logger.info(f"{rows} rows written in chunks to: {path}")
+    return rows
+
+def table_fingerprint(path: Path, chunksize: int = 100000, exclude: tuple = ("CustomerID",)) -> str:
+    """
+    SHA-256 of the float64 feature matrix of a table artifact (every column
+    but `exclude`, in row-major order), hashed chunk by chunk. Equal to the
+    `data_fingerprint` the model sweep records for the same table.
+    """
+    import hashlib
+    import numpy as np
+    columns = [column for column in read_table_columns(path) if column not in exclude]
+    digest = hashlib.sha256()
+    for chunk in iter_table(path, chunksize, columns=columns):
+        digest.update(np.ascontiguousarray(chunk[columns].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
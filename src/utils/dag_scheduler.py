@@ -0,0 +1,142 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from src.utils.common import logger
+
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+class DAGScheduler:
+    """
+    Runs a declared dependency graph of tasks on a thread or process pool.
+    A task is submitted as soon as all of its dependencies have finished;
+    finished tasks' return values are in `results`, so a (thread pool) task
+    can read its dependencies' results there, and failed tasks' exceptions
+    are in `errors`. Process pools need picklable
+    task callables and arguments.
+
+    After `run`, `records` holds per-task start/end offsets and durations and
+    `critical_path` the chain of tasks that determined the wall time.
+    """
+    def __init__(self, max_workers: int = None, executor: str = "thread"):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor: {executor}. Expected one of {list(EXECUTORS)}")
+        self.max_workers = max_workers
+        self.executor = executor
+        self.tasks = {}
+        self.results = {}
+        self.errors = {}
+        self.records = {}
+        self.critical_path = []
+        self.wall_seconds = 0.0
+
+    def add(self, name: str, fn, depends_on: list = None, args: tuple = ()):
+        if name in self.tasks:
+            raise ValueError(f"Task already declared: {name}")
+        self.tasks[name] = (fn, tuple(args), list(depends_on or []))
+        return self
+
+    def _check_graph(self):
+        for name, (_, _, deps) in self.tasks.items():
+            unknown = [dep for dep in deps if dep not in self.tasks]
+            if unknown:
+                raise ValueError(f"Task {name} depends on undeclared task(s): {unknown}")
+        visited, in_progress = set(), set()
+
+        def visit(name):
+            if name in in_progress:
+                raise ValueError(f"Dependency cycle through task: {name}")
+            if name not in visited:
+                in_progress.add(name)
+                for dep in self.tasks[name][2]:
+                    visit(dep)
+                in_progress.discard(name)
+                visited.add(name)
+
+        for name in self.tasks:
+            visit(name)
+
+    def run(self) -> dict:
+        """
+        Runs every task and returns {name: result}. If a task fails, no new
+        tasks are started, the running ones are awaited, and the first error is
+        re-raised; `records` marks tasks as done, failed or not run.
+        """
+        self._check_graph()
+        self.records = {name: {"status": "not_run", "depends_on": deps} for name, (_, _, deps) in self.tasks.items()}
+        # Cleared in place, so tasks may be given `results` as an argument before the run.
+        self.results.clear()
+        self.errors.clear()
+        results = self.results
+        error = None
+        pending = dict(self.tasks)
+        running = {}
+        origin = time.perf_counter()
+
+        with EXECUTORS[self.executor](max_workers=self.max_workers) as pool:
+            while pending or running:
+                if error is None:
+                    ready = [name for name, (_, _, deps) in pending.items() if all(dep in results for dep in deps)]
+                    for name in ready:
+                        fn, args, _ = pending.pop(name)
+                        self.records[name]["start"] = time.perf_counter() - origin
+                        running[pool.submit(fn, *args)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    record = self.records[name]
+                    record["end"] = time.perf_counter() - origin
+                    record["seconds"] = record["end"] - record["start"]
+                    try:
+                        results[name] = future.result()
+                        record["status"] = "done"
+                    except Exception as e:
+                        record["status"] = "failed"
+                        self.errors[name] = e
+                        logger.error(f"Task {name} failed after {record['seconds']:.3f}s: {e}")
+                        error = error or e
+
+        self.wall_seconds = time.perf_counter() - origin
+        self.critical_path = self._critical_path()
+        if error is not None:
+            raise error
+        return results
+
+    def _critical_path(self) -> list:
+        # Walk back from the last task to finish through the dependency that finished last.
+        finished = {name: record for name, record in self.records.items() if "end" in record}
+        if not finished:
+            return []
+        name = max(finished, key=lambda task: finished[task]["end"])
+        path = [name]
+        while True:
+            deps = [dep for dep in self.records[name]["depends_on"] if dep in finished]
+            if not deps:
+                break
+            name = max(deps, key=lambda task: finished[task]["end"])
+            path.append(name)
+        return path[::-1]
+
+    def report(self) -> dict:
+        return {
+            "executor": self.executor,
+            "max_workers": self.max_workers,
+            "wall_seconds": self.wall_seconds,
+            "critical_path": self.critical_path,
+            "critical_path_seconds": sum(self.records[name]["seconds"] for name in self.critical_path),
+            "tasks": self.records,
+        }
+
+    def log_summary(self, title: str):
+        logger.info(f"{title} timing ({self.executor} pool, {self.max_workers or 'default'} workers, wall {self.wall_seconds:.3f}s):")
+        for name, record in sorted(self.records.items(), key=lambda item: item[1].get("start", float("inf"))):
+            if "seconds" not in record:
+                logger.info(f"  {name:<24} {record['status']}")
+                continue
+            marker = " *" if name in self.critical_path else ""
+            logger.info(f"  {name:<24} start {record['start']:8.3f}s  took {record['seconds']:8.3f}s  {record['status']}{marker}")
+        logger.info(f"  critical path (*): {' -> '.join(self.critical_path)}")
@@ -0,0 +1,333 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import resource
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from src.utils.common import logger, save_json
+
+# Latency buckets (seconds) from 50us to 60s, as Prometheus `le` bounds.
+DEFAULT_LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+METRIC_PREFIX = "retail_segmentation"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def peak_rss_mb() -> float:
+    """
+    High-water mark of this process's resident memory, in MB.
+    """
+    # VmHWM starts over at exec; ru_maxrss can carry the parent's peak across fork + exec.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def current_rss_mb() -> float:
+    """
+    Resident memory of this process right now, in MB (the peak where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram with Prometheus semantics (cumulative
+    `le` buckets, sum and count). `observe` is a bisect and an increment under
+    a lock, so it is cheap enough for per-call use on the serving hot path.
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-quantile (inf past the last bucket).
+        """
+        if self.count == 0:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            running += bucket_count
+            cumulative["+Inf" if bound == float("inf") else repr(bound)] = running
+        return {
+            "count": count,
+            "sum_seconds": total,
+            "mean_seconds": total / count if count else 0.0,
+            "p50_seconds": self.quantile(0.5),
+            "p99_seconds": self.quantile(0.99),
+            "buckets": cumulative,
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class Instrumentation:
+    """
+    Per-run measurements of pipeline stages and hot-path calls.
+
+    `stage(name)` times a block and records its duration and peak RSS above
+    the RSS at its start (a background thread samples RSS every
+    `rss_sample_interval` seconds while any stage is active, and the process
+    high-water mark catches peaks between samples). Callers fill in `rows_in`
+    and `rows_out` on the yielded record. With `profile` on, each stage runs
+    under cProfile and its stats are dumped to `profile_dir/<stage>.pstats`
+    (plus a `.txt` of the top functions by cumulative time).
+
+    `observe(name, seconds, rows)` feeds per-call latency histograms.
+    `write_report` and `write_prometheus` export everything as a JSON run
+    report and a Prometheus text-format file. Stages running concurrently in
+    one process share its RSS, so their peaks overlap.
+    """
+    def __init__(self, profile: bool = False, profile_dir=None, rss_sample_interval: float = 0.05):
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.rss_sample_interval = rss_sample_interval
+        self.started_at = time.time()
+        self.stages = {}
+        self.histograms = {}
+        self.rows = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def __getstate__(self):
+        # Process-pool stages get a copy; their records come back through the task results.
+        state = self.__dict__.copy()
+        state.update(_active={}, _sampler=None)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _sample_rss(self, stop):
+        while not stop.wait(self.rss_sample_interval):
+            rss = current_rss_mb()
+            with self._lock:
+                for record in self._active.values():
+                    record["rss_peak_mb"] = max(record["rss_peak_mb"], rss)
+
+    def _start_sampler(self):
+        if self._sampler is None and self.rss_sample_interval:
+            stop = threading.Event()
+            thread = threading.Thread(target=self._sample_rss, args=(stop,), name="rss-sampler", daemon=True)
+            self._sampler = (thread, stop)
+            thread.start()
+
+    def _stop_sampler(self):
+        if self._sampler is not None:
+            thread, stop = self._sampler
+            self._sampler = None
+            stop.set()
+
+    def _start_profiler(self, name):
+        if not self.profile:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Only one profiler may be active at a time on some Python versions.
+            logger.warning(f"Not profiling stage {name}: {e}")
+            return None
+        return profiler
+
+    def _dump_profile(self, name, profiler) -> str:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{name}.pstats")
+        profiler.dump_stats(path)
+        with open(os.path.join(self.profile_dir, f"{name}.txt"), "w") as f:
+            pstats.Stats(path, stream=f).sort_stats("cumulative").print_stats(40)
+        logger.info(f"Profile of stage {name} saved to: {path}")
+        return path
+
+    @contextmanager
+    def stage(self, name: str):
+        rss_start = current_rss_mb()
+        record = {
+            "stage": name,
+            "status": "running",
+            "pid": os.getpid(),
+            "started_at": time.time(),
+            "rss_start_mb": rss_start,
+            "rss_peak_mb": rss_start,
+            "rows_in": None,
+            "rows_out": None,
+        }
+        hwm_start = peak_rss_mb()
+        with self._lock:
+            self._active[name] = record
+            self._start_sampler()
+        profiler = self._start_profiler(name)
+        start = time.perf_counter()
+        try:
+            yield record
+            record["status"] = "done"
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            record["duration_seconds"] = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                record["profile_path"] = self._dump_profile(name, profiler)
+            hwm_end = peak_rss_mb()
+            with self._lock:
+                del self._active[name]
+                if not self._active:
+                    self._stop_sampler()
+                peak = max(record["rss_peak_mb"], current_rss_mb())
+                if hwm_end > hwm_start:
+                    # The process reached a new high inside this stage.
+                    peak = max(peak, hwm_end)
+                record["rss_peak_mb"] = peak
+                record["peak_rss_delta_mb"] = peak - rss_start
+                self.stages[name] = record
+
+    def skip(self, name: str) -> dict:
+        record = {"stage": name, "status": "skipped", "pid": os.getpid(), "started_at": time.time()}
+        self.stages[name] = record
+        return record
+
+    def add_stage_record(self, record: dict):
+        """
+        Adds a record measured in another process (e.g. a process-pool stage).
+        """
+        self.stages[record["stage"]] = record
+
+    def observe(self, name: str, seconds: float, rows: int = None):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.observe(seconds)
+        if rows is not None:
+            # A lost increment under a race only undercounts; not worth a lock per call.
+            self.rows[name] = self.rows.get(name, 0) + rows
+
+    def report(self) -> dict:
+        stages = {}
+        for name, record in self.stages.items():
+            record = dict(record)
+            seconds, rows = record.get("duration_seconds"), record.get("rows_in") or record.get("rows_out")
+            record["rows_per_sec"] = rows / seconds if rows and seconds else None
+            stages[name] = record
+        return {
+            "started_at": self.started_at,
+            "pid": os.getpid(),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+            "latency": {
+                name: {**histogram.snapshot(), "rows": self.rows.get(name)}
+                for name, histogram in self.histograms.items()
+            },
+        }
+
+    def write_report(self, path):
+        save_json(path=Path(path), data=self.report())
+
+    def prometheus_text(self) -> str:
+        report = self.report()
+        lines = []
+
+        def family(name, metric_type, help_text):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+
+        stage_metrics = [
+            ("stage_duration_seconds", "duration_seconds", "Wall time of the last run of each pipeline stage."),
+            ("stage_peak_rss_delta_bytes", "peak_rss_delta_mb", "Peak resident memory above the stage's starting RSS."),
+            ("stage_rows_in", "rows_in", "Rows read by each pipeline stage."),
+            ("stage_rows_out", "rows_out", "Rows written by each pipeline stage."),
+            ("stage_rows_per_second", "rows_per_sec", "Rows processed per second by each pipeline stage."),
+        ]
+        for metric, key, help_text in stage_metrics:
+            samples = [(name, record.get(key)) for name, record in report["stages"].items() if record.get(key) is not None]
+            if not samples:
+                continue
+            family(metric, "gauge", help_text)
+            for name, value in samples:
+                value = value * 2**20 if key.endswith("_mb") else value
+                lines.append(f'{METRIC_PREFIX}_{metric}{{stage="{name}"}} {value}')
+        if report["stages"]:
+            family("stage_success", "gauge", "1 if the stage completed or was skipped as unchanged, 0 if it failed.")
+            for name, record in report["stages"].items():
+                lines.append(f'{METRIC_PREFIX}_stage_success{{stage="{name}"}} {int(record["status"] != "failed")}')
+
+        for name, latency in report["latency"].items():
+            metric = f"{METRIC_PREFIX}_{name}_latency_seconds"
+            lines.append(f"# HELP {metric} Per-call latency of {name}.")
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, count in latency["buckets"].items():
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{metric}_sum {latency['sum_seconds']}")
+            lines.append(f"{metric}_count {latency['count']}")
+            if latency["rows"] is not None:
+                family(f"{name}_rows_total", "counter", f"Rows scored by {name}.")
+                lines.append(f"{METRIC_PREFIX}_{name}_rows_total {latency['rows']}")
+
+        family("peak_rss_bytes", "gauge", "High-water mark of the process's resident memory.")
+        lines.append(f"{METRIC_PREFIX}_peak_rss_bytes {report['peak_rss_mb'] * 2**20}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Writes the metrics in Prometheus text format, atomically (as the
+        node_exporter textfile collector expects).
+        """
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, path)
+            logger.info(f"Prometheus metrics saved at: {path}")
+        except Exception as e:
+            logger.error(f"Error saving Prometheus metrics at: {path}\n{e}")
+            raise e
@@ -0,0 +1,70 @@
+import os
+import json
+import fcntl
+import hashlib
+from contextlib import contextmanager
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from src.utils.common import save_json
+from src.utils.artifact_store import fingerprint_file, code_version
+
+
+class StageCache:
+    """
+    Records a fingerprint per pipeline stage (its config section, the content
+    of its input files and the source of its code) in a small JSON file, so a
+    rerun can skip stages whose fingerprint is unchanged and whose outputs
+    still exist. Updates re-read the file under an exclusive lock, so stages
+    running in separate threads or processes do not lose each other's entries.
+    """
+    def __init__(self, state_path: Path):
+        self.state_path = Path(state_path)
+        self.state = self._read()
+
+    def _read(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.state_path.parent, exist_ok=True)
+        with open(self.state_path.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.state = self._read()
+                yield
+                # Written aside and renamed, so lock-free readers never see a partial file.
+                tmp_path = self.state_path.with_suffix(f".tmp-{os.getpid()}")
+                save_json(path=tmp_path, data=self.state)
+                os.replace(tmp_path, self.state_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def fingerprint(self, config, inputs: list, modules: list) -> str:
+        missing = [str(path) for path in inputs if not os.path.exists(path)]
+        if missing:
+            # Inputs produced by an earlier stage that has not run yet.
+            return None
+        payload = {
+            "config": asdict(config) if is_dataclass(config) else config,
+            "inputs": {str(path): fingerprint_file(path) for path in inputs},
+            "code": code_version(modules),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def is_fresh(self, stage: str, fingerprint: str, outputs: list) -> bool:
+        return (
+            fingerprint is not None
+            and self._read().get(stage) == fingerprint
+            and all(os.path.exists(path) for path in outputs)
+        )
+
+    def record(self, stage: str, fingerprint: str):
+        with self._locked():
+            self.state[stage] = fingerprint
+
+    def invalidate(self, stage: str):
+        with self._locked():
+            self.state.pop(stage, None)
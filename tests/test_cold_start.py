@@ -0,0 +1,35 @@
+import statistics
+import numpy as np
+import pytest
+from benchmarks.check_cold_start import probe, IMPORT_BUDGET_MS, FIRST_PREDICTION_BUDGET_MS
+from src.components.serving_kernel import export_serving_artifact
+from src.components.feature_stats import fit_feature_stats
+
+FEATURE_NAMES = ["Recency", "Frequency", "Monetary"]
+REPEATS = 3
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    # A tiny centroid-assignment serving artifact plus its drift reference, as the export stage writes them.
+    rng = np.random.default_rng(0)
+    raw = rng.gamma(2.0, [30.0, 3.0, 500.0], size=(200, 3))
+    log = np.log1p(raw)
+    mean, scale = log.mean(axis=0), log.std(axis=0)
+    export_serving_artifact(
+        tmp_path / "artifacts" / "serving" / "model.npz",
+        mean, scale, ((log - mean) / scale)[:4], FEATURE_NAMES
+    )
+    fit_feature_stats(raw, FEATURE_NAMES, chunk_size=100).save(tmp_path / "artifacts" / "serving" / "feature_stats.npz")
+    return tmp_path
+
+
+def test_cold_start_within_budget(project_dir):
+    # Warm the OS file cache once, then take the median of fresh interpreters.
+    probe(True, project_dir)
+    import_runs = [probe(False, project_dir) for _ in range(REPEATS)]
+    prediction_runs = [probe(True, project_dir) for _ in range(REPEATS)]
+
+    assert statistics.median(run["import_seconds"] for run in import_runs) * 1000 <= IMPORT_BUDGET_MS
+    assert statistics.median(run["first_prediction_seconds"] for run in prediction_runs) * 1000 <= FIRST_PREDICTION_BUDGET_MS
+    assert [name for run in import_runs + prediction_runs for name in run["heavy_modules"]] == []
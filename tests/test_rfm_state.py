@@ -0,0 +1,44 @@
+from dataclasses import fields
+import pandas as pd
+import pytest
+from benchmarks.synthetic_retail import generate_blocks
+from src.entity.config_entity import DataTransformationConfig
+from src.components.data_transformation import DataTransformation
+from src.components.rfm_state import RFMStateStore
+
+
+@pytest.fixture(scope="module")
+def transformation():
+    config = DataTransformationConfig(**{field.name: None for field in fields(DataTransformationConfig)})
+    return DataTransformation(config)
+
+
+@pytest.fixture(scope="module")
+def history(transformation):
+    # Synthetic transactions are in InvoiceDate order; cut on a date so every invoice lands on one side.
+    df_clean = transformation._clean(pd.concat(generate_blocks(20000, block_rows=5000), ignore_index=True))
+    cut = df_clean['InvoiceDate'].quantile(0.8)
+    return df_clean, df_clean[df_clean['InvoiceDate'] <= cut], df_clean[df_clean['InvoiceDate'] > cut]
+
+
+def test_delta_and_reapply_match_full_rebuild(tmp_path, transformation, history):
+    df_clean, earlier, later = history
+    store = RFMStateStore(tmp_path / "rfm_state.csv")
+    store.save(store.build(earlier))
+
+    state = store.apply_delta(store.load(), later)
+    store.save(state)
+    # Re-applying the same delta is a no-op.
+    state = store.apply_delta(store.load(), later)
+
+    store.verify(store.to_rfm(state), transformation._build_rfm(df_clean))
+
+
+def test_late_rows_are_rejected(transformation, history):
+    _, earlier, later = history
+    store = RFMStateStore(None)
+    state = store.build(earlier)
+    late_posted = earlier.tail(5).assign(InvoiceNo="C999999")
+
+    with pytest.raises(ValueError, match="late-posted"):
+        store.apply_delta(state, pd.concat([later, late_posted]))